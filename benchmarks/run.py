@@ -0,0 +1,255 @@
+"""Benchmarks for every aligner in the repository.
+
+Each aligner is run over a sweep of sequence lengths, divergences and, for the
+banded aligner, band widths. Every run records the best wall time over a few
+repeats, the DP cells per second and the peak traced memory. The results are
+written as JSON and can be compared against a saved baseline, in which case
+the exit status is 1 when anything got slower or bigger than the tolerance.
+
+    python benchmarks/run.py --quick -o baseline.json
+    python benchmarks/run.py --quick -o current.json --baseline baseline.json
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+import argparse
+import datetime
+import importlib
+import importlib.util
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parent.parent
+ALPHABET = 'ACGT'
+
+LENGTHS = (100, 200, 400, 800)
+DIVERGENCES = (0.01, 0.1, 0.3)
+BANDS = (1, 4, 16, 64)
+QUICK_LENGTHS = (50, 100, 200)
+QUICK_DIVERGENCES = (0.01, 0.3)
+QUICK_BANDS = (1, 16)
+
+
+@lru_cache(maxsize=None)
+def load(path: str):
+    """Imports a lab module from its file under a unique name, the labs share package names like 'src'.
+
+    A module inside a package is imported as part of the package, so that its relative imports work.
+    """
+    file = ROOT / path
+    if (file.parent / '__init__.py').exists():
+        package = 'bench_' + str(Path(path).parent).replace('/', '_').replace('-', '_')
+        if package not in sys.modules:
+            spec = importlib.util.spec_from_file_location(package, file.parent / '__init__.py',
+                                                          submodule_search_locations=[str(file.parent)])
+            sys.modules[package] = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(sys.modules[package])
+        return importlib.import_module(package + '.' + file.stem)
+    name = 'bench_' + path.replace('/', '_').replace('-', '_')[:-len('.py')]
+    spec = importlib.util.spec_from_file_location(name, file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def full_cells(n: int, m: int, band: Optional[int]) -> int:
+    return (n + 1) * (m + 1)
+
+
+def band_cells(n: int, m: int, band: Optional[int]) -> int:
+    """Cells with |i - j| <= band, the ones needleman_wunsch_k evaluates."""
+    return (n + m + 1) + sum(max(0, min(m, i + band) - max(1, i - band) + 1) for i in range(1, n + 1))
+
+
+def unit_cost(a: str, b: str) -> int:
+    """Levenshtein distance as a score, the scheme the Four-Russians engine accepts."""
+    return 0 if a == b else -1
+
+
+LEVENSHTEIN = {'score': unit_cost, 'gap_penalty': -1}
+
+
+def row_dp(kernels):
+    """The plain row DP of kernels.nw_score, taking strings like the other aligners."""
+    def nw_row_score(seq1, seq2, score, gap_penalty):
+        alphabet = kernels.build_alphabet((seq1, seq2))
+        return kernels.nw_score(kernels.encode(seq1, alphabet), kernels.encode(seq2, alphabet),
+                                kernels.substitution_table(score, alphabet), gap_penalty)
+    return nw_row_score
+
+
+class Bench(NamedTuple):
+    path: str
+    # The function name, or a callable that takes the module and returns the aligner
+    function: Union[str, Callable]
+    options: Callable[[Optional[int]], dict]
+    cells: Callable[[int, int, Optional[int]], int] = full_cells
+    banded: bool = False
+
+
+BENCHES: Dict[str, Bench] = {
+    'needleman_wunsch': Bench('needleman-wunsch/src/nw.py', 'needleman_wunsch', lambda band: {}),
+    'needleman_wunsch_k': Bench('k-banded-nw/src/nw.py', 'needleman_wunsch_k', lambda band: {'visible_range': band},
+                                cells=band_cells, banded=True),
+    'hirschberg': Bench('hirschberg/hirschberg/align.py', 'hirschberg', lambda band: {}),
+    'nw_score_evaluate': Bench('hirschberg/hirschberg/align.py', 'nw_score_evaluate', lambda band: {}),
+    'needleman_wunsch_affine': Bench('affine-gap-penalty/src/nw_affine_gap.py', 'needleman_wunsch_affine',
+                                     lambda band: {}),
+    'row_dp': Bench('needleman-wunsch/src/kernels.py', row_dp, lambda band: LEVENSHTEIN),
+    'four_russians': Bench('needleman-wunsch/src/four_russians.py', 'four_russians_score', lambda band: LEVENSHTEIN),
+    'four_russians_traceback': Bench('needleman-wunsch/src/four_russians.py', 'needleman_wunsch_4r',
+                                     lambda band: LEVENSHTEIN),
+}
+
+
+def make_pair(length: int, divergence: float, seed: int, same_length: bool = False):
+    """A random sequence and a copy with substitutions, insertions and deletions at the given rate."""
+    rng = random.Random('%d/%g/%d' % (length, divergence, seed))
+    seq1 = ''.join(rng.choice(ALPHABET) for _ in range(length))
+    seq2 = []
+    for c in seq1:
+        if rng.random() >= divergence:
+            seq2.append(c)
+            continue
+        kind = rng.randrange(3)
+        if kind == 0:
+            seq2.append(rng.choice(ALPHABET.replace(c, '')))
+        elif kind == 1:
+            seq2.extend((c, rng.choice(ALPHABET)))
+    seq2 = ''.join(seq2)
+    if same_length:
+        seq2 = (seq2 + ''.join(rng.choice(ALPHABET) for _ in range(length)))[:length]
+    return seq1, seq2
+
+
+def measure(fn: Callable, repeat: int):
+    """Best wall time over `repeat` runs, then the peak traced memory of one more run."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(benches: List[str], lengths, divergences, bands, repeat: int = 3, seed: int = 0, log=None) -> List[dict]:
+    results = []
+    for name in benches:
+        bench = BENCHES[name]
+        module = load(bench.path)
+        aligner = getattr(module, bench.function) if isinstance(bench.function, str) else bench.function(module)
+        for length in lengths:
+            for divergence in divergences:
+                seq1, seq2 = make_pair(length, divergence, seed, same_length=bench.banded)
+                for band in (bands if bench.banded else (None,)):
+                    options = bench.options(band)
+                    seconds, peak = measure(lambda: aligner(seq1, seq2, **options), repeat)
+                    cells = bench.cells(len(seq1), len(seq2), band)
+                    results.append({'bench': name, 'length': length, 'divergence': divergence, 'band': band,
+                                    'len1': len(seq1), 'len2': len(seq2), 'seconds': seconds, 'cells': cells,
+                                    'cells_per_s': cells / max(seconds, 1e-12), 'peak_bytes': peak})
+                    if log is not None:
+                        print(format_row(results[-1]), file=log, flush=True)
+    return results
+
+
+def result_key(result: dict):
+    return result['bench'], result['length'], result['divergence'], result['band']
+
+
+def format_row(result: dict, baseline: dict = None) -> str:
+    row = '%-24s %6d %5.2f %5s %10.4f s %12.0f cells/s %10.1f KiB' % (
+        result['bench'], result['length'], result['divergence'], '-' if result['band'] is None else result['band'],
+        result['seconds'], result['cells_per_s'], result['peak_bytes'] / 1024)
+    if baseline is not None:
+        row += '   x%.2f time  x%.2f memory' % (result['seconds'] / max(baseline['seconds'], 1e-12),
+                                                 result['peak_bytes'] / max(baseline['peak_bytes'], 1))
+    return row
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float = 0.25,
+            memory_tolerance: float = 0.1, min_delta: float = 0.005) -> List[str]:
+    """Lists the runs that are slower or use more memory than their baseline run.
+
+    A run regresses when its time exceeds the baseline by more than `tolerance`
+    (relative) and `min_delta` seconds, so that millisecond runs do not fail
+    on timer noise, or when its peak memory exceeds the baseline by more than
+    `memory_tolerance`. Runs missing from the baseline are skipped.
+    """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None:
+            continue
+        slower = result['seconds'] - base['seconds']
+        if slower > tolerance * base['seconds'] and slower > min_delta:
+            regressions.append('%s: %.4f s, baseline %.4f s' % (format_key(result), result['seconds'], base['seconds']))
+        if result['peak_bytes'] > (1 + memory_tolerance) * base['peak_bytes']:
+            regressions.append('%s: peak %d bytes, baseline %d bytes' % (format_key(result), result['peak_bytes'],
+                                                                        base['peak_bytes']))
+    return regressions
+
+
+def format_key(result: dict) -> str:
+    key = '%s length=%d divergence=%g' % (result['bench'], result['length'], result['divergence'])
+    return key if result['band'] is None else key + ' band=%d' % result['band']
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark every aligner over lengths, divergences and band widths')
+    parser.add_argument('--bench', action='append', choices=sorted(BENCHES), help='aligner to run, repeatable; all by default')
+    parser.add_argument('--quick', action='store_true', help='small sweep for CI')
+    parser.add_argument('--lengths', type=int, nargs='+', help='sequence lengths')
+    parser.add_argument('--divergences', type=float, nargs='+', help='mutation rates of the second sequence')
+    parser.add_argument('--bands', type=int, nargs='+', help='band widths of needleman_wunsch_k')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best time is kept')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated sequences')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results to compare against, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1, help='allowed relative growth of peak memory')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='slowdowns below this many seconds are ignored')
+    args = parser.parse_args(argv)
+
+    lengths = args.lengths or (QUICK_LENGTHS if args.quick else LENGTHS)
+    divergences = args.divergences or (QUICK_DIVERGENCES if args.quick else DIVERGENCES)
+    bands = args.bands or (QUICK_BANDS if args.quick else BANDS)
+    results = run(args.bench or list(BENCHES), lengths, divergences, bands, args.repeat, args.seed, log=sys.stderr)
+    report = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version(), 'machine': platform.machine(),
+                       'platform': platform.platform(), 'repeat': args.repeat, 'seed': args.seed},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        previous = {result_key(result): result for result in baseline}
+        print('\ncompared to %s:' % args.baseline)
+        for result in results:
+            print(format_row(result, previous.get(result_key(result))))
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance, args.min_delta)
+        if regressions:
+            print('\n%d regressions:' % len(regressions))
+            for regression in regressions:
+                print('  ' + regression)
+            return 1
+        print('\nno regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
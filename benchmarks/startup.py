@@ -0,0 +1,76 @@
+"""Start-up time of bioalign: fresh interpreters importing the package and running one alignment.
+
+Every case runs in a new `python -c` process and is reported in milliseconds
+over the bare interpreter start, with whether NumPy got imported. The pure
+Python cases must not import it; with --max-ms the exit code is 1 when one of
+them does or takes longer than the budget, which guards the lazy imports.
+
+    python benchmarks/startup.py --repeat 10 --max-ms 50 -o startup.json
+"""
+from typing import List
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# name -> (code, whether it may import NumPy)
+CASES = {
+    'import': ('import bioalign', False),
+    'align': ("import bioalign; bioalign.align('ACCGT', 'ACGT')", False),
+    'hirschberg': ("import bioalign; bioalign.align('ACCGT', 'ACGT', engine='hirschberg')", False),
+    'cli': ("from bioalign.cli import main; main(['--engine', 'affine', 'ACGT', 'TAGT'])", False),
+    'kernels': ('import bioalign.nw.kernels', True),
+}
+REPORT = "; import sys; sys.stderr.write('numpy=%d' % ('numpy' in sys.modules))"
+
+
+def _run(code: str):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, text=True, check=True)
+    return time.perf_counter() - start, process.stderr.endswith('numpy=1')
+
+
+def measure(cases, repeat: int = 5, log=None) -> List[dict]:
+    baseline = min(_run('pass')[0] for _ in range(repeat))
+    results = []
+    for name in cases:
+        code, heavy = CASES[name]
+        runs = [_run(code + REPORT) for _ in range(repeat)]
+        milliseconds = (min(seconds for seconds, _ in runs) - baseline) * 1000
+        numpy = any(loaded for _, loaded in runs)
+        results.append({'case': name, 'ms': milliseconds, 'numpy': numpy, 'may_import_numpy': heavy})
+        if log is not None:
+            print('%-11s %8.1f ms%s' % (name, milliseconds, ' numpy' if numpy else ''), file=log, flush=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Start-up time of the bioalign package')
+    parser.add_argument('--case', action='append', choices=list(CASES), help='case, repeatable; all by default')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case, the best time is kept')
+    parser.add_argument('--max-ms', type=float, help='budget of the cases that must not import NumPy')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    args = parser.parse_args(argv)
+
+    results = measure(args.case or list(CASES), args.repeat, log=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                                'repeat': args.repeat}, 'results': results}, file, indent=1)
+    if args.max_ms is not None:
+        slow = [result['case'] for result in results if not result['may_import_numpy']
+                and (result['numpy'] or result['ms'] > args.max_ms)]
+        if slow:
+            print('over %.0f ms or importing NumPy: %s' % (args.max_ms, ', '.join(slow)), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Speedup of the tiled wavefront fill over the number of worker processes.
+
+Aligns one pair of sequences with needleman_wunsch_wavefront and
+needleman_wunsch_affine_wavefront at every worker count and reports the best
+wall time of each and its speedup over one worker. The speedup is bounded by
+the physical cores and by the width of the anti-diagonals: the first and last
+ones hold a single tile, so the tile size trades scheduling overhead against
+parallelism.
+
+    python benchmarks/wavefront.py --length 8000 --workers 1 2 4 8 16 -o wavefront.json
+"""
+from typing import List
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from run import load, make_pair
+
+WORKERS = (1, 2, 4, 8, 16)
+ENGINES = {'nw': 'needleman_wunsch_wavefront', 'affine': 'needleman_wunsch_affine_wavefront'}
+
+
+def sweep(length: int, workers, tile: int, engines, repeat: int = 1, seed: int = 0, log=None) -> List[dict]:
+    module = load('needleman-wunsch/src/wavefront.py')
+    seq1, seq2 = make_pair(length, 0.1, seed)
+    results = []
+    for engine in engines:
+        aligner = getattr(module, ENGINES[engine])
+        single = None
+        for count in workers:
+            seconds = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                aligner(seq1, seq2, workers=count, tile=tile)
+                seconds = min(seconds, time.perf_counter() - start)
+            if count == 1:
+                single = seconds
+            speedup = single / seconds if single else None
+            results.append({'engine': engine, 'length': length, 'tile': tile, 'workers': count, 'seconds': seconds,
+                            'cells_per_s': len(seq1) * len(seq2) / seconds, 'speedup': speedup})
+            if log is not None:
+                print('%-7s %6d %5d %3d workers %9.3f s %s' % (engine, length, tile, count, seconds,
+                                                                '' if speedup is None else 'x%.2f' % speedup),
+                      file=log, flush=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Speedup of the wavefront fill at several worker counts')
+    parser.add_argument('--length', type=int, default=4000, help='sequence length')
+    parser.add_argument('--workers', type=int, nargs='+', default=list(WORKERS), help='worker counts, 1 first')
+    parser.add_argument('--tile', type=int, default=256, help='tile side')
+    parser.add_argument('--engine', action='append', choices=sorted(ENGINES), help='recurrence, repeatable; all by default')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per worker count, the best time is kept')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated sequences')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    args = parser.parse_args(argv)
+
+    results = sweep(args.length, args.workers, args.tile, args.engine or list(ENGINES), args.repeat, args.seed,
+                    log=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                                'cpus': os.cpu_count(), 'repeat': args.repeat, 'seed': args.seed},
+                       'results': results}, file, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
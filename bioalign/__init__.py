@@ -0,0 +1,166 @@
+"""The alignment engines of the labs as one package, each imported on first use.
+
+    import bioalign
+    bioalign.align('ACCGT', 'ACGT')                       # (10, 'ACCGT', 'A-CGT')
+    bioalign.align(seq1, seq2, engine='hirschberg', gap=-5)
+    bioalign.align_batch(pairs)                           # loads NumPy now
+
+Importing bioalign loads this module and `core` only. An engine's module is
+imported when the engine is first used, and NumPy with it only for the
+engines that need it, so a short command line run or a spawned worker starts
+in milliseconds; benchmarks/startup.py measures it.
+
+The engines live in the labs: bioalign.nw is needleman-wunsch/src,
+bioalign.banded k-banded-nw/src, bioalign.hirschberg hirschberg/hirschberg
+and bioalign.affine affine-gap-penalty/src. An installed package maps them
+with package-dir in pyproject.toml, a source checkout with _LabFinder.
+"""
+from __future__ import annotations
+
+# Not typing, which alone takes longer to import than the rest of the package
+from collections.abc import Callable
+from importlib import import_module
+import importlib.util
+import os
+import sys
+
+from .core import GAP_PENALTY, score_fun
+
+# Subpackage -> its lab directory, relative to the repository root
+LABS = {'nw': 'needleman-wunsch/src', 'banded': 'k-banded-nw/src', 'hirschberg': 'hirschberg/hirschberg',
+        'affine': 'affine-gap-penalty/src'}
+
+
+class _LabFinder:
+    """Finds bioalign.<lab> in its lab directory when running from a source checkout."""
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    @classmethod
+    def find_spec(cls, fullname, path=None, target=None):
+        package, _, name = fullname.partition('.')
+        if package != __name__ or name not in LABS:
+            return None
+        directory = os.path.join(cls.root, *LABS[name].split('/'))
+        init = os.path.join(directory, '__init__.py')
+        if not os.path.exists(init):
+            return None
+        return importlib.util.spec_from_file_location(fullname, init, submodule_search_locations=[directory])
+
+
+# After the path finders, so that an installed layout wins
+if not any(getattr(finder, '__name__', None) == '_LabFinder' for finder in sys.meta_path):
+    sys.meta_path.append(_LabFinder)
+
+
+class Engine:
+    """A pairwise aligner f(seq1, seq2, score, ...) and how to call it.
+
+    Args:
+        module: Its module under bioalign, e.g. 'nw.nw'
+        function: Its name in the module, e.g. 'needleman_wunsch'
+        gap: The name of its linear gap parameter, None for affine gaps
+        score_last: Whether it returns (aln1, aln2, score) rather than (score, aln1, aln2)
+        numpy: Whether it needs NumPy, the 'fast' extra
+    """
+    __slots__ = ('module', 'function', 'gap', 'score_last', 'numpy')
+
+    def __init__(self, module: str, function: str, gap: str = 'gap_penalty', score_last: bool = False,
+                 numpy: bool = False):
+        self.module, self.function, self.gap, self.score_last, self.numpy = module, function, gap, score_last, numpy
+
+    def __repr__(self):
+        return 'Engine(%r, %r, gap=%r, score_last=%r, numpy=%r)' % (self.module, self.function, self.gap,
+                                                                    self.score_last, self.numpy)
+
+
+ENGINES: dict[str, Engine] = {
+    'nw': Engine('nw.nw', 'needleman_wunsch'),
+    'banded': Engine('banded.nw', 'needleman_wunsch'),
+    'hirschberg': Engine('hirschberg.align', 'hirschberg', gap='gap_score', score_last=True),
+    'affine': Engine('affine.nw_affine_gap', 'needleman_wunsch_affine', gap=None, score_last=True),
+    'four_russians': Engine('nw.four_russians', 'needleman_wunsch_4r', numpy=True),
+    'outofcore': Engine('nw.outofcore', 'needleman_wunsch_ooc', numpy=True),
+    'wavefront': Engine('nw.wavefront', 'needleman_wunsch_wavefront', numpy=True),
+    'affine_wavefront': Engine('nw.wavefront', 'needleman_wunsch_affine_wavefront', gap=None, score_last=True,
+                               numpy=True),
+}
+
+# Everything else the labs offer, as bioalign.<name>: name -> (module, attribute)
+_LAZY = {
+    'align_batch': ('nw.batch', 'align_batch'),
+    'pairwise_matrix': ('nw.pairwise', 'pairwise_matrix'),
+    'progressive_msa': ('nw.msa', 'progressive_msa'),
+    'search': ('nw.trie', 'search'),
+    'TargetTrie': ('nw.trie', 'TargetTrie'),
+    'IncrementalAligner': ('nw.incremental', 'IncrementalAligner'),
+    'OutOfCoreAligner': ('nw.outofcore', 'OutOfCoreAligner'),
+    'edit_distance': ('nw.four_russians', 'edit_distance'),
+    'AlignmentCache': ('nw.cache', 'AlignmentCache'),
+    'Profiler': ('nw.instrument', 'Profiler'),
+}
+
+
+def register(name: str, engine: Engine):
+    """Adds an engine, or replaces one, under name."""
+    ENGINES[name] = engine
+
+
+def get_engine(name: str) -> Callable:
+    """The aligner registered as name, imported now if it was not yet."""
+    try:
+        engine = ENGINES[name]
+    except KeyError:
+        raise ValueError("unknown engine %r, expected one of %s" % (name, ', '.join(ENGINES))) from None
+    return getattr(import_module('%s.%s' % (__name__, engine.module)), engine.function)
+
+
+def align(seq1: str,
+          seq2: str,
+          engine: str = 'nw',
+          score: Callable[[str, str], int] = score_fun,
+          gap: int = None,
+          **params) -> tuple[int, str, str]:
+    """Aligns two sequences with any registered engine.
+
+    Args:
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        engine: The engine's name in ENGINES, e.g. 'hirschberg'
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap: The linear gap penalty, passed under the engine's own name; GAP_PENALTY for every
+            linear engine if None, so that the engines agree on the score
+        params: Further engine parameters by name, e.g. gap_open=-10 or workers=4
+
+    Returns:
+        score: The optimal alignment score, e.g. 10
+        aligned_seq1: The first aligned sequence, e.g. 'ACCGT'
+        aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
+    """
+    aligner = get_engine(engine)
+    name = ENGINES[engine].gap
+    if name is None:
+        if gap is not None:
+            raise ValueError("engine %r has affine gaps, pass gap_open and gap_extend" % engine)
+    elif gap is not None:
+        params[name] = gap
+    else:
+        params.setdefault(name, GAP_PENALTY)
+    result = aligner(seq1, seq2, score, **params)
+    if ENGINES[engine].score_last:
+        aln1, aln2, value = result
+        return value, aln1, aln2
+    return result
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        module, attribute = _LAZY[name]
+        value = getattr(import_module('%s.%s' % (__name__, module)), attribute)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
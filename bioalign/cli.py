@@ -0,0 +1,56 @@
+"""The bioalign command: one pair with any registered engine.
+
+    bioalign ACCGT ACGT
+    bioalign --engine affine --gap-open -10 --gap-extend -1 ACGT TAGT
+    bioalign --list
+
+Imports the chosen engine only, so the pure Python ones run without NumPy.
+"""
+import argparse
+import sys
+
+from . import ENGINES, align
+from .core import add_scoring_arguments, print_results, scorer
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='bioalign', description='Pairwise sequence alignment')
+    parser.add_argument('seq1', nargs='?', help='first sequence')
+    parser.add_argument('seq2', nargs='?', help='second sequence')
+    parser.add_argument('--engine', default='nw', choices=sorted(ENGINES), help='alignment engine, nw by default')
+    add_scoring_arguments(parser)
+    parser.add_argument('--gap-open', type=int, default=-10, help='gap open penalty of the affine engines')
+    parser.add_argument('--gap-extend', type=int, default=-1, help='gap extend penalty of the affine engines')
+    parser.add_argument('--band', type=int, help='width of the diagonal band of the banded engine')
+    parser.add_argument('--list', action='store_true', help='list the engines and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, engine in ENGINES.items():
+            print('%-17s %s.%s%s' % (name, engine.module, engine.function, ' (numpy)' if engine.numpy else ''))
+        return 0
+    if args.seq1 is None or args.seq2 is None:
+        parser.error("seq1 and seq2 are required unless --list is given")
+    try:
+        score = scorer(args.match, args.mismatch)
+    except ValueError as error:
+        parser.error(str(error))
+    if ENGINES[args.engine].gap is None:
+        params = {'gap_open': args.gap_open, 'gap_extend': args.gap_extend}
+    else:
+        params = {'gap': args.gap}
+    if args.band is not None:
+        if args.engine != 'banded':
+            parser.error("--band is only taken by the banded engine, not %s" % args.engine)
+        params['visible_range'] = args.band
+    try:
+        value, aln1, aln2 = align(args.seq1, args.seq2, args.engine, score, **params)
+    except ValueError as error:
+        # The engines reject the scorings they cannot handle, e.g. four_russians needs unit costs
+        parser.error(str(error))
+    print_results(aln1, aln2, value)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
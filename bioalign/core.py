@@ -0,0 +1,55 @@
+"""What every engine and command line shares: the default scoring, the scoring options and the output.
+
+The labs each carry their own copy of score_fun and of the result printing so
+that they stay runnable on their own; the package and its command line use
+these ones. Only the standard library is imported here.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+import sys
+
+PRINT_MAX_LINE_LENGTH = 80
+MATCH_SCORE, MISMATCH_SCORE = 5, -4
+# The linear gap penalty of every engine, whatever its own default
+GAP_PENALTY = -10
+
+
+def score_fun(a: str, b: str, match_score: int = MATCH_SCORE, mismatch_score: int = MISMATCH_SCORE) -> int:
+    return match_score if a == b else mismatch_score
+
+
+def scorer(match: int = None, mismatch: int = None) -> Callable[[str, str], int]:
+    """The scoring function for a match and a mismatch score, score_fun when neither is given."""
+    if match is None and mismatch is None:
+        return score_fun
+    if match is None or mismatch is None:
+        raise ValueError("match and mismatch must be specified together")
+    return lambda x, y: match if x == y else mismatch
+
+
+def add_scoring_arguments(parser, gap: int = GAP_PENALTY):
+    """Adds the --match, --mismatch and --gap options every command line takes."""
+    parser.add_argument('--match', type=int, help='match score')
+    parser.add_argument('--mismatch', type=int, help='mismatch score')
+    parser.add_argument('--gap', type=int, default=gap, help='gap penalty')
+    return parser
+
+
+def print_results(seq1: str, seq2: str, score, file=None):
+    """Prints two aligned sequences in blocks of PRINT_MAX_LINE_LENGTH columns and the score.
+
+    Args:
+        seq1: The first aligned sequence, e.g. 'ACCGT'
+        seq2: The second aligned sequence, e.g. 'AC-GT'
+        score: The optimal alignment score, e.g. 10
+        file: The file to print to, the standard output by default
+    """
+    if file is None:
+        file = sys.stdout
+    print("Pairwise alignment:", file=file)
+    for i in range(0, len(seq1), PRINT_MAX_LINE_LENGTH):
+        print("seq1: %s" % seq1[i:i + PRINT_MAX_LINE_LENGTH], file=file)
+        print("seq2: %s" % seq2[i:i + PRINT_MAX_LINE_LENGTH], file=file)
+        print(file=file)
+    print("Score: %s" % score, file=file)
@@ -1,6 +1,16 @@
+from contextlib import nullcontext
 from typing import Callable, Tuple
 
-DEBUG = False
+# Instrumentation hook, e.g. an instrument.Profiler from needleman-wunsch; None disables it
+PROFILER = None
+
+
+_NO_PHASE = nullcontext()
+
+
+def _phase(name: str):
+    return PROFILER.phase(name) if PROFILER is not None else _NO_PHASE
+
 
 def score_fun(a: str, 
               b: str,
@@ -29,64 +39,73 @@ def needleman_wunsch(seq1: str, seq2: str, score_fun: Callable = score_fun, gap_
             aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
         """
 
+    if PROFILER is not None:
+        score_fun = PROFILER.wrap(score_fun, 'score')
     m, n = len(seq1) + 1, len(seq2) + 1
-    matrix = [[0] * n for _ in range(m)]
-
-    for i in range(m):
-        matrix[i][0] = i * gap_score
-    for j in range(n):
-        matrix[0][j] = j * gap_score
-
-    for i in range(1, m):
-        for j in range(1, n):
-            matrix[i][j] = max(matrix[i - 1][j - 1] + score_fun(seq1[i - 1], seq2[j - 1]),
-                               matrix[i - 1][j] + gap_score,
-                               matrix[i][j - 1] + gap_score)
-    if DEBUG:
-        print_array(matrix)
-
-    score = matrix[-1][-1]
-    i, j = m - 1, n - 1
-    aln1 = ""
-    aln2 = ""
-    while i > 0 or j > 0:
-        a, b = '-', '-'
-        # (A, B)
-        if i > 0 and j > 0 and matrix[i][j] == matrix[i - 1][j - 1] + score_fun(seq1[i - 1], seq2[j - 1]):
-            a = seq1[i - 1]
-            b = seq2[j - 1]
-            i -= 1
-            j -= 1
-
-        # (A, -)
-        elif i > 0 and matrix[i][j] == matrix[i - 1][j] + gap_score:
-            a = seq1[i - 1]
-            i -= 1
-
-        # (-, A)
-        elif j > 0 and matrix[i][j] == matrix[i][j - 1] + gap_score:
-            b = seq2[j - 1]
-            j -= 1
-
-        aln1 += a
-        aln2 += b
+    with _phase('fill'):
+        matrix = [[0] * n for _ in range(m)]
+
+        for i in range(m):
+            matrix[i][0] = i * gap_score
+        for j in range(n):
+            matrix[0][j] = j * gap_score
+
+        for i in range(1, m):
+            for j in range(1, n):
+                matrix[i][j] = max(matrix[i - 1][j - 1] + score_fun(seq1[i - 1], seq2[j - 1]),
+                                   matrix[i - 1][j] + gap_score,
+                                   matrix[i][j - 1] + gap_score)
+    if PROFILER is not None:
+        PROFILER.count('cells', len(seq1) * len(seq2))
+        PROFILER.matrix('matrix', matrix)
+
+    with _phase('traceback'):
+        score = matrix[-1][-1]
+        i, j = m - 1, n - 1
+        aln1 = ""
+        aln2 = ""
+        while i > 0 or j > 0:
+            a, b = '-', '-'
+            # (A, B)
+            if i > 0 and j > 0 and matrix[i][j] == matrix[i - 1][j - 1] + score_fun(seq1[i - 1], seq2[j - 1]):
+                a = seq1[i - 1]
+                b = seq2[j - 1]
+                i -= 1
+                j -= 1
+
+            # (A, -)
+            elif i > 0 and matrix[i][j] == matrix[i - 1][j] + gap_score:
+                a = seq1[i - 1]
+                i -= 1
+
+            # (-, A)
+            elif j > 0 and matrix[i][j] == matrix[i][j - 1] + gap_score:
+                b = seq2[j - 1]
+                j -= 1
+
+            aln1 += a
+            aln2 += b
     return aln1[::-1], aln2[::-1], score
 
 def nw_score_evaluate(seq1: str, seq2: str, score: Callable = score_fun, gap_score: int = -5):
-    N, M = len(seq1) + 1, len(seq2) + 1
-    score_rows = [[0 for j in range(len(seq2) + 1)] for i in range(2)]
-    for j in range(M):
-        score_rows[0][j] = j*gap_score
-    for i in range(2):
-        score_rows[i][0] = i*gap_score
-
-    for i in range(1, N):
-        score_rows[(i-1) % 2][0] = (i-1)*gap_score
-        score_rows[i % 2][0] = i*gap_score
-        for j in range(1, M):
-            score_rows[i % 2][j] = max(score_rows[(i-1) % 2][j-1] + score(seq1[i-1], seq2[j-1]),
-                                   score_rows[(i-1) % 2][j] + gap_score,
-                                   score_rows[i % 2][j-1] + gap_score)
+    if PROFILER is not None:
+        score = PROFILER.wrap(score, 'score')
+        PROFILER.count('cells', len(seq1) * len(seq2))
+    with _phase('score_rows'):
+        N, M = len(seq1) + 1, len(seq2) + 1
+        score_rows = [[0 for j in range(len(seq2) + 1)] for i in range(2)]
+        for j in range(M):
+            score_rows[0][j] = j*gap_score
+        for i in range(2):
+            score_rows[i][0] = i*gap_score
+
+        for i in range(1, N):
+            score_rows[(i-1) % 2][0] = (i-1)*gap_score
+            score_rows[i % 2][0] = i*gap_score
+            for j in range(1, M):
+                score_rows[i % 2][j] = max(score_rows[(i-1) % 2][j-1] + score(seq1[i-1], seq2[j-1]),
+                                       score_rows[(i-1) % 2][j] + gap_score,
+                                       score_rows[i % 2][j-1] + gap_score)
     return score_rows[(N+1) % 2]
 
 
@@ -106,31 +125,26 @@ def hirschberg(seq1: str,
     aln2 - second sequence in alignment
     score - score of alignment
     '''
-    # Dealing with end of recursion when |sequences| < 2
-    if len(seq1) == 0:
-        return '-' * len(seq2), seq2, gap_score*len(seq2)
-    elif len(seq2) == 0:
-        return seq1, '-' * len(seq1), gap_score*len(seq1)
-    elif len(seq1) == 1 or len(seq2) == 1:
-        return needleman_wunsch(seq1, seq2, score, gap_score)
-    else:
-        i = len(seq1) // 2
-        # Evaluating needleman_wunsch scores for upper and lower halfs
-        s_up = nw_score_evaluate(seq1[:i], seq2, score, gap_score)
-        s_down = nw_score_evaluate(seq1[len(seq1):i-1:-1], seq2[::-1], score, gap_score)
-        # Finding pivot index for columns & continue evaluating on smaller matrices
-        s = [s_up[i] + s_down[len(seq2) - i] for i in range(len(seq2) + 1)]
-        j = s.index(max(s))
-        res_up = hirschberg(seq1[:i], seq2[:j], score, gap_score)
-        res_down = hirschberg(seq1[i:len(seq1)], seq2[j:len(seq2)], score, gap_score)
-        return res_up[0] + res_down[0], res_up[1] + res_down[1], res_up[2] + res_down[2]
-
-def print_array(matrix: list):
-    for row in matrix:
-        for element in row:
-            print(f"{element:6}", end="")
-        print()
-
+    # Every call is a node of the recursion, the nesting of the 'hirschberg' phase gives its depth
+    with _phase('hirschberg'):
+        # Dealing with end of recursion when |sequences| < 2
+        if len(seq1) == 0:
+            return '-' * len(seq2), seq2, gap_score*len(seq2)
+        elif len(seq2) == 0:
+            return seq1, '-' * len(seq1), gap_score*len(seq1)
+        elif len(seq1) == 1 or len(seq2) == 1:
+            return needleman_wunsch(seq1, seq2, score, gap_score)
+        else:
+            i = len(seq1) // 2
+            # Evaluating needleman_wunsch scores for upper and lower halfs
+            s_up = nw_score_evaluate(seq1[:i], seq2, score, gap_score)
+            s_down = nw_score_evaluate(seq1[len(seq1):i-1:-1], seq2[::-1], score, gap_score)
+            # Finding pivot index for columns & continue evaluating on smaller matrices
+            s = [s_up[i] + s_down[len(seq2) - i] for i in range(len(seq2) + 1)]
+            j = s.index(max(s))
+            res_up = hirschberg(seq1[:i], seq2[:j], score, gap_score)
+            res_down = hirschberg(seq1[i:len(seq1)], seq2[j:len(seq2)], score, gap_score)
+            return res_up[0] + res_down[0], res_up[1] + res_down[1], res_up[2] + res_down[2]
 
 
 if __name__ == "__main__":    
@@ -1,5 +1,14 @@
+from pathlib import Path
+import importlib.util
+
 import hirschberg.align as align
 
+# The Profiler of the needleman-wunsch lab, loaded from its file as the labs are not one package
+_spec = importlib.util.spec_from_file_location(
+    'instrument', Path(__file__).resolve().parents[2] / 'needleman-wunsch' / 'src' / 'instrument.py')
+instrument = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(instrument)
+
 def test_hirschberg_1():
     aln1, aln2, score = align.hirschberg("ACGT", "ACGT")
     assert len(aln1) == len(aln2)
@@ -134,4 +143,19 @@ def test_hirschberg_20():
     aln1, aln2, score = align.hirschberg("AAAAAAATTTTTTT", "TTTTTTTAAAAAAA", gap_score=-5)
     assert len(aln1) == len(aln2)
     assert len(aln1) == 21
-    assert score == -35
\ No newline at end of file
+    assert score == -35
+
+def test_hirschberg_21():
+    """The Profiler of needleman-wunsch gets the recursion's nodes and depth from the nesting of its phase"""
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, align):
+        result = align.hirschberg("ACGTACGT", "ACTTACGT", gap_score=-5)
+    assert align.PROFILER is None
+    assert result == align.hirschberg("ACGTACGT", "ACTTACGT", gap_score=-5)
+    phases = profiler.report()['phases']
+    # seq1 is halved on every level: 8, 4, 2, 1
+    assert phases['hirschberg']['depth'] == 4
+    assert phases['hirschberg']['calls'] >= 8
+    assert phases['score_rows']['calls'] == 2 * (phases['hirschberg']['calls'] - phases['fill']['calls'])
+    assert phases['fill']['calls'] == phases['traceback']['calls']
+    assert profiler.counters['cells'] > 8 * 8
@@ -1,10 +1,26 @@
+from contextlib import nullcontext
 from typing import Callable, Tuple
 import argparse
 import sys
 
 PRINT_MAX_LINE_LENGTH = 80
-DEBUG = False
 GLOBAL_MINIMUM = -10**10
+# Instrumentation hook, e.g. an instrument.Profiler from needleman-wunsch; None disables it
+PROFILER = None
+
+
+_NO_PHASE = nullcontext()
+
+
+def _phase(name: str):
+    return PROFILER.phase(name) if PROFILER is not None else _NO_PHASE
+
+
+def _band_cells(n: int, m: int, visible_range: int) -> int:
+    # Cells with |i - j| <= visible_range among i in 1..n, j in 1..m
+    if not visible_range:
+        return n * m
+    return sum(max(0, min(m, i + visible_range) - max(1, i - visible_range) + 1) for i in range(1, n + 1))
 
 
 def score_fun(a: str,  b: str, match_score: int = 5, mismatch_score: int = -4) -> int:
@@ -37,47 +53,56 @@ def needleman_wunsch(seq1: str,
         aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
     """
 
-    """ Initialize the score matrix.
-        If visible_range is defined we won't evaluate whole matrix, so it's important to set everything to GLOBAL_MINIMUM 
-        for restored aligned sequences to be correct
-    """
-    default_value = GLOBAL_MINIMUM if visible_range else 0
-    score_matrix = [[default_value for _ in range(len(seq2) + 1)] for _ in range(len(seq1) + 1)]
-    # Setting seeds: D(i,0) = i*gap, D(0,j) = j*gap
-    for i in range(len(seq1) + 1): score_matrix[i][0] = i * gap_penalty
-    for i in range(len(seq2) + 1): score_matrix[0][i] = i * gap_penalty
-    """ Evaluating score_matrix,
-        if visible range is defined and |i - j| > visible_range than score_matrix[i][j] shouldn't be evaluated
-    """
-    for i in range(1, len(seq1) + 1):
-        for j in range(1, len(seq2) + 1):
-            if visible_range and abs(i - j) > visible_range: continue
-            score_max = max(score_matrix[i - 1][j - 1] + score(seq1[i - 1], seq2[j - 1]),
-                            score_matrix[i - 1][j] + gap_penalty,
-                            score_matrix[i][j - 1] + gap_penalty)
-            score_matrix[i][j] = score_max
-    # Restoring aligned sequences: finding max among diag, up, left, then go there until i == 0 and j == 0
-    i, j = len(seq1), len(seq2)
-    aligned_seq1, aligned_seq2 = '', ''
-    while i != 0 or j != 0:
-        diag, up, left = (
-        score_matrix[i - 1][j - 1] + score(seq1[i - 1], seq2[j - 1]) if i >= 1 and j >= 1 else GLOBAL_MINIMUM,
-        score_matrix[i - 1][j] + gap_penalty if i >= 1 else GLOBAL_MINIMUM,
-        score_matrix[i][j - 1] + gap_penalty if j >= 1 else GLOBAL_MINIMUM)
-        i_step, j_step = 0, 0
-        push_seq1, push_seq2 = '-', '-'
-        if diag >= up and diag >= left:
-            push_seq1, push_seq2 = seq1[i - 1], seq2[j - 1]
-            i_step, j_step = -1, -1
-        elif up >= diag and up >= left:
-            push_seq1 = seq1[i - 1]
-            i_step = -1
-        elif left >= up and left >= diag:
-            push_seq2 = seq2[j - 1]
-            j_step = -1
-        i, j = i + i_step, j + j_step
-        aligned_seq1 = push_seq1 + aligned_seq1
-        aligned_seq2 = push_seq2 + aligned_seq2
+    if PROFILER is not None:
+        score = PROFILER.wrap(score, 'score')
+    with _phase('fill'):
+        """ Initialize the score matrix.
+            If visible_range is defined we won't evaluate whole matrix, so it's important to set everything to GLOBAL_MINIMUM 
+            for restored aligned sequences to be correct
+        """
+        default_value = GLOBAL_MINIMUM if visible_range else 0
+        score_matrix = [[default_value for _ in range(len(seq2) + 1)] for _ in range(len(seq1) + 1)]
+        # Setting seeds: D(i,0) = i*gap, D(0,j) = j*gap
+        for i in range(len(seq1) + 1): score_matrix[i][0] = i * gap_penalty
+        for i in range(len(seq2) + 1): score_matrix[0][i] = i * gap_penalty
+        """ Evaluating score_matrix,
+            if visible range is defined and |i - j| > visible_range than score_matrix[i][j] shouldn't be evaluated
+        """
+        for i in range(1, len(seq1) + 1):
+            for j in range(1, len(seq2) + 1):
+                if visible_range and abs(i - j) > visible_range: continue
+                score_max = max(score_matrix[i - 1][j - 1] + score(seq1[i - 1], seq2[j - 1]),
+                                score_matrix[i - 1][j] + gap_penalty,
+                                score_matrix[i][j - 1] + gap_penalty)
+                score_matrix[i][j] = score_max
+    if PROFILER is not None:
+        in_band = _band_cells(len(seq1), len(seq2), visible_range)
+        PROFILER.count('cells', in_band)
+        PROFILER.count('cells_skipped', len(seq1) * len(seq2) - in_band)
+        PROFILER.matrix('score_matrix', score_matrix)
+    with _phase('traceback'):
+        # Restoring aligned sequences: finding max among diag, up, left, then go there until i == 0 and j == 0
+        i, j = len(seq1), len(seq2)
+        aligned_seq1, aligned_seq2 = '', ''
+        while i != 0 or j != 0:
+            diag, up, left = (
+            score_matrix[i - 1][j - 1] + score(seq1[i - 1], seq2[j - 1]) if i >= 1 and j >= 1 else GLOBAL_MINIMUM,
+            score_matrix[i - 1][j] + gap_penalty if i >= 1 else GLOBAL_MINIMUM,
+            score_matrix[i][j - 1] + gap_penalty if j >= 1 else GLOBAL_MINIMUM)
+            i_step, j_step = 0, 0
+            push_seq1, push_seq2 = '-', '-'
+            if diag >= up and diag >= left:
+                push_seq1, push_seq2 = seq1[i - 1], seq2[j - 1]
+                i_step, j_step = -1, -1
+            elif up >= diag and up >= left:
+                push_seq1 = seq1[i - 1]
+                i_step = -1
+            elif left >= up and left >= diag:
+                push_seq2 = seq2[j - 1]
+                j_step = -1
+            i, j = i + i_step, j + j_step
+            aligned_seq1 = push_seq1 + aligned_seq1
+            aligned_seq2 = push_seq2 + aligned_seq2
     return score_matrix[-1][-1], aligned_seq1, aligned_seq2
 
 def needleman_wunsch_k(seq1: str,
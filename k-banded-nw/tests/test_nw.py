@@ -1,26 +1,29 @@
-import datetime
+from pathlib import Path
+import importlib.util
+
 import src.nw as align
 
+# The Profiler of the needleman-wunsch lab, loaded from its file as the labs are not one package
+_spec = importlib.util.spec_from_file_location(
+    'instrument', Path(__file__).resolve().parents[2] / 'needleman-wunsch' / 'src' / 'instrument.py')
+instrument = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(instrument)
+
 def test_nw_1():
     """Identical sequences, match=5, mismatch=-4, gap=-10, range=1
-        results should be equal, but banded algorithm should be faster
+        results should be equal; speed is measured by benchmarks/run.py, not here
     """
     seq1 = 'ACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGT'
     seq2 = 'ACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGTACGT'
-    start = datetime.datetime.now()
     result1 = align.needleman_wunsch(seq1,
                                      seq2,
                                      score=lambda x, y: 5 if x == y else -4,
                                      gap_penalty=-10)
-    elapsed_time1 = datetime.datetime.now() - start
-    start = datetime.datetime.now()
     result2 = align.needleman_wunsch_k(seq1,
                                      seq2,
                                      score=lambda x, y: 5 if x == y else -4,
                                      gap_penalty=-10,
                                      visible_range=1)
-    elapsed_time2 = datetime.datetime.now() - start
-    assert elapsed_time1 > elapsed_time2
     assert result1 == result2
 
 def test_nw_2():
@@ -58,6 +61,16 @@ def test_nw_3():
     assert aligned_seq2 == 'CCCCCC'
 
 
+def test_nw_4():
+    """Cells inside and outside the band, 6x6 matrix with visible_range=1: 6 + 2 * 5 cells in the band"""
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, align):
+        result = align.needleman_wunsch_k('ACGTAC', 'ACGTTC', visible_range=1)
+    assert result == align.needleman_wunsch_k('ACGTAC', 'ACGTTC', visible_range=1)
+    assert list(profiler.phases) == ['fill', 'traceback']
+    assert profiler.counters == {'cells': 16, 'cells_skipped': 36 - 16}
+
 test_nw_1()
 test_nw_2()
 test_nw_3()
+test_nw_4()
@@ -0,0 +1,146 @@
+"""Batched Needleman-Wunsch: many short pairs advanced in lockstep.
+
+Pairs of similar length are packed into 2-D arrays and their DP matrices are
+filled together, one row of every matrix per step. Shorter pairs are padded:
+cells beyond a pair's own lengths are computed but never read, because the DP
+only depends on smaller indices. The traceback also runs in lockstep, with
+finished pairs masked out, and follows the tie-breaking of `needleman_wunsch`,
+so every result is identical to it. The matrices hold row-relative scores
+D(i,j) - i*gap in the narrowest integer type for the batch's longest second
+sequence, int16 for reads and amplicons, so a batch takes a quarter of the
+memory of int64 matrices.
+"""
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .instrument import phase
+from .kernels import build_alphabet, encode, linear_bound, score_dtype, substitution_table
+from .nw import GLOBAL_MINIMUM, score_fun
+
+# Traceback moves, in the priority order of needleman_wunsch
+DIAG, UP, LEFT = 0, 1, 2
+GAP = ord('-')
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+
+def plan_batches(pairs: Sequence[Tuple[str, str]], batch_size: int = 256, max_cells: int = 1 << 22) -> Iterator[List[int]]:
+    """Groups pair indices into batches of similar lengths.
+
+    Pairs are sorted by length and cut into batches of at most batch_size
+    pairs whose padded matrices hold at most max_cells cells in total (a
+    single larger pair still gets a batch of its own).
+    """
+    order = sorted(range(len(pairs)), key=lambda k: (len(pairs[k][0]), len(pairs[k][1])))
+    batch, rows, columns = [], 0, 0
+    for k in order:
+        n, m = max(rows, len(pairs[k][0]) + 1), max(columns, len(pairs[k][1]) + 1)
+        if batch and (len(batch) == batch_size or (len(batch) + 1) * n * m > max_cells):
+            yield batch
+            batch, n, m = [], len(pairs[k][0]) + 1, len(pairs[k][1]) + 1
+        batch.append(k)
+        rows, columns = n, m
+    if batch:
+        yield batch
+
+
+def _pack(sequences: Sequence[str], alphabet: str, width: int):
+    codes = np.zeros((len(sequences), width), dtype=np.intp)
+    chars = np.full((len(sequences), width), GAP, dtype=np.uint8)
+    for k, seq in enumerate(sequences):
+        codes[k, :len(seq)] = encode(seq, alphabet)
+        chars[k, :len(seq)] = np.frombuffer(seq.encode('latin-1'), dtype=np.uint8)
+    return codes, chars
+
+
+def _align_packed(seqs1, seqs2, alphabet, table, gap_penalty):
+    count = len(seqs1)
+    lengths1 = np.array([len(seq) for seq in seqs1], dtype=np.intp)
+    lengths2 = np.array([len(seq) for seq in seqs2], dtype=np.intp)
+    n, m = int(lengths1.max()), int(lengths2.max())
+    codes1, chars1 = _pack(seqs1, alphabet, max(1, n))
+    codes2, chars2 = _pack(seqs2, alphabet, max(1, m))
+
+    with phase(PROFILER, 'fill'):
+        # 1. Fill all matrices row by row: diagonal and vertical moves, then horizontal moves as a prefix maximum,
+        # in R(i,j) = D(i,j) - i*gap where the vertical move is free and the diagonal one scores score - gap
+        dtype = score_dtype(linear_bound(m, table, gap_penalty))
+        relative = (table - gap_penalty).astype(dtype)
+        ramp = np.arange(m + 1, dtype=dtype) * dtype.type(gap_penalty)
+        matrices = np.empty((count, n + 1, m + 1), dtype=dtype)
+        matrices[:, 0, :] = ramp
+        candidates = np.empty((count, m + 1), dtype=dtype)
+        candidates[:, 0] = 0
+        for i in range(1, n + 1):
+            previous = matrices[:, i - 1, :]
+            np.maximum(previous[:, :-1] + relative[codes1[:, i - 1, None], codes2[:, :m]], previous[:, 1:],
+                       out=candidates[:, 1:])
+            matrices[:, i, :] = np.maximum.accumulate(candidates - ramp, axis=1) + ramp
+        batch = np.arange(count)
+        scores = matrices[batch, lengths1, lengths2].astype(np.int64) + lengths1 * gap_penalty
+    if PROFILER is not None:
+        cells = int(lengths1 @ lengths2)
+        PROFILER.count('cells', cells)
+        PROFILER.count('cells_padded', count * n * m - cells)
+    with phase(PROFILER, 'traceback'):
+        # 2. Traceback of every pair at once, finished pairs stay in place
+        i, j = lengths1.copy(), lengths2.copy()
+        aligned1 = np.full((count, n + m), GAP, dtype=np.uint8)
+        aligned2 = np.full((count, n + m), GAP, dtype=np.uint8)
+        steps = np.zeros(count, dtype=np.intp)
+        for step in range(n + m):
+            active = (i > 0) | (j > 0)
+            if not active.any():
+                break
+            has_i, has_j = i >= 1, j >= 1
+            # The moves of needleman_wunsch less i*gap, widened so that GLOBAL_MINIMUM fits
+            diag = np.where(has_i & has_j, matrices[batch, i - 1, j - 1].astype(np.int64)
+                            + table[codes1[batch, i - 1], codes2[batch, j - 1]] - gap_penalty, GLOBAL_MINIMUM)
+            up = np.where(has_i, matrices[batch, i - 1, j].astype(np.int64), GLOBAL_MINIMUM)
+            left = np.where(has_j, matrices[batch, i, j - 1].astype(np.int64) + gap_penalty, GLOBAL_MINIMUM)
+            move = np.where((diag >= up) & (diag >= left), DIAG, np.where(up >= left, UP, LEFT))
+            take1 = active & (move != LEFT)
+            take2 = active & (move != UP)
+            aligned1[take1, step] = chars1[batch, i - 1][take1]
+            aligned2[take2, step] = chars2[batch, j - 1][take2]
+            i -= take1
+            j -= take2
+            steps += active
+    return [(scores[k].item(),
+             aligned1[k, steps[k] - 1::-1].tobytes().decode('latin-1') if steps[k] else '',
+             aligned2[k, steps[k] - 1::-1].tobytes().decode('latin-1') if steps[k] else '')
+            for k in range(count)]
+
+
+def align_batch(pairs: Sequence[Tuple[str, str]],
+                score: Callable[[str, str], int] = score_fun,
+                gap_penalty: int = -10,
+                batch_size: int = 256,
+                max_cells: int = 1 << 22) -> List[Tuple[int, str, str]]:
+    """Aligns many pairs of sequences with the Needleman-Wunsch algorithm.
+
+    The results are identical to calling needleman_wunsch on every pair, but
+    pairs of similar length share their NumPy operations, which pays off for
+    large numbers of short pairs such as reads against amplicons.
+
+    Args:
+        pairs: The pairs to align, e.g. [('ACCGT', 'ACGT'), ('ACG', 'ACGT')]
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_penalty: The gap penalty value, e.g. -10
+        batch_size: The largest number of pairs aligned in lockstep, e.g. 256
+        max_cells: The largest number of DP cells held at once by one batch
+
+    Returns:
+        results: (score, aligned_seq1, aligned_seq2) for every pair, in input order
+    """
+    pairs = list(pairs)
+    alphabet = build_alphabet(seq for pair in pairs for seq in pair)
+    table = substitution_table(score, alphabet).astype(np.int64)
+    results = [None] * len(pairs)
+    for batch in plan_batches(pairs, batch_size, max_cells):
+        aligned = _align_packed([pairs[k][0] for k in batch], [pairs[k][1] for k in batch],
+                                alphabet, table, gap_penalty)
+        for k, result in zip(batch, aligned):
+            results[k] = result
+    return results
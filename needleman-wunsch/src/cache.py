@@ -0,0 +1,189 @@
+"""Content-addressed cache for alignment results.
+
+Results are keyed by a hash of the engine name, the two sequences and the
+scoring parameters. Scoring functions enter the key as their substitution
+table over the characters of the pair, never as the identity of the callable,
+so two lambdas that score alike share their entries and a changed scoring
+function never returns stale results.
+
+Entries live in a bounded in-memory LRU and, when a path is given, in an
+sqlite file that survives restarts and is trimmed to `max_disk_bytes` by
+evicting the least recently used entries first.
+"""
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Iterable, Optional, Tuple
+import hashlib
+import inspect
+import json
+import sqlite3
+import time
+
+
+def scoring_table(score: Callable[[str, str], Any], alphabet: str) -> list:
+    """The substitution table of a scoring function over an alphabet, as nested lists."""
+    return [[score(a, b) for b in alphabet] for a in alphabet]
+
+
+def alignment_key(engine: str, seq1: str, seq2: str, **params) -> str:
+    """Hashes everything that determines an alignment result.
+
+    Args:
+        engine: The aligner name, e.g. 'nw' or 'hirschberg'
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        params: The scoring parameters, e.g. score=score_fun, gap_penalty=-10;
+            callables are replaced by their substitution table over the
+            characters of seq1 and seq2
+
+    Returns:
+        key: A hex digest, e.g. '9f86d0...'
+    """
+    alphabet = ''.join(sorted(set(seq1) | set(seq2)))
+    scoring = {name: {'table': scoring_table(value, alphabet)} if callable(value) else value
+               for name, value in sorted(params.items())}
+    digest = hashlib.sha256()
+    header = json.dumps([engine, alphabet, scoring, len(seq1), len(seq2)], sort_keys=True, default=repr)
+    digest.update(header.encode())
+    digest.update(b'\0' + seq1.encode() + b'\0' + seq2.encode())
+    return digest.hexdigest()
+
+
+class AlignmentCache:
+    """Two-tier result cache: an LRU in memory, optionally backed by an sqlite file.
+
+    Args:
+        max_entries: The number of results kept in memory, e.g. 4096
+        path: The sqlite file of the on-disk tier, None keeps everything in memory
+        max_disk_bytes: The size of the stored results the on-disk tier is trimmed to
+    """
+
+    def __init__(self, max_entries: int = 4096, path: str = None, max_disk_bytes: int = 1 << 30):
+        self.max_entries, self.max_disk_bytes = max_entries, max_disk_bytes
+        self._memory = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+                      'evictions': 0, 'disk_evictions': 0, 'disk_bytes': 0}
+        self._db = None
+        if path is not None:
+            # Usable from another thread, e.g. the cache I/O thread of service.AlignmentServer, one at a time
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS results '
+                             '(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+            self._db.commit()
+            self.stats['disk_bytes'] = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def __len__(self):
+        return len(self._memory)
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Returns the cached result for a key, or None."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['memory_hits'] += 1
+            return self._memory[key]
+        if self._db is not None:
+            row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._db.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+                self._db.commit()
+                result = tuple(json.loads(row[0]))
+                self._remember(key, result)
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                return result
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, result: tuple):
+        """Stores a result in memory and, if enabled, on disk."""
+        self.put_many([(key, result)])
+
+    def put_many(self, items: Iterable[Tuple[str, tuple]]):
+        """Stores (key, result) pairs, on disk in a single transaction."""
+        items = [(key, tuple(result)) for key, result in items]
+        for key, result in items:
+            self._remember(key, result)
+        if self._db is None or not items:
+            return
+        for key, result in items:
+            value = json.dumps(list(result))
+            previous = self._db.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                             (key, value, len(value), time.time()))
+            self.stats['disk_bytes'] += len(value) - (previous[0] if previous else 0)
+        while self.stats['disk_bytes'] > self.max_disk_bytes:
+            # Drop the least recently used tenth of the entries at a time
+            count = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            victims = self._db.execute('SELECT key, size FROM results ORDER BY used LIMIT ?',
+                                       (max(1, count // 10),)).fetchall()
+            self._db.executemany('DELETE FROM results WHERE key = ?', [(victim,) for victim, _ in victims])
+            self.stats['disk_bytes'] -= sum(size for _, size in victims)
+            self.stats['disk_evictions'] += len(victims)
+        self._db.commit()
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def hit_rate(self) -> float:
+        """The fraction of lookups answered from either tier."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def engine_name(aligner: Callable) -> str:
+    """The default engine name of an aligner, the same whichever package path imported it.
+
+    An aligner may name itself with a versioned `engine` attribute, e.g. 'nw/1' for
+    needleman_wunsch, so that src.nw and bioalign.nw.nw share one cache file. Otherwise
+    the name is its module's own name and its qualified name, e.g. 'align.hirschberg'.
+    """
+    engine = getattr(aligner, 'engine', None)
+    if engine is not None:
+        return engine
+    return '%s.%s' % (aligner.__module__.rpartition('.')[2], aligner.__qualname__)
+
+
+def cached(aligner: Callable, cache: AlignmentCache, engine: str = None) -> Callable:
+    """Wraps an aligner so that its results are looked up in the cache first.
+
+    Works for every aligner taking the two sequences as its first arguments,
+    e.g. cached(needleman_wunsch, cache) or cached(hirschberg, cache, 'hirschberg').
+    All other arguments, defaults included, become part of the key.
+
+    Args:
+        aligner: The function to wrap, e.g. needleman_wunsch
+        cache: The cache to use
+        engine: The name the results are stored under, defaults to engine_name(aligner)
+    """
+    signature = inspect.signature(aligner)
+    first, second = list(signature.parameters)[:2]
+    engine = engine or engine_name(aligner)
+
+    @wraps(aligner)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        seq1, seq2 = params.pop(first), params.pop(second)
+        key = alignment_key(engine, seq1, seq2, **params)
+        result = cache.get(key)
+        if result is None:
+            result = aligner(*args, **kwargs)
+            cache.put(key, result)
+        return result
+
+    wrapper.cache = cache
+    return wrapper
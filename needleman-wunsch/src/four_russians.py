@@ -0,0 +1,341 @@
+"""Four-Russians block lookups for edit distance and unit-cost Needleman-Wunsch.
+
+In the unit-cost edit distance matrix neighbouring cells differ by -1, 0 or 1,
+so a t x t block is fully described by its corner, the offsets along its top
+row and left column, and which characters of the two substrings are equal.
+Its bottom row and right column offsets depend only on those, and are looked
+up in a table precomputed for every (top, left, equality mask) combination.
+The matrix is then filled one block at a time, a whole anti-diagonal of blocks
+per NumPy call. The table does not depend on the alphabet: 3^t * 3^t * 2^(t*t)
+entries, 373248 for t = 3. It grows too fast for the t = log n of the textbook
+method (430 million entries at t = 4), so t is fixed and the fill costs
+n*m / t^2 lookups instead of n*m cell updates.
+
+A linear-gap scheme with match a, mismatch b and gap g is an edit distance in
+disguise when a - 2g == 2 * (b - 2g) > 0: with c = b - 2g every alignment
+scores (g + c) * (n + m) - c * (mismatches + gaps), so both problems have the
+same optimal alignments and one table serves every such scheme. Other schemes
+are rejected.
+
+The table is persisted as a .npy file in a cache directory, by default
+$NW_CACHE_DIR or ~/.cache/needleman-wunsch. A traceback keeps one byte of
+offsets per block side and recomputes the t x t cells of the blocks on the
+path, with the tie-breaking of `needleman_wunsch`.
+"""
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import os
+
+import numpy as np
+
+from .instrument import phase
+from .nw import score_fun
+
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+# The block size, the largest whose table fits comfortably in memory
+BLOCK = 3
+_TABLES: Dict[int, np.ndarray] = {}
+_LOOKUPS: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+_PAIRS: Dict[Tuple[int, int], np.ndarray] = {}
+
+
+def default_cache_dir() -> Path:
+    return Path(os.environ.get('NW_CACHE_DIR') or Path.home() / '.cache' / 'needleman-wunsch')
+
+
+def _offsets(index: int, t: int) -> List[int]:
+    # An offset vector is stored as base-3 digits offset + 1, the first offset in the lowest digit
+    return [(index // 3 ** k) % 3 - 1 for k in range(t)]
+
+
+def _build_table(t: int) -> np.ndarray:
+    # All combinations at once: index = (top * 3^t + left) * 2^(t*t) + mask, mask bit p*t + q is a[p] == b[q]
+    vectors, masks = 3 ** t, 2 ** (t * t)
+    index = np.arange(vectors * vectors * masks, dtype=np.int64)
+    mask, left, top = index % masks, index // masks % vectors, index // (masks * vectors)
+    rel = [[None] * (t + 1) for _ in range(t + 1)]
+    rel[0][0] = np.zeros(len(index), dtype=np.int8)
+    for k in range(1, t + 1):
+        rel[0][k] = rel[0][k - 1] + (top // 3 ** (k - 1) % 3 - 1).astype(np.int8)
+        rel[k][0] = rel[k - 1][0] + (left // 3 ** (k - 1) % 3 - 1).astype(np.int8)
+    for p in range(1, t + 1):
+        for q in range(1, t + 1):
+            mismatch = 1 - (mask >> ((p - 1) * t + q - 1) & 1).astype(np.int8)
+            rel[p][q] = np.minimum(rel[p - 1][q - 1] + mismatch, np.minimum(rel[p - 1][q], rel[p][q - 1]) + 1)
+    table = np.zeros((2, len(index)), dtype=np.uint8)
+    for k in range(1, t + 1):
+        table[0] += ((rel[t][k] - rel[t][k - 1] + 1) * 3 ** (k - 1)).astype(np.uint8)
+        table[1] += ((rel[k][t] - rel[k - 1][t] + 1) * 3 ** (k - 1)).astype(np.uint8)
+    return table
+
+
+def block_table(t: int = BLOCK, cache_dir: str = None) -> np.ndarray:
+    """Returns the block table for t x t blocks, loading or building and saving it as needed.
+
+    Args:
+        t: The block size, 1 to 3
+        cache_dir: Where the table is persisted, e.g. '/tmp/nw'; defaults to default_cache_dir()
+
+    Returns:
+        table: (2, 3^t * 3^t * 2^(t*t)) uint8 array, the bottom row and right column offset vectors
+            of the block with index (top * 3^t + left) * 2^(t*t) + mask
+    """
+    if not 1 <= t <= 3:
+        raise ValueError("block size must be 1 to 3, got %d" % t)
+    table = _TABLES.get(t)
+    if table is not None:
+        return table
+    path = Path(cache_dir or default_cache_dir()) / ('four_russians_t%d.npy' % t)
+    size = 9 ** t * 2 ** (t * t)
+    try:
+        table = np.load(path)
+    except (OSError, ValueError):
+        table = None
+    if table is None or table.shape != (2, size) or table.dtype != np.uint8:
+        with phase(PROFILER, 'block_table'):
+            table = _build_table(t)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Written next to the target and renamed, so a concurrent reader never loads half a file
+            temporary = path.with_name('%s.%d.tmp.npy' % (path.stem, os.getpid()))
+            np.save(temporary, table)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+    _TABLES[t] = table
+    return table
+
+
+def _lookup(t: int, cache_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    # The two halves of the table scaled to their place in the index, so that index = bottom + right + mask
+    lookup = _LOOKUPS.get(t)
+    if lookup is None:
+        table, vectors, masks = block_table(t, cache_dir), 3 ** t, 2 ** (t * t)
+        lookup = _LOOKUPS[t] = (table[0].astype(np.int32) * (vectors * masks), table[1].astype(np.int32) * masks)
+    return lookup
+
+
+def unit_cost(score: Callable[[str, str], int], gap_penalty: int, alphabet: str) -> int:
+    """Checks that a scoring scheme is an edit distance in disguise and returns a - 2g.
+
+    Args:
+        score: The scoring function, e.g. lambda a, b: 0 if a == b else -1
+        gap_penalty: The gap penalty value, e.g. -1
+        alphabet: The characters the scheme is used on, e.g. 'ACGT'
+
+    Returns:
+        scale: a - 2g, an alignment with D mismatches and gaps scores g * (n + m) + scale * (n + m - D) / 2
+    """
+    g = gap_penalty
+    matches = {score(x, x) for x in alphabet}
+    mismatches = {score(x, y) for x in alphabet for y in alphabet if x != y}
+    if len(matches) > 1 or len(mismatches) > 1:
+        raise ValueError("the Four-Russians engine needs one match and one mismatch score, got %s and %s"
+                         % (sorted(matches), sorted(mismatches)))
+    if not matches:
+        return 2
+    a, b = matches.pop(), mismatches.pop() if mismatches else None
+    scale = a - 2 * g
+    if scale <= 0 or b is not None and 2 * (b - 2 * g) != scale:
+        raise ValueError("match %d, mismatch %s and gap %d are not unit-cost: match - 2*gap must be positive "
+                         "and twice mismatch - 2*gap" % (a, b, g))
+    return scale
+
+
+def _encode(seq1: str, seq2: str, t: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    # Both sequences as (blocks, t) codes and the number of codes; the padding of seq1 and seq2 gets one
+    # code each, that equals nothing else. Cells past the ends are computed but never read
+    alphabet = {char: code for code, char in enumerate(sorted(set(seq1) | set(seq2)))}
+    size = len(alphabet)
+    a = np.full(-(-len(seq1) // t) * t, size, dtype=np.int64)
+    b = np.full(-(-len(seq2) // t) * t, size + 1, dtype=np.int64)
+    a[:len(seq1)] = [alphabet[char] for char in seq1]
+    b[:len(seq2)] = [alphabet[char] for char in seq2]
+    return a.reshape(-1, t), b.reshape(-1, t), size + 2
+
+
+def _masks(a: np.ndarray, b: np.ndarray, codes: int, t: int) -> Callable[[int, int, int], np.ndarray]:
+    """Returns mask(lo, hi, d), the equality masks of the blocks (lo, d - lo) .. (hi, d - hi)."""
+    if codes ** t > 512:
+        weights = 1 << np.arange(t * t, dtype=np.int64).reshape(t, t)
+
+        def mask(lo, hi, d):
+            equal = a[lo:hi + 1, :, None] == b[d - hi:d - lo + 1][::-1, None, :]
+            return (equal * weights).sum(axis=(1, 2))
+        return mask
+    # Small alphabets: every block is one number in base `codes` and the mask of every pair of blocks
+    # is tabulated, one lookup per block instead of t * t comparisons
+    powers = codes ** np.arange(t, dtype=np.int64)
+    pairs = _PAIRS.get((codes, t))
+    if pairs is None:
+        digits = np.arange(codes ** t)[:, None] // powers % codes
+        pairs = np.zeros((codes ** t, codes ** t), dtype=np.int32)
+        for p in range(t):
+            for q in range(t):
+                pairs |= (digits[:, None, p] == digits[None, :, q]).astype(np.int32) << (p * t + q)
+        pairs = _PAIRS[codes, t] = pairs.ravel()
+    rows, cols = (a @ powers) * codes ** t, b @ powers
+
+    def mask(lo, hi, d):
+        return pairs[rows[lo:hi + 1] + cols[d - hi:d - lo + 1][::-1]]
+    return mask
+
+
+def _fill(seq1: str, seq2: str, t: int, lookup: Tuple[np.ndarray, np.ndarray], keep: bool):
+    """Fills the blocks of the (non-empty) matrix by anti-diagonals, all but the one with cell (n, m).
+
+    Returns the top and left offset indices of that last block, the distance at its top left corner,
+    and with keep the offsets of every block as (first block row, bottom, right) per anti-diagonal.
+    """
+    a, b, codes = _encode(seq1, seq2, t)
+    rows, cols = len(a), len(b)
+    vectors, masks = 3 ** t, 2 ** (t * t)
+    mask = _masks(a, b, codes, t)
+    bottoms, rights = lookup
+    sums = np.array([sum(_offsets(index, t)) for index in range(vectors)], dtype=np.int64)
+    # bottom[bi + 1] and right[bi] hold the scaled offsets of the last block computed in block row bi,
+    # row 0 and column 0 have every offset +1
+    bottom = np.full(rows + 1, (vectors - 1) * vectors * masks, dtype=np.int32)
+    right = np.full(rows, (vectors - 1) * masks, dtype=np.int32)
+    kept = [] if keep else None
+    corner = (rows - 1) * t if rows > 1 else (cols - 1) * t
+    for d in range(rows + cols - 2):
+        lo, hi = max(0, d - cols + 1), min(d, rows - 1)
+        index = bottom[lo:hi + 1] + right[lo:hi + 1] + mask(lo, hi, d)
+        bottom[lo + 1:hi + 2], right[lo:hi + 1] = bottoms[index], rights[index]
+        if keep:
+            kept.append((lo, (bottom[lo + 1:hi + 2] // (vectors * masks)).astype(np.uint8),
+                         (right[lo:hi + 1] // masks).astype(np.uint8)))
+        if rows > 1 and lo <= rows - 2 <= hi and d - (rows - 2) < cols - 1:
+            # Distance along the top row of the last block row, D((rows - 1) * t, j * t)
+            corner += sums[bottom[rows - 1] // (vectors * masks)]
+    if PROFILER is not None:
+        PROFILER.count('blocks', rows * cols)
+        PROFILER.count('cells', len(seq1) * len(seq2))
+    return int(bottom[rows - 1] // (vectors * masks)), int(right[rows - 1] // masks), int(corner), kept
+
+
+def _grid(top: int, left: int, a: str, b: str, t: int) -> List[List[int]]:
+    # The distances of one block relative to its top left corner, rows 0..len(a) and columns 0..len(b)
+    grid = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for q, offset in enumerate(_offsets(top, t)[:len(b)], 1):
+        grid[0][q] = grid[0][q - 1] + offset
+    for p, offset in enumerate(_offsets(left, t)[:len(a)], 1):
+        grid[p][0] = grid[p - 1][0] + offset
+    for p in range(1, len(a) + 1):
+        above, row = grid[p - 1], grid[p]
+        for q in range(1, len(b) + 1):
+            row[q] = min(above[q - 1] + (a[p - 1] != b[q - 1]), above[q] + 1, row[q - 1] + 1)
+    return grid
+
+
+def _distance(seq1: str, seq2: str, t: int, cache_dir: str, keep: bool = False):
+    lookup = _lookup(t, cache_dir)
+    n, m = len(seq1), len(seq2)
+    if n == 0 or m == 0:
+        return n + m, None
+    with phase(PROFILER, 'fill'):
+        top, left, corner, kept = _fill(seq1, seq2, t, lookup, keep)
+        i0, j0 = (n - 1) // t * t, (m - 1) // t * t
+        grid = _grid(top, left, seq1[i0:n], seq2[j0:m], t)
+    return corner + grid[-1][-1], kept
+
+
+def edit_distance(seq1: str, seq2: str, block: int = BLOCK, cache_dir: str = None) -> int:
+    """Returns the Levenshtein distance of two sequences, e.g. 1 for 'ACCGT' and 'ACGT'.
+
+    Args:
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        block: The block size t, 1 to 3
+        cache_dir: Where the block table is persisted, defaults to default_cache_dir()
+    """
+    return _distance(seq1, seq2, block, cache_dir)[0]
+
+
+def four_russians_score(seq1: str,
+                        seq2: str,
+                        score: Callable[[str, str], int] = score_fun,
+                        gap_penalty: int = -10,
+                        block: int = BLOCK,
+                        cache_dir: str = None) -> int:
+    """Returns the Needleman-Wunsch score of a unit-cost scheme, equal to needleman_wunsch(...)[0].
+
+    Keeps one anti-diagonal of block offsets, so the memory is linear in the sequence lengths.
+    Raises ValueError for schemes that are not unit-cost, see unit_cost().
+    """
+    scale = unit_cost(score, gap_penalty, ''.join(sorted(set(seq1) | set(seq2))))
+    distance = edit_distance(seq1, seq2, block, cache_dir)
+    total = len(seq1) + len(seq2)
+    return gap_penalty * total + scale * (total - distance) // 2
+
+
+def needleman_wunsch_4r(seq1: str,
+                        seq2: str,
+                        score: Callable[[str, str], int] = score_fun,
+                        gap_penalty: int = -10,
+                        block: int = BLOCK,
+                        cache_dir: str = None) -> Tuple[int, str, str]:
+    """Aligns two sequences under a unit-cost scheme with block lookups.
+
+    Args:
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        score: The scoring function, e.g. lambda a, b: 0 if a == b else -1; must be unit-cost,
+            see unit_cost(), or ValueError is raised
+        gap_penalty: The gap penalty value, e.g. -1
+        block: The block size t, 1 to 3
+        cache_dir: Where the block table is persisted, defaults to default_cache_dir()
+
+    Returns:
+        score: The optimal alignment score, e.g. -1
+        aligned_seq1: The first aligned sequence, e.g. 'ACCGT'
+        aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
+        The same result as needleman_wunsch(seq1, seq2, score, gap_penalty).
+    """
+    t = block
+    scale = unit_cost(score, gap_penalty, ''.join(sorted(set(seq1) | set(seq2))))
+    distance, kept = _distance(seq1, seq2, t, cache_dir, keep=True)
+    boundary = 3 ** t - 1
+    with phase(PROFILER, 'traceback'):
+        i, j = len(seq1), len(seq2)
+        aligned1, aligned2 = [], []
+        while i > 0 and j > 0:
+            # The block that owns cell (i, j); its grid also holds D(i - 1, j - 1), D(i - 1, j) and D(i, j - 1)
+            bi, bj = (i - 1) // t, (j - 1) // t
+            i0, j0 = bi * t, bj * t
+            # Its inputs are outputs of the blocks above and to the left, both on the previous anti-diagonal
+            lo, bottoms, rights = kept[bi + bj - 1] if bi + bj else (0, None, None)
+            top = int(bottoms[bi - 1 - lo]) if bi else boundary
+            side = int(rights[bi - lo]) if bj else boundary
+            a, b = seq1[i0:min(i0 + t, i)], seq2[j0:min(j0 + t, j)]
+            grid = _grid(top, side, a, b, t)
+            if PROFILER is not None:
+                PROFILER.count('blocks_recomputed')
+            while i > i0 and j > j0:
+                p, q = i - i0, j - j0
+                # Distances are minimized, needleman_wunsch maximizes scores: the same choices, reversed order
+                diag = grid[p - 1][q - 1] + (a[p - 1] != b[q - 1])
+                up, left = grid[p - 1][q] + 1, grid[p][q - 1] + 1
+                if diag <= up and diag <= left:
+                    aligned1.append(a[p - 1])
+                    aligned2.append(b[q - 1])
+                    i, j = i - 1, j - 1
+                elif up <= left:
+                    aligned1.append(a[p - 1])
+                    aligned2.append('-')
+                    i -= 1
+                else:
+                    aligned1.append('-')
+                    aligned2.append(b[q - 1])
+                    j -= 1
+        # Only one sequence is left, the rest are gaps
+        aligned1.extend(reversed(seq1[:i]))
+        aligned2.extend('-' * i)
+        aligned1.extend('-' * j)
+        aligned2.extend(reversed(seq2[:j]))
+    total = len(seq1) + len(seq2)
+    return (gap_penalty * total + scale * (total - distance) // 2,
+            ''.join(reversed(aligned1)), ''.join(reversed(aligned2)))
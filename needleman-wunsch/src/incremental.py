@@ -0,0 +1,189 @@
+"""Needleman-Wunsch alignment against a second sequence that keeps growing.
+
+`IncrementalAligner` keeps the last DP column, D(0..n, j) for the current
+length j of seq2, and appends one column per new character in O(n) vectorized
+work: diagonal and horizontal moves give candidates T(i), then the vertical
+moves are resolved with a prefix maximum, D(i,j) = max_{k<=i} T(k) + (i-k)*gap,
+the same trick as `kernels.nw_last_row` with rows and columns swapped.
+
+With a band, only the cells with |i - j| <= band are computed, as in
+`needleman_wunsch_k`, and the frontier shrinks to the band.
+
+A copy of every `checkpoint_every`-th column is kept. A traceback recomputes
+the columns between two checkpoints at a time, walking from the last block to
+the first, so it never holds more than one block of the matrix; it follows the
+tie-breaking of `needleman_wunsch`, so the result is identical to aligning
+from scratch.
+"""
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .instrument import phase
+from .nw import GLOBAL_MINIMUM, score_fun
+
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+
+# A column of the DP matrix: the first stored row and the values of rows lo .. lo + len(values) - 1,
+# row 0 is never stored as it is always j * gap_penalty
+Column = Tuple[int, np.ndarray]
+
+
+class IncrementalAligner:
+    """Aligns seq1 against a seq2 that is extended a few characters at a time.
+
+    Args:
+        seq1: The fixed sequence, e.g. 'ACCGT'
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_penalty: The gap penalty value, e.g. -10
+        band: Compute only cells with |i - j| <= band like needleman_wunsch_k's visible_range,
+            None or 0 computes the whole matrix
+        checkpoint_every: Keep every c-th column for the traceback, e.g. 256; more memory, faster tracebacks
+    """
+
+    def __init__(self,
+                 seq1: str,
+                 score: Callable[[str, str], int] = score_fun,
+                 gap_penalty: int = -10,
+                 band: int = None,
+                 checkpoint_every: int = 256):
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be positive, got %d" % checkpoint_every)
+        self.seq1, self.score_fun, self.gap_penalty = seq1, score, gap_penalty
+        self.band, self.checkpoint_every = band or None, checkpoint_every
+        self._seq2: List[str] = []
+        self._profiles: Dict[str, np.ndarray] = {}
+        # Column 0 is seeded with i * gap_penalty on every row, inside the band or not
+        self._column: Column = (1, np.arange(1, len(seq1) + 1, dtype=np.int64) * gap_penalty)
+        self._checkpoints: List[Column] = [self._column]
+
+    @property
+    def seq2(self) -> str:
+        return ''.join(self._seq2)
+
+    def __len__(self):
+        return len(self._seq2)
+
+    def _profile(self, char: str) -> np.ndarray:
+        # score(seq1[i], char) for every i, computed once per distinct character
+        profile = self._profiles.get(char)
+        if profile is None:
+            profile = np.array([self.score_fun(a, char) for a in self.seq1], dtype=np.int64)
+            self._profiles[char] = profile
+        return profile
+
+    @property
+    def column(self) -> Column:
+        """The last column, D(1..n, len(seq2)) as (first row, values)."""
+        return self._column
+
+    def _rows(self, j: int) -> Tuple[int, int]:
+        # The rows 1 <= lo .. hi computed in column j
+        if self.band is None:
+            return 1, len(self.seq1)
+        return max(1, j - self.band), min(len(self.seq1), j + self.band)
+
+    def next_column(self, column: Column, j: int, char: str) -> Column:
+        """Computes column j from column j - 1 and the j-th character of seq2.
+
+        Does not change the aligner, so columns can also be stepped along other
+        paths, e.g. the branches of a trie of targets.
+        """
+        g = self.gap_penalty
+        lo, hi = self._rows(j)
+        if hi < lo:
+            return lo, np.empty(0, dtype=np.int64)
+        # Rows lo - 1 .. hi of the previous column, cells outside of the band are GLOBAL_MINIMUM
+        previous = np.full(hi - lo + 2, GLOBAL_MINIMUM, dtype=np.int64)
+        if lo == 1:
+            previous[0] = (j - 1) * g
+        plo, values = column
+        first, last = max(lo - 1, plo), min(hi, plo + len(values) - 1)
+        if first <= last:
+            previous[first - lo + 1:last - lo + 2] = values[first - plo:last - plo + 1]
+        # Diagonal and horizontal moves, then the vertical ones as a prefix maximum down the column
+        candidates = np.empty(hi - lo + 2, dtype=np.int64)
+        candidates[0] = j * g if lo == 1 else GLOBAL_MINIMUM
+        np.maximum(previous[:-1] + self._profile(char)[lo - 1:hi], previous[1:] + g, out=candidates[1:])
+        ramp = np.arange(hi - lo + 2, dtype=np.int64) * g
+        return lo, (np.maximum.accumulate(candidates - ramp) + ramp)[1:]
+
+    def extend(self, chars: str) -> int:
+        """Appends characters to seq2 and returns the new optimal score."""
+        with phase(PROFILER, 'extend'):
+            for char in chars:
+                self._seq2.append(char)
+                j = len(self._seq2)
+                self._column = self.next_column(self._column, j, char)
+                if PROFILER is not None:
+                    PROFILER.count('cells', len(self._column[1]))
+                if j % self.checkpoint_every == 0:
+                    self._checkpoints.append(self._column)
+        return self.score
+
+    def _value(self, column: Column, i: int, j: int) -> int:
+        if i == 0:
+            return j * self.gap_penalty
+        lo, values = column
+        return values[i - lo] if lo <= i < lo + len(values) else GLOBAL_MINIMUM
+
+    @property
+    def score(self) -> int:
+        """The optimal score of seq1 against the current seq2, D(n, m)."""
+        return int(self._value(self._column, len(self.seq1), len(self._seq2)))
+
+    def _block(self, start: int, end: int) -> Dict[int, Column]:
+        # Columns start .. end recomputed from the checkpoint at start, as lists for fast lookups
+        column = self._checkpoints[start // self.checkpoint_every]
+        block = {start: (column[0], column[1].tolist())}
+        for j in range(start + 1, end + 1):
+            column = self.next_column(column, j, self._seq2[j - 1])
+            block[j] = (column[0], column[1].tolist())
+        if PROFILER is not None:
+            PROFILER.count('cells_recomputed', sum(len(values) for _, values in block.values()))
+        return block
+
+    def alignment(self) -> Tuple[int, str, str]:
+        """Traces the optimal alignment back, the result equals needleman_wunsch(seq1, seq2, score, gap_penalty).
+
+        Returns:
+            score: The optimal alignment score, e.g. 10
+            aligned_seq1: The first aligned sequence, e.g. 'ACCGT'
+            aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
+        """
+        with phase(PROFILER, 'traceback'):
+            seq1, seq2, g, c = self.seq1, self._seq2, self.gap_penalty, self.checkpoint_every
+            i, j = len(seq1), len(seq2)
+            block, start = None, None
+            aligned1, aligned2 = [], []
+            while i != 0 or j != 0:
+                if j == 0:
+                    # Only vertical moves are left, column 0 is i * gap_penalty
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append('-')
+                    i -= 1
+                    continue
+                if block is None or j <= start:
+                    # Columns j - 1 and j are both needed, load the block that ends at or after j
+                    start = (j - 1) // c * c
+                    block = self._block(start, min(start + c, len(seq2)))
+                current, previous = block[j], block[j - 1]
+                diag = self._value(previous, i - 1, j - 1) + self.score_fun(seq1[i - 1], seq2[j - 1]) \
+                    if i >= 1 else GLOBAL_MINIMUM
+                up = self._value(current, i - 1, j) + g if i >= 1 else GLOBAL_MINIMUM
+                left = self._value(previous, i, j - 1) + g
+                if diag >= up and diag >= left:
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append(seq2[j - 1])
+                    i, j = i - 1, j - 1
+                elif up >= left:
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append('-')
+                    i -= 1
+                else:
+                    aligned1.append('-')
+                    aligned2.append(seq2[j - 1])
+                    j -= 1
+        return self.score, ''.join(reversed(aligned1)), ''.join(reversed(aligned2))
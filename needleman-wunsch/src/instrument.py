@@ -0,0 +1,248 @@
+"""Opt-in instrumentation for the aligners.
+
+Every aligner module has a `PROFILER = None` hook. Assigning a `Profiler` to
+it (or anything with the same `phase`, `count`, `maximum`, `wrap` and `matrix`
+methods) makes the aligner report its phases and counters:
+
+    profiler = Profiler(sinks=[JSONSink(sys.stderr)])
+    with installed(profiler, nw):
+        nw.needleman_wunsch('ACCGT', 'ACGT')
+    profiler.flush()
+
+The modules here time their phases with `phase(PROFILER, name)`. nw.py and
+the other labs, which run on their own without this module, keep the same
+few lines as a private `_phase`. The hooks are checked once per phase, never
+per DP cell, and counters are computed from the matrix dimensions, so a
+module whose hook is None runs the same code as before.
+
+Phases may nest, including recursively: a phase entered again while it is
+running counts as another call and raises its depth, but its time is only
+counted once, at the outermost level. For Hirschberg that gives the node
+count as `calls` and the recursion depth as `depth`.
+"""
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import IO, Callable, Dict, List
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+
+class Profiler:
+    """Collects phase timings, counters and maxima until flushed.
+
+    Args:
+        sinks: Where flush() sends the report, e.g. [LoggingSink(), PrometheusSink('nw.prom')]
+        trace_memory: Record the tracemalloc peak of every phase, starts tracemalloc if needed
+        wrap_calls: Count and time the calls of the callables the aligners pass to wrap(),
+            i.e. the scoring functions; off by default as it slows every call down
+        dump_matrices: The stream the aligners print their DP matrices to, e.g. sys.stdout
+    """
+
+    def __init__(self, sinks: List = None, trace_memory: bool = False, wrap_calls: bool = False,
+                 dump_matrices: IO[str] = None):
+        self.sinks = list(sinks or [])
+        self.trace_memory, self.wrap_calls, self.dump_matrices = trace_memory, wrap_calls, dump_matrices
+        self._active: Dict[str, int] = {}
+        self._stack = []
+        # Whether tracemalloc was started here, it is then stopped when the outermost phase exits
+        self._started_tracing = False
+        self.reset()
+
+    def reset(self):
+        self.phases: Dict[str, dict] = {}
+        self.counters: Dict[str, int] = {}
+        self.maxima: Dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times a block of work, e.g. `with profiler.phase('fill'):`."""
+        stats = self.phases.setdefault(name, {'calls': 0, 'seconds': 0.0, 'depth': 0})
+        stats['calls'] += 1
+        depth = self._active.get(name, 0) + 1
+        self._active[name] = depth
+        stats['depth'] = max(stats['depth'], depth)
+        memory = self.trace_memory and depth == 1
+        if memory:
+            self._enter_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if depth == 1:
+                stats['seconds'] += time.perf_counter() - start
+            if memory:
+                stats['peak_bytes'] = max(stats.get('peak_bytes', 0), self._exit_memory())
+            self._active[name] = depth - 1
+
+    def _enter_memory(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # The enclosing phase keeps the peak reached so far, the counter is reset for this one
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([current, current])
+
+    def _exit_memory(self) -> int:
+        start, peak = self._stack.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        elif self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return peak - start
+
+    def count(self, name: str, value: int = 1):
+        """Adds to a counter, e.g. count('cells', n * m)."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def maximum(self, name: str, value: int):
+        """Keeps the largest value seen, e.g. maximum('band', k)."""
+        self.maxima[name] = max(self.maxima.get(name, value), value)
+
+    def wrap(self, fn: Callable, name: str) -> Callable:
+        """Returns fn counting and timing its calls as phase `name` if wrap_calls is set, fn otherwise."""
+        if not self.wrap_calls or getattr(fn, '__profiler__', None) is self:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return fn(*args, **kwargs)
+
+        wrapper.__profiler__ = self
+        return wrapper
+
+    def matrix(self, name: str, matrix: list):
+        """Prints a DP matrix to dump_matrices, if set."""
+        if self.dump_matrices is None:
+            return
+        print("%s:" % name, file=self.dump_matrices)
+        for row in matrix:
+            print(''.join(f"{element:6}" for element in row), file=self.dump_matrices)
+
+    def report(self) -> dict:
+        return {'phases': {name: dict(stats) for name, stats in self.phases.items()},
+                'counters': dict(self.counters), 'maxima': dict(self.maxima)}
+
+    def flush(self) -> dict:
+        """Sends the report to every sink and starts over, returns the report."""
+        report = self.report()
+        for sink in self.sinks:
+            sink(report)
+        self.reset()
+        return report
+
+
+_NO_PHASE = nullcontext()
+
+
+def phase(profiler, name: str):
+    """The phase of a module's hook, e.g. `with phase(PROFILER, 'fill'):`, a no-op while it is None."""
+    return profiler.phase(name) if profiler is not None else _NO_PHASE
+
+
+@contextmanager
+def installed(profiler, *modules):
+    """Sets the PROFILER hook of the given aligner modules for the duration of a block."""
+    previous = [module.PROFILER for module in modules]
+    for module in modules:
+        module.PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        for module, hook in zip(modules, previous):
+            module.PROFILER = hook
+
+
+class LoggingSink:
+    """Logs one line per phase and one line with the counters."""
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO):
+        self.logger, self.level = logger or logging.getLogger('alignment'), level
+
+    def __call__(self, report: dict):
+        for name, stats in report['phases'].items():
+            self.logger.log(self.level, "phase %s: %d calls, %.6f s, depth %d%s", name, stats['calls'],
+                            stats['seconds'], stats['depth'],
+                            ", peak %d bytes" % stats['peak_bytes'] if 'peak_bytes' in stats else '')
+        if report['counters'] or report['maxima']:
+            self.logger.log(self.level, "counters %s, maxima %s", report['counters'], report['maxima'])
+
+
+class JSONSink:
+    """Writes every report as one JSON line to a stream or appends it to a file."""
+
+    def __init__(self, target=sys.stderr):
+        self.target = target
+
+    def __call__(self, report: dict):
+        line = json.dumps(dict(report, time=time.time())) + '\n'
+        if isinstance(self.target, (str, os.PathLike)):
+            with open(self.target, 'a') as file:
+                file.write(line)
+        else:
+            self.target.write(line)
+            self.target.flush()
+
+
+class PrometheusSink:
+    """Keeps running totals and rewrites a Prometheus text file for node_exporter's textfile collector.
+
+    Phases become alignment_phase_seconds_total, alignment_phase_calls_total,
+    alignment_phase_depth and alignment_phase_peak_bytes with a phase label;
+    counters become alignment_<name>_total and maxima alignment_<name>.
+    """
+
+    def __init__(self, path: str, prefix: str = 'alignment'):
+        self.path, self.prefix = path, prefix
+        self.totals = Profiler()
+
+    def __call__(self, report: dict):
+        totals = self.totals
+        for name, stats in report['phases'].items():
+            total = totals.phases.setdefault(name, {'calls': 0, 'seconds': 0.0, 'depth': 0})
+            total['calls'] += stats['calls']
+            total['seconds'] += stats['seconds']
+            total['depth'] = max(total['depth'], stats['depth'])
+            if 'peak_bytes' in stats:
+                total['peak_bytes'] = max(total.get('peak_bytes', 0), stats['peak_bytes'])
+        for name, value in report['counters'].items():
+            totals.count(name, value)
+        for name, value in report['maxima'].items():
+            totals.maximum(name, value)
+        self.write()
+
+    def write(self):
+        p, totals, lines = self.prefix, self.totals, []
+
+        def metric(name, kind, help_text, samples):
+            if samples:
+                lines.extend(['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)])
+                lines.extend('%s%s %s' % (name, labels, value) for labels, value in samples)
+
+        phases = sorted(totals.phases.items())
+        metric(p + '_phase_seconds_total', 'counter', 'Wall time spent in the phase',
+               [('{phase="%s"}' % name, repr(stats['seconds'])) for name, stats in phases])
+        metric(p + '_phase_calls_total', 'counter', 'Times the phase was entered',
+               [('{phase="%s"}' % name, stats['calls']) for name, stats in phases])
+        metric(p + '_phase_depth', 'gauge', 'Deepest nesting of the phase',
+               [('{phase="%s"}' % name, stats['depth']) for name, stats in phases])
+        metric(p + '_phase_peak_bytes', 'gauge', 'Largest tracemalloc peak of the phase',
+               [('{phase="%s"}' % name, stats['peak_bytes']) for name, stats in phases if 'peak_bytes' in stats])
+        for name, value in sorted(totals.counters.items()):
+            metric('%s_%s_total' % (p, name), 'counter', 'Alignment counter %s' % name, [('', value)])
+        for name, value in sorted(totals.maxima.items()):
+            metric('%s_%s' % (p, name), 'gauge', 'Largest %s seen' % name, [('', value)])
+        # Written next to the target and renamed, so the collector never reads half a file
+        temporary = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(temporary, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temporary, self.path)
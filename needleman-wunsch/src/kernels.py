@@ -0,0 +1,259 @@
+"""Vectorized NumPy kernels shared by the bulk alignment tools.
+
+Sequences are encoded as integer codes over an alphabet and scored with a
+substitution table built from the same `score` callables the plain
+implementations take, so the kernels reproduce `needleman_wunsch` and
+`needleman_wunsch_affine` scores exactly while advancing the DP one whole
+row per NumPy call instead of one cell per Python call.
+
+The kernels run in the narrowest integer type that provably holds every value
+they compute: int16 for typical read lengths, int32 or int64 beyond. The
+linear kernels work in row-relative scores R(i,j) = D(i,j) - i*gap, which
+stay within linear_bound() of the row length however many rows there are;
+the affine kernel replaces -inf by a sentinel just below every real score.
+"""
+from typing import Callable, Iterable, Sequence, Tuple
+
+import numpy as np
+
+from .nw import score_fun
+
+
+def build_alphabet(sequences: Iterable[str]) -> str:
+    """Returns the sorted set of characters used by the sequences, e.g. 'ACGT'."""
+    return ''.join(sorted(set().union(*map(set, sequences))))
+
+
+def encode(seq: str, alphabet: str) -> np.ndarray:
+    """Encodes a sequence as indices into the alphabet, e.g. 'GA' -> [2, 0] for 'ACGT'."""
+    lookup = np.full(256, 255, dtype=np.uint8)
+    lookup[np.frombuffer(alphabet.encode('latin-1'), dtype=np.uint8)] = np.arange(len(alphabet), dtype=np.uint8)
+    codes = lookup[np.frombuffer(seq.encode('latin-1'), dtype=np.uint8)]
+    if len(alphabet) > 255 or (codes == 255).any():
+        raise ValueError("sequence contains characters outside of the alphabet %r" % alphabet)
+    return codes
+
+
+def substitution_table(score: Callable[[str, str], int] = score_fun, alphabet: str = 'ACGT') -> np.ndarray:
+    """Evaluates the scoring function on every pair of alphabet characters.
+
+    Args:
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        alphabet: The characters to tabulate, e.g. 'ACGT'
+
+    Returns:
+        table: (len(alphabet), len(alphabet)) array, table[x, y] == score(alphabet[x], alphabet[y])
+    """
+    return np.array([[score(a, b) for b in alphabet] for a in alphabet]).reshape(len(alphabet), len(alphabet))
+
+
+# The integer types the kernels pick from, narrowest first
+SCORE_DTYPES = (np.dtype(np.int16), np.dtype(np.int32), np.dtype(np.int64))
+
+
+def score_dtype(bound: int) -> np.dtype:
+    """The narrowest of SCORE_DTYPES that holds every integer in [-bound, bound], e.g. int16 for 20000."""
+    for dtype in SCORE_DTYPES:
+        if bound <= np.iinfo(dtype).max:
+            return dtype
+    raise OverflowError("scores up to %d do not fit in 64 bits" % bound)
+
+
+def linear_bound(m: int, table: np.ndarray, gap_penalty: int) -> int:
+    """Bounds the magnitude of every value the linear kernels compute on rows of m + 1 cells.
+
+    An alignment of a[:i] and b[:j] with p pairs scores (i + j - 2p) * gap
+    plus its pair scores, so R(i,j) = D(i,j) - i*gap lies between j * gap and
+    j * gap + p * max(0, best pair - 2 * gap) with p <= j, whatever i is. The
+    prefix maximum adds a ramp of up to m * |gap| and a candidate one score.
+    """
+    g = abs(gap_penalty)
+    best = int(table.max()) if table.size else 0
+    largest = int(np.abs(table).max()) if table.size else 0
+    return m * (2 * g + max(0, best - 2 * gap_penalty)) + largest + 2 * g
+
+
+def affine_bound(n: int, m: int, table: np.ndarray, gap_open: int, gap_extend: int) -> Tuple[int, int]:
+    """Bounds the magnitude of the affine kernel's values and picks its sentinel for -inf.
+
+    Every real value is the score of an alignment of at most n + m columns,
+    each a pair or a gap of at most |open| + |extend|; the sentinel is below
+    all of them even after one more score, open and row of extends.
+
+    Returns:
+        bound: The largest magnitude computed, for score_dtype()
+        sentinel: The value standing in for -inf
+    """
+    largest = int(np.abs(table).max()) if table.size else 0
+    real = (n + m + 1) * (largest + abs(gap_open) + abs(gap_extend))
+    step = largest + abs(gap_open) + (m + 1) * abs(gap_extend)
+    return real + 2 * step + 1, -(real + step + 1)
+
+
+def _orient(a: np.ndarray, b: np.ndarray, table: np.ndarray):
+    # The row loop runs in Python, so iterate over the shorter sequence when the scores are symmetric
+    if len(a) > len(b) and np.array_equal(table, table.T):
+        return b, a
+    return a, b
+
+
+def nw_last_row(a: np.ndarray, b: np.ndarray, table: np.ndarray, gap_penalty: int = -10,
+                dtype: np.dtype = None) -> np.ndarray:
+    """Computes the last row of the linear-gap Needleman-Wunsch matrix in O(len(b)) memory.
+
+    Row i is derived from row i-1 in two vectorized steps: the diagonal and
+    vertical moves give candidates T(j), then the horizontal moves are resolved
+    with a prefix maximum, D(i,j) = max_{k<=j} T(k) + (j-k)*gap. The rows are
+    kept as R(i,j) = D(i,j) - i*gap, in which the vertical move is free and
+    the diagonal one scores score - gap.
+
+    Args:
+        a: The first encoded sequence
+        b: The second encoded sequence
+        table: The substitution table the sequences are encoded against
+        gap_penalty: The gap penalty value, e.g. -10
+        dtype: The working type, by default the narrowest safe one, score_dtype(linear_bound(...))
+
+    Returns:
+        row: D(len(a), 0..len(b)) as int64
+    """
+    dtype = np.dtype(dtype or score_dtype(linear_bound(len(b), table, gap_penalty)))
+    ramp = np.arange(len(b) + 1, dtype=dtype) * dtype.type(gap_penalty)
+    profile = (table[:, b] - gap_penalty).astype(dtype)
+    row = ramp.copy()
+    candidates = np.empty_like(row)
+    candidates[0] = 0
+    for i in range(1, len(a) + 1):
+        np.maximum(row[:-1] + profile[a[i - 1]], row[1:], out=candidates[1:])
+        row = np.maximum.accumulate(candidates - ramp) + ramp
+    return row.astype(np.int64) + len(a) * gap_penalty
+
+
+def nw_tile(a: np.ndarray, b: np.ndarray, table: np.ndarray, gap_penalty: int, top: np.ndarray,
+            left: np.ndarray) -> np.ndarray:
+    """Fills one rectangular tile of the linear-gap Needleman-Wunsch matrix from its boundary.
+
+    The tile covers rows i0+1 .. i0+len(a) and columns j0+1 .. j0+len(b),
+    computed row by row as in nw_last_row, in row-relative scores
+    R(i,j) = D(i,j) - i*gap and in the type of `top`; for a matrix of m
+    columns score_dtype(linear_bound(m, ...)) is safe for every tile.
+
+    Args:
+        a: The encoded characters of the first sequence in the tile's rows
+        b: The encoded characters of the second sequence in the tile's columns
+        table: The substitution table the sequences are encoded against
+        gap_penalty: The gap penalty value, e.g. -10
+        top: R(i0, j0 .. j0+len(b)), the row above the tile and its top left corner
+        left: R(i0+1 .. i0+len(a), j0), the column left of the tile
+
+    Returns:
+        tile: (len(a), len(b)) array, tile[p, q] == R(i0+1+p, j0+1+q)
+    """
+    row = np.array(top)
+    dtype = row.dtype
+    ramp = np.arange(len(b) + 1, dtype=dtype) * dtype.type(gap_penalty)
+    profile = (table[:, b] - gap_penalty).astype(dtype)
+    tile = np.empty((len(a), len(b)), dtype=dtype)
+    candidates = np.empty(len(b) + 1, dtype=dtype)
+    for p in range(len(a)):
+        candidates[0] = left[p]
+        np.maximum(row[:-1] + profile[a[p]], row[1:], out=candidates[1:])
+        row = np.maximum.accumulate(candidates - ramp) + ramp
+        tile[p] = row[1:]
+    return tile
+
+
+def nw_score(a: np.ndarray, b: np.ndarray, table: np.ndarray, gap_penalty: int = -10) -> int:
+    """Returns the Needleman-Wunsch score of two encoded sequences, equal to needleman_wunsch(...)[0]."""
+    a, b = _orient(a, b, table)
+    return nw_last_row(a, b, table, gap_penalty)[-1].item()
+
+
+def affine_score(a: np.ndarray, b: np.ndarray, table: np.ndarray, gap_open: int = -10, gap_extend: int = -1,
+                 dtype: np.dtype = None):
+    """Returns the affine-gap score of two encoded sequences, equal to needleman_wunsch_affine(...)[2].
+
+    Follows the recurrence and boundary conditions of needleman_wunsch_affine
+    (match, insertion and deletion matrices), keeping only the current row of
+    each; insertions run along the row and are resolved with a prefix maximum.
+    Its -inf only ever seeds row 0 and column 0 and is extended by at most one
+    step before a real score wins, so a sentinel below every real score gives
+    the same maxima in an integer type, by default the narrowest safe one.
+    """
+    a, b = _orient(a, b, table)
+    m = len(b)
+    bound, infinity = affine_bound(len(a), m, table, gap_open, gap_extend)
+    dtype = np.dtype(dtype or score_dtype(bound))
+    ramp = np.arange(m + 1, dtype=dtype) * dtype.type(gap_extend)
+    profile = table[:, b].astype(dtype)
+    match = np.full(m + 1, infinity, dtype=dtype)
+    insertion = np.full(m + 1, infinity, dtype=dtype)
+    deletion = (gap_open + (np.arange(m + 1, dtype=np.int64) - 1) * gap_extend).astype(dtype)
+    match[0], insertion[0], deletion[0] = 0, gap_open - gap_extend, infinity
+    starts = np.empty(m + 1, dtype=dtype)
+    for i in range(1, len(a) + 1):
+        best = np.maximum(np.maximum(match, insertion), deletion)
+        deletion = np.maximum(deletion + dtype.type(gap_extend), match + dtype.type(gap_open))
+        deletion[0] = infinity
+        match = np.empty(m + 1, dtype=dtype)
+        match[0] = infinity
+        np.add(best[:-1], profile[a[i - 1]], out=match[1:])
+        # I(i,j) = max(I(i,j-1) + extend, M(i,j-1) + open), seeded by I(i,0) = open + (i-1)*extend
+        starts[0] = gap_open + (i - 1) * gap_extend
+        np.add(match[:-1], dtype.type(gap_open), out=starts[1:])
+        insertion = np.maximum.accumulate(starts - ramp) + ramp
+    result = max(match[-1].item(), insertion[-1].item(), deletion[-1].item())
+    return result if result > infinity // 2 else float('-inf')
+
+
+def affine_tile(a: np.ndarray, b: np.ndarray, table: np.ndarray, gap_open: int, gap_extend: int,
+                top: Sequence[np.ndarray], left: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fills one tile of the match, insertion and deletion matrices of needleman_wunsch_affine.
+
+    The tile covers rows i0+1 .. i0+len(a) and columns j0+1 .. j0+len(b),
+    computed row by row as in affine_score.
+
+    Args:
+        a: The encoded characters of the first sequence in the tile's rows
+        b: The encoded characters of the second sequence in the tile's columns
+        table: The substitution table the sequences are encoded against
+        gap_open: The gap open penalty, e.g. -10
+        gap_extend: The gap extend penalty, e.g. -1
+        top: (M, I, D) at row i0, columns j0 .. j0+len(b)
+        left: (M, I, D) at column j0, rows i0+1 .. i0+len(a)
+
+    Returns:
+        tiles: (M, I, D), each (len(a), len(b)) float64, tile[p, q] at (i0+1+p, j0+1+q)
+    """
+    h, w = len(a), len(b)
+    ramp = np.arange(w + 1, dtype=np.float64) * gap_extend
+    profile = table[:, b].astype(np.float64)
+    tiles = tuple(np.empty((h, w)) for _ in range(3))
+    match, insertion, deletion = (np.array(row, dtype=np.float64) for row in top)
+    starts = np.empty(w + 1)
+    for p in range(h):
+        best = np.maximum(np.maximum(match, insertion), deletion)
+        deletion = np.maximum(deletion + gap_extend, match + gap_open)
+        deletion[0] = left[2][p]
+        match = np.empty(w + 1)
+        match[0] = left[0][p]
+        np.add(best[:-1], profile[a[p]], out=match[1:])
+        starts[0] = left[1][p]
+        np.add(match[:-1], gap_open, out=starts[1:])
+        insertion = np.maximum.accumulate(starts - ramp) + ramp
+        for tile, row in zip(tiles, (match, insertion, deletion)):
+            tile[p] = row[1:]
+    return tiles
+
+
+SCORE_ENGINES = {
+    'nw': nw_score,
+    'affine': affine_score,
+}
+
+
+def engine_params(engine: str, gap_penalty: int = -10, gap_open: int = -10, gap_extend: int = -1) -> Sequence[int]:
+    """Picks the gap parameters a score engine takes, e.g. (-10,) for 'nw'."""
+    if engine not in SCORE_ENGINES:
+        raise ValueError("unknown engine %r, expected one of %s" % (engine, ', '.join(SCORE_ENGINES)))
+    return (gap_penalty,) if engine == 'nw' else (gap_open, gap_extend)
@@ -0,0 +1,81 @@
+"""Load generator for the alignment service.
+
+Opens `concurrency` connections that each send requests back to back and
+reports throughput and latency percentiles, e.g.
+
+    python -m src.service --socket /tmp/nw.sock &
+    python -m src.loadgen --socket /tmp/nw.sock --requests 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+def random_pair(rng: random.Random, length: int, divergence: float):
+    """A random sequence and a copy of it with a fraction of substituted bases."""
+    seq1 = ''.join(rng.choice('ACGT') for _ in range(length))
+    seq2 = ''.join(rng.choice('ACGT') if rng.random() < divergence else base for base in seq1)
+    return seq1, seq2
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float('nan')
+
+
+async def client(connect, pairs, requests, latencies, errors):
+    reader, writer = await connect()
+    try:
+        for number in range(requests):
+            seq1, seq2 = pairs[number % len(pairs)]
+            started = time.perf_counter()
+            writer.write((json.dumps({'id': number, 'seq1': seq1, 'seq2': seq2}) + '\n').encode())
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            if 'error' in response:
+                errors.append(response['error'])
+    finally:
+        writer.close()
+
+
+async def run(args):
+    if args.socket:
+        connect = lambda: asyncio.open_unix_connection(args.socket)
+    else:
+        connect = lambda: asyncio.open_connection(args.host, args.port)
+    rng = random.Random(args.seed)
+    pairs = [random_pair(rng, args.length, args.divergence) for _ in range(args.distinct)]
+    latencies, errors = [], []
+    share, extra = divmod(args.requests, args.concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(connect, pairs[k::args.concurrency] or pairs, share + (k < extra), latencies, errors)
+                           for k in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    print("requests: %d, errors: %d" % (len(latencies), len(errors)))
+    print("throughput: %.1f requests/s" % (len(latencies) / elapsed))
+    print("latency p50: %.2f ms, p99: %.2f ms, max: %.2f ms" % (percentile(latencies, 0.5) * 1000,
+                                                                 percentile(latencies, 0.99) * 1000,
+                                                                 max(latencies, default=0) * 1000))
+    if errors:
+        print("first error: %s" % errors[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generator for the alignment service')
+    parser.add_argument('--socket', help='Unix socket path of the service')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host of the service')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port of the service')
+    parser.add_argument('--requests', type=int, default=10000, help='total number of requests')
+    parser.add_argument('--concurrency', type=int, default=32, help='number of concurrent connections')
+    parser.add_argument('--length', type=int, default=150, help='sequence length')
+    parser.add_argument('--divergence', type=float, default=0.1, help='fraction of substituted bases')
+    parser.add_argument('--distinct', type=int, default=1000, help='number of distinct pairs, repeats hit the cache')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
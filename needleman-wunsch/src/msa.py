@@ -0,0 +1,313 @@
+"""Progressive multiple sequence alignment on top of the pairwise engines.
+
+All pairwise affine scores are computed in parallel with `pairwise_matrix`,
+turned into distances and clustered into a guide tree (UPGMA or neighbour
+joining). Profiles are then merged bottom-up along the tree with
+`needleman_wunsch_affine_profile`, the profile-profile version of
+`needleman_wunsch_affine`.
+
+A profile column is stored as a vector of residue counts, so the
+sum-of-pairs scores of one profile column against every column of the other
+profile are a single matrix product. Scores are kept multiplied by the number
+of sequence pairs, which keeps every DP value an exact integer. Long profiles
+are aligned in linear space: the matrix is split at its middle row by a
+forward and a backward pass (Hirschberg), and only blocks below
+`full_matrix_cells` are filled completely for the traceback.
+"""
+from typing import Callable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .kernels import build_alphabet, encode, substitution_table
+from .nw import score_fun
+from .pairwise import pairwise_matrix
+
+GAP = '-'
+# DP states: the step into a cell is a match column, a gap in the first profile or a gap in the second
+MATCH, INSERTION, DELETION = 0, 1, 2
+INFINITY = -np.inf
+
+# Leaves are sequence indices, inner nodes are pairs of subtrees
+Tree = Union[int, Tuple['Tree', 'Tree']]
+
+
+def score_distances(scores: np.ndarray) -> np.ndarray:
+    """Converts a pairwise score matrix into distances in [0, 1].
+
+    The distance is the score lost against the mean of the two self-alignment
+    scores, relative to that mean: identical sequences are at 0.
+    """
+    self_scores = np.diag(scores)
+    mean_self = (self_scores[:, None] + self_scores[None, :]) / 2
+    distances = np.clip(mean_self - scores, 0, None) / np.maximum(np.abs(mean_self), 1)
+    np.fill_diagonal(distances, 0)
+    return distances
+
+
+def upgma(distances: np.ndarray) -> Tree:
+    """Builds a guide tree by average-linkage clustering of the distance matrix."""
+    n = len(distances)
+    distances = np.array(distances, dtype=np.float64)
+    np.fill_diagonal(distances, np.inf)
+    nodes, sizes = list(range(n)), [1] * n
+    active = list(range(n))
+    for _ in range(n - 1):
+        sub = distances[np.ix_(active, active)]
+        a, b = np.unravel_index(np.argmin(sub), sub.shape)
+        i, j = sorted((active[a], active[b]))
+        merged = (distances[i] * sizes[i] + distances[j] * sizes[j]) / (sizes[i] + sizes[j])
+        distances[i, :], distances[:, i] = merged, merged
+        distances[i, i] = np.inf
+        nodes[i], sizes[i] = (nodes[i], nodes[j]), sizes[i] + sizes[j]
+        active.remove(j)
+    return nodes[active[0]] if n else None
+
+
+def neighbour_joining(distances: np.ndarray) -> Tree:
+    """Builds a guide tree by neighbour joining, rooted at the last join."""
+    distances = np.array(distances, dtype=np.float64)
+    nodes = list(range(len(distances)))
+    while len(nodes) > 2:
+        k = len(nodes)
+        totals = distances.sum(axis=1)
+        q = (k - 2) * distances - totals[:, None] - totals[None, :]
+        np.fill_diagonal(q, np.inf)
+        i, j = sorted(np.unravel_index(np.argmin(q), q.shape))
+        joined = (distances[i] + distances[j] - distances[i, j]) / 2
+        keep = [x for x in range(k) if x not in (i, j)]
+        distances = np.vstack([np.append(distances[np.ix_(keep, keep)], joined[keep][:, None], axis=1),
+                               np.append(joined[keep], 0)[None, :]])
+        nodes = [nodes[x] for x in keep] + [(nodes[i], nodes[j])]
+    return tuple(nodes) if len(nodes) == 2 else (nodes[0] if nodes else None)
+
+
+GUIDE_TREES = {
+    'upgma': upgma,
+    'nj': neighbour_joining,
+}
+
+
+def profile_counts(alignment: Sequence[str], alphabet: str) -> np.ndarray:
+    """Counts the residues of every alignment column, gaps are not counted.
+
+    Returns:
+        counts: (alignment length, len(alphabet)) array
+    """
+    length = len(alignment[0]) if alignment else 0
+    counts = np.zeros((length, len(alphabet)), dtype=np.int64)
+    codes = [encode(row.replace(GAP, ''), alphabet) for row in alignment]
+    for row, row_codes in zip(alignment, codes):
+        columns = np.flatnonzero(np.frombuffer(row.encode('latin-1'), dtype=np.uint8) != ord(GAP))
+        np.add.at(counts, (columns, row_codes), 1)
+    return counts
+
+
+class _Profiles:
+    """Scaled column scores of two profiles, computed one row at a time."""
+
+    def __init__(self, counts1, counts2, table, gap_open, gap_extend, pairs):
+        self.weights = (counts1 @ table).astype(np.float64)
+        self.counts2 = counts2.T.astype(np.float64)
+        self.gap_open, self.gap_extend = gap_open * pairs, gap_extend * pairs
+
+    def row(self, i, j0, j1):
+        """Sum-of-pairs scores of column i of the first profile against columns j0..j1-1 of the second."""
+        return self.weights[i] @ self.counts2[:, j0:j1]
+
+
+def _gap_scan(starts, ramp):
+    # X(j) = max_{k<=j} starts(k) + (j-k)*extend, the horizontal gap recurrence as a prefix maximum
+    return np.maximum.accumulate(starts - ramp) + ramp
+
+
+def _forward(profiles, i0, i1, j0, j1, start, keep=False):
+    """Fills rows i0..i1 over columns j0..j1 starting from state `start` at (i0, j0).
+
+    Returns the (match, insertion, deletion) vectors of row i1, or lists of all
+    rows when keep is set.
+    """
+    width = j1 - j0
+    gap_open, gap_extend = profiles.gap_open, profiles.gap_extend
+    ramp = np.arange(width + 1, dtype=np.float64) * gap_extend
+    match, insertion, deletion = (np.full(width + 1, INFINITY) for _ in range(3))
+    (match, insertion, deletion)[start][0] = 0
+    starts = np.empty(width + 1)
+    starts[0] = insertion[0]
+    np.add(match[:-1], gap_open, out=starts[1:])
+    insertion = _gap_scan(starts, ramp)
+    rows = [(match, insertion, deletion)]
+    for i in range(i0, i1):
+        best = np.maximum(np.maximum(match, insertion), deletion)
+        deletion = np.maximum(deletion + gap_extend, match + gap_open)
+        match = np.empty(width + 1)
+        match[0] = INFINITY
+        np.add(best[:-1], profiles.row(i, j0, j1), out=match[1:])
+        starts[0] = INFINITY
+        np.add(match[:-1], gap_open, out=starts[1:])
+        insertion = _gap_scan(starts, ramp)
+        if keep:
+            rows.append((match, insertion, deletion))
+    return rows if keep else (match, insertion, deletion)
+
+
+def _backward(profiles, i0, i1, j0, j1, end):
+    """Best scores from row i0 to (i1, j1) ending in state `end`, by the state of each cell of row i0."""
+    width = j1 - j0
+    gap_open, gap_extend = profiles.gap_open, profiles.gap_extend
+    ramp = np.arange(width + 1, dtype=np.float64) * gap_extend
+    # Last row: only insertions lead to the corner
+    terminal = [INFINITY] * 3
+    terminal[end] = 0
+    starts = np.full(width + 1, INFINITY)
+    starts[-1] = terminal[INSERTION]
+    insertion = np.maximum.accumulate((starts + ramp)[::-1])[::-1] - ramp
+    match = np.full(width + 1, INFINITY)
+    match[:-1] = insertion[1:] + gap_open
+    match[-1] = terminal[MATCH]
+    deletion = np.full(width + 1, INFINITY)
+    deletion[-1] = terminal[DELETION]
+    for i in range(i1 - 1, i0 - 1, -1):
+        diagonal = profiles.row(i, j0, j1) + match[1:]
+        starts[:-1], starts[-1] = diagonal, INFINITY
+        insertion_next = np.maximum.accumulate((starts + ramp)[::-1])[::-1] - ramp
+        match_next = np.empty(width + 1)
+        match_next[:-1] = np.maximum(np.maximum(diagonal, insertion_next[1:] + gap_open), deletion[:-1] + gap_open)
+        match_next[-1] = deletion[-1] + gap_open
+        deletion_next = np.empty(width + 1)
+        deletion_next[:-1] = np.maximum(diagonal, deletion[:-1] + gap_extend)
+        deletion_next[-1] = deletion[-1] + gap_extend
+        match, insertion, deletion = match_next, insertion_next, deletion_next
+    return match, insertion, deletion
+
+
+def _traceback(profiles, i0, i1, j0, j1, start, end):
+    """Aligns a block with the full matrix and returns its steps from (i0, j0) to (i1, j1)."""
+    rows = _forward(profiles, i0, i1, j0, j1, start, keep=True)
+    gap_open, gap_extend = profiles.gap_open, profiles.gap_extend
+    i, j, state = i1 - i0, j1 - j0, end
+    steps = []
+    while i > 0 or j > 0:
+        steps.append(state)
+        value = rows[i][state][j]
+        if state == MATCH:
+            previous = rows[i - 1]
+            target = value - profiles.row(i0 + i - 1, j0 + j - 1, j0 + j)[0]
+            state = next(s for s in (MATCH, INSERTION, DELETION) if previous[s][j - 1] == target)
+            i, j = i - 1, j - 1
+        elif state == INSERTION:
+            state = INSERTION if rows[i][INSERTION][j - 1] + gap_extend == value else MATCH
+            j -= 1
+        else:
+            state = DELETION if rows[i - 1][DELETION][j] + gap_extend == value else MATCH
+            i -= 1
+    return steps[::-1]
+
+
+def _align(profiles, i0, i1, j0, j1, start, end, full_matrix_cells):
+    if i1 - i0 <= 1 or (i1 - i0 + 1) * (j1 - j0 + 1) <= full_matrix_cells:
+        return _traceback(profiles, i0, i1, j0, j1, start, end)
+    middle = (i0 + i1) // 2
+    forward = _forward(profiles, i0, middle, j0, j1, start)
+    backward = _backward(profiles, middle, i1, j0, j1, end)
+    totals = np.stack(forward) + np.stack(backward)
+    state, j = (int(x) for x in np.unravel_index(np.argmax(totals), totals.shape))
+    return (_align(profiles, i0, middle, j0, j0 + j, start, state, full_matrix_cells) +
+            _align(profiles, middle, i1, j0 + j, j1, state, end, full_matrix_cells))
+
+
+def needleman_wunsch_affine_profile(aln1: Sequence[str],
+                                    aln2: Sequence[str],
+                                    score_fun: Callable = score_fun,
+                                    gap_open: int = -10,
+                                    gap_extend: int = -1,
+                                    full_matrix_cells: int = 1 << 20) -> Tuple[List[str], List[str], float]:
+    '''
+    Inputs:
+    aln1 - first profile, a list of aligned sequences of equal length
+    aln2 - second profile, a list of aligned sequences of equal length
+    score_fun - function that takes two characters and returns score
+    gap_open - gap open penalty
+    gap_extend - gap extend penalty
+    full_matrix_cells - largest block aligned with the full matrix, bigger
+        problems are split in linear space first
+    Leading gaps follow the same recurrence as inner ones, so unlike
+    needleman_wunsch_affine a gap in one profile never continues into a gap
+    in the other at extension cost.
+    Outputs:
+    aln1 - first profile with gap columns inserted
+    aln2 - second profile with gap columns inserted
+    score - average sum-of-pairs score of the merged alignment
+    '''
+    alphabet = build_alphabet([row.replace(GAP, '') for row in list(aln1) + list(aln2)])
+    table = substitution_table(score_fun, alphabet)
+    counts1, counts2 = profile_counts(aln1, alphabet), profile_counts(aln2, alphabet)
+    pairs = len(aln1) * len(aln2)
+    profiles = _Profiles(counts1, counts2, table, gap_open, gap_extend, pairs)
+    n, m = len(counts1), len(counts2)
+
+    # A score-only pass picks the best final state, then the path is rebuilt block by block
+    last = _forward(profiles, 0, n, 0, m, MATCH)
+    end = int(np.argmax([vector[-1] for vector in last]))
+    total = last[end][-1]
+    steps = _align(profiles, 0, n, 0, m, MATCH, end, full_matrix_cells)
+
+    columns1, columns2 = [], []
+    i = j = 0
+    for step in steps:
+        columns1.append(i if step != INSERTION else -1)
+        columns2.append(j if step != DELETION else -1)
+        i, j = i + (step != INSERTION), j + (step != DELETION)
+    return _apply_columns(aln1, columns1), _apply_columns(aln2, columns2), float(total) / pairs
+
+
+def _apply_columns(alignment, columns):
+    padded = [row + GAP for row in alignment]
+    return [''.join(row[c] for c in columns) for row in padded]
+
+
+def guide_tree(scores: np.ndarray, method: str = 'upgma') -> Tree:
+    """Clusters sequences by their pairwise alignment scores, method is 'upgma' or 'nj'."""
+    if method not in GUIDE_TREES:
+        raise ValueError("unknown guide tree method %r, expected one of %s" % (method, ', '.join(GUIDE_TREES)))
+    return GUIDE_TREES[method](score_distances(scores))
+
+
+def progressive_msa(sequences: Sequence[str],
+                    score_fun: Callable = score_fun,
+                    gap_open: int = -10,
+                    gap_extend: int = -1,
+                    method: str = 'upgma',
+                    workers: int = None,
+                    full_matrix_cells: int = 1 << 20) -> List[str]:
+    '''
+    Inputs:
+    sequences - sequences to align, e.g. ['ACGT', 'ACAGT', 'CAGT']
+    score_fun - function that takes two characters and returns score
+    gap_open - gap open penalty
+    gap_extend - gap extend penalty
+    method - guide tree construction, 'upgma' or 'nj'
+    workers - processes for the pairwise scores, see pairwise_matrix
+    full_matrix_cells - see needleman_wunsch_affine_profile
+    Outputs:
+    alignment - the aligned sequences, in input order
+    '''
+    if not sequences:
+        return []
+    scores = pairwise_matrix(sequences, engine='affine', workers=workers, score=score_fun,
+                             gap_open=gap_open, gap_extend=gap_extend)
+    tree = guide_tree(scores, method)
+
+    def merge(node):
+        if isinstance(node, (int, np.integer)):
+            return [int(node)], [sequences[node]]
+        members1, aln1 = merge(node[0])
+        members2, aln2 = merge(node[1])
+        aln1, aln2, _ = needleman_wunsch_affine_profile(aln1, aln2, score_fun, gap_open, gap_extend,
+                                                         full_matrix_cells)
+        return members1 + members2, aln1 + aln2
+
+    members, alignment = merge(tree)
+    result = [''] * len(sequences)
+    for index, row in zip(members, alignment):
+        result[index] = row
+    return result
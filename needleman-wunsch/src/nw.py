@@ -1,10 +1,20 @@
+from contextlib import nullcontext
 from typing import Callable, Tuple
 import argparse
 import sys
 
 PRINT_MAX_LINE_LENGTH = 80
-DEBUG = False
 GLOBAL_MINIMUM = -10**10
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+
+_NO_PHASE = nullcontext()
+
+
+def _phase(name: str):
+    return PROFILER.phase(name) if PROFILER is not None else _NO_PHASE
+
 
 def score_fun(a: str,  b: str, match_score: int = 5, mismatch_score: int = -4) -> int:
     return match_score if a == b else mismatch_score
@@ -33,46 +43,51 @@ def needleman_wunsch(seq1: str,
         aligned_seq1: The first aligned sequence, e.g. 'ACCGT'
         aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
     """
-    # Initialize the score matrix.
-    score_matrix = [[0 for _ in range(len(seq2) + 1)] for _ in range(len(seq1) + 1)]
-    # Setting seeds: D(i,0) = i*gap, D(0,j) = j*gap
-    for i in range(len(seq1) + 1): score_matrix[i][0] = i * gap_penalty
-    for i in range(len(seq2) + 1): score_matrix[0][i] = i * gap_penalty
-    # Evaluating score_matrix
-    for i in range(1, len(seq1) + 1):
-        for j in range(1, len(seq2) + 1):
-            score_max = max(score_matrix[i-1][j-1] + score(seq1[i-1], seq2[j-1]),
-                            score_matrix[i-1][j] + gap_penalty,
-                            score_matrix[i][j-1] + gap_penalty)
-            score_matrix[i][j] = score_max
-    # Restoring aligned sequences: finding max among diag, up, left, then go there until i == 0 and j == 0
-    i, j = len(seq1), len(seq2)
-    aligned_seq1, aligned_seq2 = '', ''
-    while i != 0 or j != 0:
-        diag, up, left = (score_matrix[i-1][j-1] + score(seq1[i-1], seq2[j-1]) if i >= 1 and j >= 1 else GLOBAL_MINIMUM,
-                         score_matrix[i-1][j] + gap_penalty if i >= 1 else GLOBAL_MINIMUM,
-                         score_matrix[i][j-1] + gap_penalty if j >= 1 else GLOBAL_MINIMUM)
-        i_step, j_step = 0, 0
-        push_seq1, push_seq2 = '-', '-'
-        if diag >= up and diag >= left:
-            push_seq1, push_seq2 = seq1[i-1], seq2[j-1]
-            i_step, j_step = -1, -1
-        elif up >= diag and up >= left:
-            push_seq1 = seq1[i-1]
-            i_step = -1
-        elif left >= up and left >= diag:
-            push_seq2 = seq2[j-1]
-            j_step = -1
-        i, j = i + i_step, j + j_step
-        aligned_seq1 = push_seq1 + aligned_seq1
-        aligned_seq2 = push_seq2 + aligned_seq2
+    if PROFILER is not None:
+        score = PROFILER.wrap(score, 'score')
+    with _phase('fill'):
+        # Initialize the score matrix.
+        score_matrix = [[0 for _ in range(len(seq2) + 1)] for _ in range(len(seq1) + 1)]
+        # Setting seeds: D(i,0) = i*gap, D(0,j) = j*gap
+        for i in range(len(seq1) + 1): score_matrix[i][0] = i * gap_penalty
+        for i in range(len(seq2) + 1): score_matrix[0][i] = i * gap_penalty
+        # Evaluating score_matrix
+        for i in range(1, len(seq1) + 1):
+            for j in range(1, len(seq2) + 1):
+                score_max = max(score_matrix[i-1][j-1] + score(seq1[i-1], seq2[j-1]),
+                                score_matrix[i-1][j] + gap_penalty,
+                                score_matrix[i][j-1] + gap_penalty)
+                score_matrix[i][j] = score_max
+    if PROFILER is not None:
+        PROFILER.count('cells', len(seq1) * len(seq2))
+        PROFILER.matrix('score_matrix', score_matrix)
+    with _phase('traceback'):
+        # Restoring aligned sequences: finding max among diag, up, left, then go there until i == 0 and j == 0
+        i, j = len(seq1), len(seq2)
+        aligned_seq1, aligned_seq2 = '', ''
+        while i != 0 or j != 0:
+            diag, up, left = (score_matrix[i-1][j-1] + score(seq1[i-1], seq2[j-1]) if i >= 1 and j >= 1 else GLOBAL_MINIMUM,
+                             score_matrix[i-1][j] + gap_penalty if i >= 1 else GLOBAL_MINIMUM,
+                             score_matrix[i][j-1] + gap_penalty if j >= 1 else GLOBAL_MINIMUM)
+            i_step, j_step = 0, 0
+            push_seq1, push_seq2 = '-', '-'
+            if diag >= up and diag >= left:
+                push_seq1, push_seq2 = seq1[i-1], seq2[j-1]
+                i_step, j_step = -1, -1
+            elif up >= diag and up >= left:
+                push_seq1 = seq1[i-1]
+                i_step = -1
+            elif left >= up and left >= diag:
+                push_seq2 = seq2[j-1]
+                j_step = -1
+            i, j = i + i_step, j + j_step
+            aligned_seq1 = push_seq1 + aligned_seq1
+            aligned_seq2 = push_seq2 + aligned_seq2
     return score_matrix[-1][-1], aligned_seq1, aligned_seq2
 
-def print_array(matrix: list):
-    for row in matrix:
-        for element in row:
-            print(f"{element:6}", end="")
-        print()
+# The name cached() results are stored under whatever path this module was imported by,
+# the version is raised whenever the results change
+needleman_wunsch.engine = 'nw/1'
 
 def print_results(seq1: str, seq2: str, score: int, file = None):
     """Prints the results of the Needleman-Wunsch algorithm.
@@ -105,30 +120,57 @@ def print_results(seq1: str, seq2: str, score: int, file = None):
 
 def main():
     parser = argparse.ArgumentParser(description='Needleman-Wunsch algorithm')
-    parser.add_argument('seq1', help='first sequence')
-    parser.add_argument('seq2', help='second sequence')
+    parser.add_argument('seq1', nargs='?', help='first sequence')
+    parser.add_argument('seq2', nargs='?', help='second sequence')
     parser.add_argument('--match', type=int, help='match score')
     parser.add_argument('--mismatch', type=int, help='mismatch score')
     parser.add_argument('--gap', type=int, default=-10, help='gap penalty')
-    parser.add_argument('--debug', action='store_true', help='debug mode')
+    parser.add_argument('--profile', action='store_true', help='report phase timings and counters on stderr')
+    batch = parser.add_argument_group('batch mode', 'align every pair of a file, run as python -m src.nw')
+    batch.add_argument('--batch', metavar='FILE', help='TSV or FASTA file with the pairs, - for stdin')
+    batch.add_argument('--input-format', choices=['auto', 'tsv', 'fasta'], default='auto',
+                       help='input format, auto picks FASTA for input starting with >')
+    batch.add_argument('--output-format', choices=['jsonl', 'cigar'], default='jsonl', help='output format')
+    batch.add_argument('-o', '--output', default='-', help='output file, - for stdout')
+    batch.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    batch.add_argument('--chunk-size', type=int, default=256, help='pairs per worker task')
+    batch.add_argument('--max-in-flight', type=int, help='most chunks queued at once, default 2 * workers')
+    batch.add_argument('--unordered', action='store_true', help='write results as soon as they are ready')
+    batch.add_argument('--progress', action='store_true', help='report progress and throughput on stderr')
     args = parser.parse_args()
 
-    global DEBUG
-    DEBUG = args.debug
-    print(args.match, args.mismatch, args.gap)
-
-    if args.match and args.mismatch:
-        score, aln1, aln2 = needleman_wunsch(args.seq1,
-                                             args.seq2,
-                                             score_fun=lambda x, y: args.match if x == y else args.mismatch,
-                                             gap_penalty=args.gap)
-    else:
-        assert not args.match and not args.mismatch, "match and mismatch must be specified together"
-        score, aln1, aln2 = needleman_wunsch(args.seq1,
-                                             args.seq2,
-                                             score_fun=score_fun,
-                                             gap_penalty=args.gap)
+    if (args.match is None) != (args.mismatch is None):
+        parser.error("match and mismatch must be specified together")
+    if args.batch is not None:
+        if args.profile:
+            parser.error("--profile covers one pair, not --batch")
+        if not __package__:
+            parser.error("batch mode needs the package context, run it as python -m src.nw")
+        from .stream import main as batch_main
+        return batch_main(args)
+    if args.seq1 is None or args.seq2 is None:
+        parser.error("seq1 and seq2 are required unless --batch is given")
+    hook = nullcontext()
+    if args.profile:
+        if not __package__:
+            parser.error("--profile needs the package context, run it as python -m src.nw")
+        from .instrument import JSONSink, Profiler, installed
+        hook = installed(Profiler(sinks=[JSONSink(sys.stderr)], trace_memory=True), sys.modules[__name__])
+
+    with hook as profiler:
+        if args.match is not None:
+            score, aln1, aln2 = needleman_wunsch(args.seq1,
+                                                 args.seq2,
+                                                 score=lambda x, y: args.match if x == y else args.mismatch,
+                                                 gap_penalty=args.gap)
+        else:
+            score, aln1, aln2 = needleman_wunsch(args.seq1,
+                                                 args.seq2,
+                                                 score=score_fun,
+                                                 gap_penalty=args.gap)
     print_results(aln1, aln2, score)
+    if profiler is not None:
+        profiler.flush()
 
     return score, aln1, aln2
 
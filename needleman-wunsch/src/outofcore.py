@@ -0,0 +1,226 @@
+"""Needleman-Wunsch with the full score matrix in memory-mapped tiles on disk.
+
+The matrix D(1..n, 1..m) is cut into tile x tile blocks, each stored as its
+own .npy file. Tiles are filled in wavefront order (by anti-diagonals of
+tiles), every tile from the last row of the tile above it, the last column of
+the tile to its left and the corner of the one diagonally above, with the row
+kernel `kernels.nw_tile`. Only those boundaries and the tile being filled are
+held in memory, so the alignment size is limited by disk space, not RAM. The
+tiles hold row-relative scores R(i,j) = D(i,j) - i*gap, which depend on the
+number of columns only, in the narrowest integer type that fits them: int16
+tiles take a quarter of the disk space and page cache of int64 ones.
+
+A finished tile is written next to its final name and renamed, so a tile file
+that exists is complete: a run that crashed resumes with the first missing
+tile. The directory's meta.json records the alignment key of `cache` (the
+sequences and the scoring table), and a directory holding another alignment is
+refused rather than overwritten.
+
+The traceback and `value()` map tiles read-only and keep the most recently
+used ones open, so walking the optimal path, or any other analysis of the
+full matrix, reads back only the tiles it touches.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Tuple
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .cache import alignment_key
+from .instrument import phase
+from .kernels import build_alphabet, encode, linear_bound, nw_tile, score_dtype, substitution_table
+from .nw import GLOBAL_MINIMUM, score_fun
+
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+
+class OutOfCoreAligner:
+    """The Needleman-Wunsch matrix of two sequences, filled into and read from tile files.
+
+    Args:
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        directory: Where the tiles are stored; an existing directory of the same alignment is resumed
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_penalty: The gap penalty value, e.g. -10
+        tile: The tile side, e.g. 1024 (2 MiB per int16 tile)
+        cache_tiles: How many tiles the traceback and value() keep mapped
+    """
+
+    def __init__(self,
+                 seq1: str,
+                 seq2: str,
+                 directory: str,
+                 score: Callable[[str, str], int] = score_fun,
+                 gap_penalty: int = -10,
+                 tile: int = 1024,
+                 cache_tiles: int = 16):
+        if tile < 1:
+            raise ValueError("tile must be positive, got %d" % tile)
+        self.seq1, self.seq2, self.gap_penalty, self.tile = seq1, seq2, gap_penalty, tile
+        self.directory = Path(directory)
+        self.rows, self.cols = -(-len(seq1) // tile), -(-len(seq2) // tile)
+        alphabet = build_alphabet((seq1, seq2))
+        self._table = substitution_table(score, alphabet).astype(np.int64)
+        self._a, self._b = encode(seq1, alphabet), encode(seq2, alphabet)
+        self._cache, self.cache_tiles = OrderedDict(), cache_tiles
+        self.dtype = score_dtype(linear_bound(len(seq2), self._table, gap_penalty))
+        self.meta = {'key': alignment_key('needleman_wunsch', seq1, seq2, score=score, gap_penalty=gap_penalty),
+                     'shape': [len(seq1), len(seq2)], 'tile': tile, 'dtype': self.dtype.name, 'values': 'row-relative'}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / 'meta.json'
+        if path.exists():
+            with open(path) as file:
+                meta = json.load(file)
+            if meta != self.meta:
+                raise ValueError("%s holds the tiles of another alignment or tile size" % self.directory)
+        else:
+            with open(path, 'w') as file:
+                json.dump(self.meta, file)
+
+    def _path(self, ti: int, tj: int) -> Path:
+        return self.directory / ('tile_%d_%d.npy' % (ti, tj))
+
+    def done(self, ti: int, tj: int) -> bool:
+        """Whether tile (ti, tj) has been computed."""
+        return self._path(ti, tj).exists()
+
+    def load(self, ti: int, tj: int) -> np.ndarray:
+        """Maps tile (ti, tj) read-only; tile[p, q] == D(i, j) - i * gap for i, j = ti*tile + 1 + p, tj*tile + 1 + q."""
+        key = (ti, tj)
+        tile = self._cache.get(key)
+        if tile is not None:
+            self._cache.move_to_end(key)
+            return tile
+        tile = self._cache[key] = np.load(self._path(ti, tj), mmap_mode='r')
+        if PROFILER is not None:
+            PROFILER.count('tiles_loaded')
+        while len(self._cache) > self.cache_tiles:
+            self._cache.popitem(last=False)
+        return tile
+
+    def _boundary(self, ti: int, tj: int) -> Tuple[np.ndarray, np.ndarray]:
+        # The row above tile (ti, tj) with its corner, and the column left of it
+        t, g = self.tile, self.gap_penalty
+        i0, j0 = ti * t, tj * t
+        i1, j1 = min(i0 + t, len(self.seq1)), min(j0 + t, len(self.seq2))
+        top = np.empty(j1 - j0 + 1, dtype=self.dtype)
+        if ti == 0:
+            top[:] = np.arange(j0, j1 + 1) * g
+        else:
+            top[1:] = self.load(ti - 1, tj)[-1]
+            top[0] = self.load(ti - 1, tj - 1)[-1, -1] if tj else 0
+        if tj == 0:
+            # R(i, 0) == 0 down the first column
+            left = np.zeros(i1 - i0, dtype=self.dtype)
+        else:
+            left = np.array(self.load(ti, tj - 1)[:, -1])
+        return top, left
+
+    def fill(self) -> int:
+        """Computes every missing tile in wavefront order and returns how many were computed."""
+        computed = skipped = cells = 0
+        t = self.tile
+        with phase(PROFILER, 'fill'):
+            for d in range(self.rows + self.cols - 1):
+                for ti in range(max(0, d - self.cols + 1), min(d, self.rows - 1) + 1):
+                    tj = d - ti
+                    path = self._path(ti, tj)
+                    if path.exists():
+                        skipped += 1
+                        continue
+                    top, left = self._boundary(ti, tj)
+                    tile = nw_tile(self._a[ti * t:(ti + 1) * t], self._b[tj * t:(tj + 1) * t], self._table,
+                                   self.gap_penalty, top, left)
+                    # Saved under a temporary name and renamed: a tile file that exists is complete
+                    temporary = path.with_name('%s.%d.tmp.npy' % (path.stem, os.getpid()))
+                    np.save(temporary, tile)
+                    os.replace(temporary, path)
+                    computed += 1
+                    cells += tile.size
+        if PROFILER is not None:
+            PROFILER.count('tiles', computed)
+            PROFILER.count('tiles_resumed', skipped)
+            PROFILER.count('cells', cells)
+        return computed
+
+    def value(self, i: int, j: int) -> int:
+        """D(i, j), read from its tile; the matrix must have been filled."""
+        if i == 0 or j == 0:
+            return (i + j) * self.gap_penalty
+        t = self.tile
+        return int(self.load((i - 1) // t, (j - 1) // t)[(i - 1) % t, (j - 1) % t]) + i * self.gap_penalty
+
+    @property
+    def score(self) -> int:
+        """The optimal alignment score, D(n, m)."""
+        return self.value(len(self.seq1), len(self.seq2))
+
+    def alignment(self) -> Tuple[int, str, str]:
+        """Fills the missing tiles and traces the optimal alignment back, the result equals needleman_wunsch(...).
+
+        Returns:
+            score: The optimal alignment score, e.g. 10
+            aligned_seq1: The first aligned sequence, e.g. 'ACCGT'
+            aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
+        """
+        self.fill()
+        with phase(PROFILER, 'traceback'):
+            seq1, seq2, g, table = self.seq1, self.seq2, self.gap_penalty, self._table
+            a, b = self._a, self._b
+            i, j = len(seq1), len(seq2)
+            aligned1, aligned2 = [], []
+            while i != 0 or j != 0:
+                diag = self.value(i - 1, j - 1) + table[a[i - 1], b[j - 1]] if i >= 1 and j >= 1 else GLOBAL_MINIMUM
+                up = self.value(i - 1, j) + g if i >= 1 else GLOBAL_MINIMUM
+                left = self.value(i, j - 1) + g if j >= 1 else GLOBAL_MINIMUM
+                if diag >= up and diag >= left:
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append(seq2[j - 1])
+                    i, j = i - 1, j - 1
+                elif up >= left:
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append('-')
+                    i -= 1
+                else:
+                    aligned1.append('-')
+                    aligned2.append(seq2[j - 1])
+                    j -= 1
+        return self.score, ''.join(reversed(aligned1)), ''.join(reversed(aligned2))
+
+    def close(self):
+        """Unmaps the cached tiles."""
+        self._cache.clear()
+
+
+def needleman_wunsch_ooc(seq1: str,
+                         seq2: str,
+                         score: Callable[[str, str], int] = score_fun,
+                         gap_penalty: int = -10,
+                         directory: str = None,
+                         tile: int = 1024) -> Tuple[int, str, str]:
+    """Aligns two sequences with the score matrix on disk, the result equals needleman_wunsch(...).
+
+    Args:
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_penalty: The gap penalty value, e.g. -10
+        directory: Where the tiles are kept, and resumed from if the run is repeated;
+            None uses a temporary directory that is removed afterwards
+        tile: The tile side, e.g. 1024
+    """
+    temporary = tempfile.mkdtemp(prefix='nw-tiles-') if directory is None else None
+    try:
+        aligner = OutOfCoreAligner(seq1, seq2, directory or temporary, score, gap_penalty, tile)
+        result = aligner.alignment()
+        aligner.close()
+        return result
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors=True)
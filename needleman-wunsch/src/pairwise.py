@@ -0,0 +1,245 @@
+"""All-vs-all pairwise alignment scores on a shared-memory process pool.
+
+The encoded sequences are packed into one shared buffer, the upper triangle of
+the N x N matrix is cut into tiles of roughly equal DP cell count, and each
+worker writes the scores of its tile straight into a shared result array.
+Finished tiles can be checkpointed to disk so that long runs resume where they
+stopped instead of starting over.
+"""
+from multiprocessing import shared_memory
+from typing import Callable, List, Sequence, Tuple
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from .kernels import SCORE_ENGINES, build_alphabet, encode, engine_params, substitution_table
+from .nw import score_fun
+
+# A tile is a list of row segments (i, j_start, j_end): pairs (i, j) with j_start <= j < j_end
+Tile = List[Tuple[int, int, int]]
+
+# Finished tiles are flushed to the checkpoint at most this often, and when the run ends
+CHECKPOINT_SECONDS = 5.0
+
+# Worker-side view of the shared buffers, filled by _attach()
+_STATE = {}
+
+
+def plan_tiles(lengths: Sequence[int], n_tiles: int) -> List[Tile]:
+    """Splits the upper triangle (diagonal included) into tiles of similar DP cell count.
+
+    Pairs are walked row by row and cut whenever the accumulated estimate
+    (len(seq_i) + 1) * (len(seq_j) + 1) reaches the next multiple of total / n_tiles,
+    so a tile may cover the tail of one row and the head of the next.
+
+    Args:
+        lengths: The sequence lengths, e.g. [150, 148, 301]
+        n_tiles: The desired number of tiles, e.g. 32
+
+    Returns:
+        tiles: The list of tiles, in row-major order
+    """
+    sizes = np.asarray(lengths, dtype=np.float64) + 1
+    n = len(sizes)
+    # Cumulative cost of the upper triangle in row-major order, one row at a time
+    row_costs = sizes * np.cumsum(sizes[::-1])[::-1]
+    total = row_costs.sum()
+    target = total / max(1, n_tiles)
+    tiles, current = [], []
+    done, boundary = 0.0, target
+    for i in range(n):
+        row = done + sizes[i] * np.cumsum(sizes[i:])
+        j = i
+        while j < n:
+            # Extend the segment up to the first pair that reaches the boundary
+            end = min(n, i + int(np.searchsorted(row, boundary, side='left')) + 1)
+            current.append((i, j, end))
+            j = end
+            if row[j - i - 1] >= boundary:
+                tiles.append(current)
+                current = []
+                while boundary <= row[j - i - 1]:
+                    boundary += target
+        done = row[-1]
+    if current:
+        tiles.append(current)
+    return tiles
+
+
+def tile_cost(tile: Tile, lengths: Sequence[int]) -> int:
+    """Returns the estimated number of DP cells in a tile."""
+    return sum((lengths[i] + 1) * sum(lengths[j] + 1 for j in range(j0, j1)) for i, j0, j1 in tile)
+
+
+def _attach(names, shapes, engine, params):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    packed, offsets, table, result = (np.ndarray(shape, dtype=dtype, buffer=buffer.buf)
+                                      for buffer, (shape, dtype) in zip(buffers, shapes))
+    _STATE.update(buffers=buffers, packed=packed, offsets=offsets, table=table, result=result,
+                  engine=SCORE_ENGINES[engine], params=params)
+
+
+def _detach():
+    buffers = _STATE.pop('buffers', [])
+    _STATE.clear()
+    for buffer in buffers:
+        buffer.close()
+
+
+def _run_tile(task):
+    index, tile = task
+    packed, offsets, result = _STATE['packed'], _STATE['offsets'], _STATE['result']
+    engine, table, params = _STATE['engine'], _STATE['table'], _STATE['params']
+    for i, j0, j1 in tile:
+        a = packed[offsets[i]:offsets[i + 1]]
+        for j in range(j0, j1):
+            result[i, j] = engine(a, packed[offsets[j]:offsets[j + 1]], table, *params)
+    return index
+
+
+def _open_checkpoint(path, meta, n, n_tiles):
+    """Opens (or creates) the on-disk scores and per-tile completion flags."""
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'meta.json')
+    scores_path, done_path = os.path.join(path, 'scores.npy'), os.path.join(path, 'done.npy')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            saved = json.load(f)
+        if saved != meta:
+            raise ValueError("checkpoint %s was written for different sequences or parameters" % path)
+        return np.load(scores_path, mmap_mode='r+'), np.load(done_path, mmap_mode='r+')
+    scores = np.lib.format.open_memmap(scores_path, mode='w+', dtype=np.float64, shape=(n, n))
+    done = np.lib.format.open_memmap(done_path, mode='w+', dtype=np.bool_, shape=(n_tiles,))
+    done.flush()
+    # meta.json is written last: its presence marks a usable checkpoint
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return scores, done
+
+
+def _flush_checkpoint(scores, done, indices):
+    # The scores go to disk before the flags that declare their tiles finished
+    if indices:
+        scores.flush()
+        done[indices] = True
+        done.flush()
+        indices.clear()
+
+
+def pairwise_matrix(sequences: Sequence[str],
+                    engine: str = 'nw',
+                    workers: int = None,
+                    score: Callable[[str, str], int] = score_fun,
+                    gap_penalty: int = -10,
+                    gap_open: int = -10,
+                    gap_extend: int = -1,
+                    checkpoint: str = None,
+                    tiles_per_worker: int = 8) -> np.ndarray:
+    """Computes the scores of all pairwise global alignments of the sequences.
+
+    The matrix is symmetric; entry [i, j] equals needleman_wunsch(seq_i, seq_j)[0]
+    for engine 'nw' and needleman_wunsch_affine(seq_i, seq_j)[2] for engine 'affine'.
+    The diagonal holds the self-alignment scores.
+
+    Args:
+        sequences: The sequences to compare, e.g. ['ACGT', 'ACG', 'TAGT']
+        engine: The score engine, 'nw' (linear gaps) or 'affine'
+        workers: The number of worker processes, defaults to os.cpu_count(); 1 runs in-process
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_penalty: The gap penalty value of the 'nw' engine, e.g. -10
+        gap_open: The gap open penalty of the 'affine' engine, e.g. -10
+        gap_extend: The gap extend penalty of the 'affine' engine, e.g. -1
+        checkpoint: Directory to persist finished tiles in; an interrupted run
+            given the same directory only computes the missing tiles
+        tiles_per_worker: How many tiles to plan per worker, more tiles balance better
+
+    Returns:
+        scores: (N, N) float64 array of alignment scores
+    """
+    params = tuple(engine_params(engine, gap_penalty, gap_open, gap_extend))
+    workers = workers or os.cpu_count() or 1
+    n = len(sequences)
+    alphabet = build_alphabet(sequences)
+    table = substitution_table(score, alphabet).astype(np.int64)
+    codes = [encode(seq, alphabet) for seq in sequences]
+    lengths = [len(seq) for seq in sequences]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    packed = np.concatenate(codes) if codes else np.zeros(0, dtype=np.uint8)
+
+    if checkpoint is not None and os.path.exists(os.path.join(checkpoint, 'meta.json')):
+        # Reuse the tile plan of the interrupted run, even if the worker count changed
+        with open(os.path.join(checkpoint, 'meta.json')) as f:
+            planned = json.load(f).get('n_tiles', workers * tiles_per_worker)
+    else:
+        planned = workers * tiles_per_worker
+    tiles = plan_tiles(lengths, planned)
+    n_tiles = len(tiles)
+
+    scores, done = None, np.zeros(n_tiles, dtype=np.bool_)
+    if checkpoint is not None:
+        digest = hashlib.sha256()
+        for array in (packed, offsets, table):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(alphabet.encode('latin-1'))
+        meta = {'n': n, 'engine': engine, 'params': list(params), 'n_tiles': planned,
+                'fingerprint': digest.hexdigest()}
+        scores, done = _open_checkpoint(checkpoint, meta, n, n_tiles)
+
+    arrays = (packed if len(packed) else np.zeros(1, dtype=np.uint8), offsets, table)
+    shapes = [(array.shape, array.dtype) for array in arrays] + [((n, n), np.dtype(np.float64))]
+    blocks = []
+    try:
+        for shape, dtype in shapes:
+            blocks.append(shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize)))
+        for block, array in zip(blocks, arrays):
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        result = np.ndarray((n, n), dtype=np.float64, buffer=blocks[3].buf)
+        result[...] = scores if scores is not None else 0
+        del result
+
+        pending = [(index, tiles[index]) for index in range(n_tiles) if not done[index]]
+        # Longest tiles first, so the stragglers at the end are the short ones
+        pending.sort(key=lambda task: -tile_cost(task[1], lengths))
+        names = [block.name for block in blocks]
+        pool = None
+        if workers == 1 or len(pending) <= 1:
+            _attach(names, shapes, engine, params)
+            completed = map(_run_tile, pending)
+        else:
+            pool = multiprocessing.Pool(min(workers, len(pending)), initializer=_attach,
+                                        initargs=(names, shapes, engine, params))
+            completed = pool.imap_unordered(_run_tile, pending)
+        unflushed, flushed_at = [], time.monotonic()
+        try:
+            for index in completed:
+                if scores is not None:
+                    result = np.ndarray((n, n), dtype=np.float64, buffer=blocks[3].buf)
+                    for i, j0, j1 in tiles[index]:
+                        scores[i, j0:j1] = result[i, j0:j1]
+                    del result
+                    unflushed.append(index)
+                    if time.monotonic() - flushed_at >= CHECKPOINT_SECONDS:
+                        _flush_checkpoint(scores, done, unflushed)
+                        flushed_at = time.monotonic()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _detach()
+            if scores is not None:
+                _flush_checkpoint(scores, done, unflushed)
+
+        # One copy out of the shared block, the lower triangle mirrored into it row by row
+        matrix = np.array(np.ndarray((n, n), dtype=np.float64, buffer=blocks[3].buf))
+        for i in range(n):
+            matrix[i + 1:, i] = matrix[i, i + 1:]
+        return matrix
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
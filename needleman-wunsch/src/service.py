@@ -0,0 +1,304 @@
+"""Asyncio alignment service for other local processes.
+
+It serves linear-gap Needleman-Wunsch only, the results of `needleman_wunsch`;
+the banded, Hirschberg and affine engines are not exposed.
+
+Clients connect over a Unix socket or localhost TCP and send one JSON request
+per line, {"id": ..., "seq1": ..., "seq2": ..., "match": 5, "mismatch": -4,
+"gap": -10}; every request gets one JSON line back with the same id and either
+"score", "aln1", "aln2" or "error". Responses may arrive out of order. A
+line longer than `max_line` bytes is skipped and answered with an error.
+
+Requests arriving within `max_delay` seconds are coalesced into batches per
+scoring scheme and aligned with `align_batch` on a process pool, so the event
+loop never blocks on an alignment. The number of unanswered requests is
+bounded: when the limit is reached, reading from the clients stops until the
+workers catch up. Every request has a deadline, and results are kept in an
+`AlignmentCache`, optionally backed by an sqlite file shared across restarts;
+its lookups and writes then run on a dedicated thread, one write transaction
+per batch, so disk I/O never blocks the event loop either.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import List, Tuple
+import argparse
+import asyncio
+import json
+import os
+
+from .batch import align_batch
+from .cache import AlignmentCache, alignment_key, engine_name
+from .nw import needleman_wunsch, score_fun
+
+# The default longest request line, the 64 KiB of asyncio's streams would not fit a long pair
+MAX_LINE = 16 << 20
+
+
+def align_pairs(pairs: List[Tuple[str, str]], match: int, mismatch: int, gap: int):
+    """Aligns one coalesced batch, runs in the worker processes."""
+    return align_batch(pairs, score=partial(score_fun, match_score=match, mismatch_score=mismatch),
+                       gap_penalty=gap)
+
+
+def request_key(seq1: str, seq2: str, match: int, mismatch: int, gap: int) -> str:
+    """Cache key of a request, the same as for cached(needleman_wunsch) with these parameters."""
+    return alignment_key(engine_name(needleman_wunsch), seq1, seq2,
+                         score=partial(score_fun, match_score=match, mismatch_score=mismatch), gap_penalty=gap)
+
+
+class AlignmentServer:
+    """Coalesces linear-gap Needleman-Wunsch requests into batches for a process pool.
+
+    Args:
+        workers: The number of worker processes
+        max_batch: The largest number of pairs aligned in one batch
+        max_delay: Seconds to wait for more requests before dispatching a batch
+        max_pending: The largest number of unanswered requests over all clients
+        timeout: Seconds a request may take before it is answered with an error
+        cache_size: The number of results kept in memory
+        cache_path: The sqlite file of the on-disk cache tier, e.g. 'alignments.sqlite'
+        cache_disk_bytes: The size the on-disk cache tier is trimmed to
+        max_line: The longest request line in bytes, longer ones are answered with an error
+    """
+
+    def __init__(self, workers: int = 1, max_batch: int = 256, max_delay: float = 0.005,
+                 max_pending: int = 4096, timeout: float = 30.0, cache_size: int = 4096,
+                 cache_path: str = None, cache_disk_bytes: int = 1 << 30, max_line: int = MAX_LINE):
+        self.workers, self.max_batch, self.max_delay = workers, max_batch, max_delay
+        self.max_line = max_line
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.stats = {'requests': 0, 'batches': 0, 'cache_hits': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+        self.cache = None
+        if cache_size or cache_path:
+            self.cache = AlignmentCache(cache_size, path=cache_path, max_disk_bytes=cache_disk_bytes)
+        # Every access to a disk-backed cache goes through this one thread, in order
+        self._cache_io = ThreadPoolExecutor(1, thread_name_prefix='alignment-cache') if cache_path else None
+        self._running = {}
+        self._queue = None
+        self._pool = None
+        self._server = None
+        self._tasks = set()
+
+    async def start(self, path: str = None, host: str = '127.0.0.1', port: int = 0):
+        """Starts listening on a Unix socket if path is given, on host:port otherwise."""
+        self._queue = asyncio.Queue()
+        self._admission = asyncio.Semaphore(self.max_pending)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pool = ProcessPoolExecutor(self.workers)
+        self._batcher = asyncio.ensure_future(self._dispatch())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_client, path=path, limit=self.max_line)
+        else:
+            self._server = await asyncio.start_server(self._serve_client, host=host, port=port,
+                                                      limit=self.max_line)
+        return self._server
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(self._batcher, *self._tasks, return_exceptions=True)
+        self._pool.shutdown(cancel_futures=True)
+        if self._cache_io is not None:
+            # Lets the writes already submitted finish
+            self._cache_io.shutdown()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def _cache_call(self, method, *args):
+        # Memory-only lookups are cheap enough for the event loop, sqlite I/O is not
+        if self._cache_io is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._cache_io, method, *args)
+
+    async def align(self, seq1: str, seq2: str, match: int = 5, mismatch: int = -4, gap: int = -10):
+        """Aligns one pair through the batcher, returns (score, aln1, aln2)."""
+        self.stats['requests'] += 1
+        # Checked here rather than in the worker, where one bad pair would fail its whole batch
+        seq1.encode('latin-1'), seq2.encode('latin-1')
+        key = request_key(seq1, seq2, match, mismatch, gap)
+        cached = await self._cache_call(self.cache.get, key) if self.cache is not None else None
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+        future = self._running.get(key)
+        if future is not None:
+            # The same input is already queued or being aligned, share its result
+            self.stats['coalesced'] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._running[key] = future
+            self._queue.put_nowait(((match, mismatch, gap), seq1, seq2, key, future))
+        return await asyncio.shield(future)
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for params, items in groups.items():
+                # Waits for a free worker, so the queue fills up when the pool is saturated
+                await self._slots.acquire()
+                task = asyncio.ensure_future(self._run(params, items))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, params, items):
+        self.stats['batches'] += 1
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._pool, align_pairs, [(seq1, seq2) for _, seq1, seq2, _, _ in items], *params)
+        except Exception as error:
+            results = [error] * len(items)
+        finally:
+            self._slots.release()
+        stored = []
+        for (_, _, _, key, future), result in zip(items, results):
+            del self._running[key]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+                continue
+            stored.append((key, result))
+            future.set_result(result)
+        if self.cache is not None and stored:
+            # Submitted before any later lookup, so a repeated request finds the result; shielded so that
+            # close() cancelling this task still lets the write finish
+            await asyncio.shield(self._cache_call(self.cache.put_many, stored))
+
+    async def _answer(self, request: dict) -> dict:
+        response = {'id': request.get('id')}
+        try:
+            score, aln1, aln2 = await asyncio.wait_for(
+                self.align(str(request['seq1']), str(request['seq2']), int(request.get('match', 5)),
+                           int(request.get('mismatch', -4)), int(request.get('gap', -10))),
+                self.timeout)
+            response.update(score=score, aln1=aln1, aln2=aln2)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            response['error'] = 'timeout after %g s' % self.timeout
+        except (KeyError, TypeError, ValueError) as error:
+            self.stats['errors'] += 1
+            response['error'] = 'bad request: %s' % error
+        except Exception as error:
+            self.stats['errors'] += 1
+            response['error'] = 'alignment failed: %s' % error
+        return response
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+
+        async def send(response):
+            async with lock:
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+                response = await self._answer(request)
+            except ValueError as error:
+                response = {'id': None, 'error': 'bad request: %s' % error}
+            finally:
+                self._admission.release()
+            await send(response)
+
+        pending = set()
+        try:
+            while True:
+                # Waits while max_pending requests are unanswered, so busy workers slow the clients down
+                await self._admission.acquire()
+                admitted = False
+                try:
+                    line = await _read_line(reader)
+                    if line is None:
+                        self.stats['errors'] += 1
+                        await send({'id': None, 'error': 'bad request: line longer than %d bytes' % self.max_line})
+                    elif line.strip():
+                        task = asyncio.ensure_future(respond(line))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+                        # respond() releases the permit once the request is answered
+                        admitted = True
+                    elif not line:
+                        break
+                finally:
+                    if not admitted:
+                        self._admission.release()
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+
+async def _read_line(reader: asyncio.StreamReader):
+    """The next line, b'' at the end of the stream, None for a line over the reader's limit, which is skipped."""
+    try:
+        return await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+    except ConnectionError:
+        return b''
+    except asyncio.LimitOverrunError as error:
+        consumed = error.consumed
+    # The line is left in the buffer, drops it piece by piece up to its newline
+    try:
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b'\n')
+                return None
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+async def serve(args):
+    server = AlignmentServer(workers=args.workers, max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000,
+                             max_pending=args.max_pending, timeout=args.timeout, cache_size=args.cache_size,
+                             cache_path=args.cache_path, cache_disk_bytes=args.cache_disk_mb << 20,
+                             max_line=args.max_line_mb << 20)
+    listener = await server.start(path=args.socket, port=args.port)
+    where = args.socket or '127.0.0.1:%d' % listener.sockets[0].getsockname()[1]
+    print("alignment service listening on %s" % where, flush=True)
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Linear-gap Needleman-Wunsch alignment service')
+    parser.add_argument('--socket', help='Unix socket path; listens on localhost TCP when omitted')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--max-batch', type=int, default=256, help='most pairs aligned in one batch')
+    parser.add_argument('--max-delay-ms', type=float, default=5, help='time to wait for a batch to fill')
+    parser.add_argument('--max-pending', type=int, default=4096, help='most requests queued before reads stop')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout in seconds')
+    parser.add_argument('--cache-size', type=int, default=4096, help='number of cached results in memory')
+    parser.add_argument('--cache-path', help='sqlite file that keeps results across restarts')
+    parser.add_argument('--cache-disk-mb', type=int, default=1024, help='size limit of the cache file')
+    parser.add_argument('--max-line-mb', type=int, default=MAX_LINE >> 20, help='longest request line')
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
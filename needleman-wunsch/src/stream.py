@@ -0,0 +1,227 @@
+"""Streaming batch alignment for the command line.
+
+Pairs are read lazily from a TSV or FASTA stream, cut into chunks, aligned
+with `align_batch` on a pool of worker processes and written as JSONL or
+CIGAR lines as soon as they are ready. At most `max_in_flight` chunks are
+queued at any time, so memory stays flat however long the input is.
+"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import chain, islice
+from typing import IO, Iterable, Iterator, List, Tuple
+import json
+import sys
+import time
+
+from .batch import align_batch
+from .nw import score_fun
+
+# (id, seq1, seq2)
+Pair = Tuple[str, str, str]
+
+
+def read_tsv(lines: Iterable[str]) -> Iterator[Pair]:
+    """Reads 'seq1<TAB>seq2' or 'id<TAB>seq1<TAB>seq2' lines, blank and '#' lines are skipped."""
+    number = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.startswith('#'):
+            continue
+        number += 1
+        fields = line.split('\t')
+        if len(fields) == 2:
+            yield str(number), fields[0].strip(), fields[1].strip()
+        elif len(fields) == 3:
+            yield fields[0], fields[1].strip(), fields[2].strip()
+        else:
+            raise ValueError("line %d: expected 2 or 3 tab-separated fields, got %d" % (number, len(fields)))
+
+
+def read_fasta(lines: Iterable[str]) -> Iterator[Pair]:
+    """Reads FASTA records and pairs them up in order: records 1 and 2, 3 and 4, ..."""
+    def records():
+        name, parts = None, []
+        for line in lines:
+            line = line.strip()
+            if line.startswith('>'):
+                if name is not None:
+                    yield name, ''.join(parts)
+                name, parts = line[1:].split(maxsplit=1)[0] if line[1:].strip() else '', []
+            elif line and name is not None:
+                parts.append(line)
+        if name is not None:
+            yield name, ''.join(parts)
+
+    iterator = records()
+    for first in iterator:
+        second = next(iterator, None)
+        if second is None:
+            raise ValueError("record %r has no partner, FASTA input needs an even number of records" % first[0])
+        yield '%s/%s' % (first[0], second[0]), first[1], second[1]
+
+
+def read_pairs(stream: IO[str], input_format: str = 'auto') -> Iterator[Pair]:
+    """Reads pairs from a stream, 'auto' picks FASTA when the first non-blank line starts with '>'."""
+    lines = iter(stream)
+    if input_format == 'auto':
+        head = []
+        for line in lines:
+            head.append(line)
+            if line.strip():
+                break
+        input_format = 'fasta' if head and head[-1].lstrip().startswith('>') else 'tsv'
+        lines = chain(head, lines)
+    return read_fasta(lines) if input_format == 'fasta' else read_tsv(lines)
+
+
+def cigar(aln1: str, aln2: str) -> str:
+    """Extended CIGAR of an alignment with seq1 as the reference, e.g. 'AC-GT'/'ACAGT' -> '2=1I2='."""
+    ops = ['I' if a == '-' else 'D' if b == '-' else '=' if a == b else 'X' for a, b in zip(aln1, aln2)]
+    runs = []
+    for op in ops:
+        if runs and runs[-1][1] == op:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, op])
+    return ''.join('%d%s' % (count, op) for count, op in runs)
+
+
+def format_result(pair_id: str, score: int, aln1: str, aln2: str, output_format: str = 'jsonl') -> str:
+    """Formats one result as a JSON object or as 'id<TAB>score<TAB>cigar'."""
+    if output_format == 'cigar':
+        return '%s\t%s\t%s' % (pair_id, score, cigar(aln1, aln2))
+    return json.dumps({'id': pair_id, 'score': score, 'aln1': aln1, 'aln2': aln2})
+
+
+def align_chunk(chunk: List[Pair], match: int = 5, mismatch: int = -4, gap: int = -10,
+                output_format: str = 'jsonl') -> List[str]:
+    """Aligns a chunk of pairs and returns the formatted output lines, runs in the workers."""
+    score = partial(score_fun, match_score=match, mismatch_score=mismatch)
+    results = align_batch([(seq1, seq2) for _, seq1, seq2 in chunk], score=score, gap_penalty=gap)
+    return [format_result(pair_id, *result, output_format=output_format)
+            for (pair_id, _, _), result in zip(chunk, results)]
+
+
+class _Inline:
+    """Executor stand-in that runs every chunk in the calling process."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+def run_batch(source: IO[str],
+              output: IO[str],
+              match: int = 5,
+              mismatch: int = -4,
+              gap: int = -10,
+              workers: int = 1,
+              chunk_size: int = 256,
+              max_in_flight: int = None,
+              ordered: bool = True,
+              input_format: str = 'auto',
+              output_format: str = 'jsonl',
+              progress: IO[str] = None,
+              progress_interval: float = 1.0) -> int:
+    """Aligns every pair of a stream and writes one result line per pair.
+
+    Args:
+        source: The input stream of TSV lines or FASTA records
+        output: The stream to write results to, flushed after every chunk
+        match: The match score, e.g. 5
+        mismatch: The mismatch score, e.g. -4
+        gap: The gap penalty value, e.g. -10
+        workers: The number of worker processes, 1 aligns in the calling process
+        chunk_size: The number of pairs sent to a worker at once
+        max_in_flight: The largest number of chunks queued or running, defaults to 2 * workers
+        ordered: Write results in input order; otherwise as soon as their chunk is done
+        input_format: 'auto', 'tsv' or 'fasta'
+        output_format: 'jsonl' or 'cigar'
+        progress: The stream to report progress and throughput to, e.g. sys.stderr
+        progress_interval: Seconds between two progress reports
+
+    Returns:
+        count: The number of aligned pairs
+    """
+    max_in_flight = max_in_flight or 2 * workers
+    pairs = read_pairs(source, input_format)
+    chunks = iter(lambda: list(islice(pairs, chunk_size)), [])
+    executor = ProcessPoolExecutor(workers) if workers > 1 else _Inline()
+    in_flight = deque()
+    count, started, reported = 0, time.perf_counter(), time.perf_counter()
+
+    def emit(future):
+        nonlocal count, reported
+        lines = future.result()
+        if lines:
+            output.write('\n'.join(lines) + '\n')
+            output.flush()
+        count += len(lines)
+        now = time.perf_counter()
+        if progress is not None and now - reported >= progress_interval:
+            report(now)
+            reported = now
+
+    def report(now):
+        elapsed = max(now - started, 1e-9)
+        print("aligned %d pairs in %.1f s, %.0f pairs/s" % (count, elapsed, count / elapsed), file=progress)
+        progress.flush()
+
+    def drain(limit):
+        # Write whatever is ready, then block until fewer than `limit` chunks are in flight
+        while in_flight:
+            if ordered:
+                if len(in_flight) < limit and not in_flight[0].done():
+                    break
+                emit(in_flight.popleft())
+            else:
+                done = {future for future in in_flight if future.done()}
+                if not done:
+                    if len(in_flight) < limit:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in [future for future in in_flight if future in done]:
+                    in_flight.remove(future)
+                    emit(future)
+
+    try:
+        for chunk in chunks:
+            drain(max_in_flight)
+            in_flight.append(executor.submit(align_chunk, chunk, match, mismatch, gap, output_format))
+        drain(1)
+    finally:
+        executor.shutdown(cancel_futures=True)
+    if progress is not None:
+        report(time.perf_counter())
+    return count
+
+
+def main(args) -> int:
+    """Runs batch mode for the parsed command line of nw.main()."""
+    source = sys.stdin if args.batch == '-' else open(args.batch)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        return run_batch(source, output,
+                         match=5 if args.match is None else args.match,
+                         mismatch=-4 if args.mismatch is None else args.mismatch,
+                         gap=args.gap,
+                         workers=args.workers,
+                         chunk_size=args.chunk_size,
+                         max_in_flight=args.max_in_flight,
+                         ordered=not args.unordered,
+                         input_format=args.input_format,
+                         output_format=args.output_format,
+                         progress=sys.stderr if args.progress else None)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,177 @@
+"""Top-K search of one query against many targets that share prefixes.
+
+The targets are stored in a trie. A depth-first walk computes one DP column
+per trie node, D(0..n, j) of the query against the node's prefix, with the
+column step of `IncrementalAligner`; the column is shared by every target
+below the node, so a prefix common to a thousand amplicon variants is aligned
+once instead of a thousand times. A target's score is read off the column of
+the node it ends at and equals needleman_wunsch(query, target)[0].
+
+Subtrees whose best reachable score is below the current K-th best score are
+skipped. From a node at depth j, a target with r characters left can at best
+finish with max_i D(i,j) + U(n-i, r), where U(a, r) is the best score of any
+alignment of a query characters against r target characters: either
+min(a, r) pairs at the largest substitution score and |a - r| gaps, or only
+gaps. U is piecewise linear in r with its break at r = a, so over the
+remaining lengths [rmin, rmax] of the subtree it is largest at rmin, rmax or
+clip(a, rmin, rmax). A check costs about as much as a DP column, so it is made
+at every branching node but only every few nodes along unbranched chains.
+"""
+from heapq import heappush, heapreplace
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .incremental import IncrementalAligner
+from .instrument import phase
+from .nw import score_fun
+
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+
+class _Node:
+    __slots__ = ('children', 'ends', 'min_length', 'max_length')
+
+    def __init__(self):
+        self.children: Dict[str, _Node] = {}
+        # Indices of the targets that end here
+        self.ends: List[int] = []
+        # Shortest and longest target in the subtree
+        self.min_length, self.max_length = None, None
+
+    def add(self, length: int):
+        self.min_length = length if self.min_length is None else min(self.min_length, length)
+        self.max_length = length if self.max_length is None else max(self.max_length, length)
+
+
+class TargetTrie:
+    """A trie of target sequences for top-K alignment searches.
+
+    Args:
+        targets: The sequences to search, e.g. ['ACGTAC', 'ACGTTT', 'AGG']
+    """
+
+    def __init__(self, targets: Sequence[str]):
+        self.targets = list(targets)
+        self.root = _Node()
+        self.size = 1
+        for index, target in enumerate(self.targets):
+            node = self.root
+            node.add(len(target))
+            for char in target:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                    self.size += 1
+                node = child
+                node.add(len(target))
+            node.ends.append(index)
+        self.alphabet = ''.join(sorted(set().union(*map(set, self.targets)))) if self.targets else ''
+
+    def search(self,
+               query: str,
+               k: int = 10,
+               score: Callable[[str, str], int] = score_fun,
+               gap_penalty: int = -10,
+               prune: bool = True,
+               check_every: int = 8) -> List[Tuple[int, int]]:
+        """Finds the K targets with the best global alignment score against the query.
+
+        Args:
+            query: The query sequence, e.g. 'ACGTAC'
+            k: The number of results, e.g. 10
+            score: The scoring function, e.g. score_fun('A', 'A') returns 5
+            gap_penalty: The gap penalty value, e.g. -10
+            prune: Skip subtrees that cannot reach the top K, turn off to compare
+            check_every: Check the bound at every branching node but only every check_every-th
+                node of an unbranched chain, as a check costs about as much as a DP column
+
+        Returns:
+            hits: (score, target index) of the K best targets, best first; equal scores
+                are ordered by index, the same as sorting the needleman_wunsch scores of all targets
+        """
+        if k < 1:
+            raise ValueError("k must be positive, got %d" % k)
+        with phase(PROFILER, 'trie_search'):
+            return self._search(query, k, score, gap_penalty, prune, max(1, check_every))
+
+    def _search(self, query, k, score, gap_penalty, prune, check_every):
+        n, g = len(query), gap_penalty
+        aligner = IncrementalAligner(query, score, gap_penalty)
+        best_pair = max((score(a, b) for a in set(query) for b in self.alphabet), default=0)
+        left = n - np.arange(n + 1, dtype=np.int64)
+
+        if g <= 0 and best_pair >= 2 * g:
+            # The usual case: U(a, r) = min(a, r) * best_pair + |a - r| * g is concave in r, largest at
+            # r = clip(a, rmin, rmax). As a = n - i falls with i, that splits the rows into three runs
+            # with fixed weights: r = rmax above, r = a in between and r = rmin below.
+            above, between, below = left * g, left * best_pair, left * (best_pair - g)
+
+            def bound(node, j, column):
+                # Rows i < first take r = rmax, first <= i <= last r = a, i > last r = rmin; row 0 is j * g
+                values = column[1]
+                rmin, rmax = node.min_length - j, node.max_length - j
+                first, last = max(n - rmax, 0), n - rmin
+                best = j * g + (above[0] + rmax * (best_pair - g) if first > 0 else
+                                between[0] if last >= 0 else below[0] + rmin * g)
+                if first > 1:
+                    best = max(best, (values[:first - 1] + above[1:first]).max().item() + rmax * (best_pair - g))
+                start = max(first, 1)
+                if start <= last:
+                    best = max(best, (values[start - 1:last] + between[start:last + 1]).max().item())
+                start = max(last + 1, 1)
+                if start <= n:
+                    best = max(best, (values[start - 1:] + below[start:]).max().item() + rmin * g)
+                return best
+        else:
+            def bound(node, j, column):
+                # Upper bound of the final score of every target below node, see the module docstring
+                reached = np.concatenate(([j * g], column[1]))
+                rmin, rmax = node.min_length - j, node.max_length - j
+                best = None
+                for r in (rmin, rmax, np.clip(left, rmin, rmax)):
+                    pairs = np.minimum(left, r)
+                    reach = np.maximum(pairs * best_pair + (left + r - 2 * pairs) * g, (left + r) * g)
+                    best = reach if best is None else np.maximum(best, reach)
+                return (reached + best).max().item()
+
+        # Min-heap of the K best (score, -index), its top is the weakest hit
+        hits = []
+        columns = pruned = 0
+        stack = [(self.root, 0, aligner.column)]
+        while stack:
+            node, j, column = stack.pop()
+            if node.ends:
+                final = int(column[1][-1]) if n else j * g
+                for index in node.ends:
+                    if len(hits) < k:
+                        heappush(hits, (final, -index))
+                    elif (final, -index) > hits[0]:
+                        heapreplace(hits, (final, -index))
+            if not node.children:
+                continue
+            if prune and len(hits) == k and (len(node.children) > 1 or j % check_every == 0) \
+                    and bound(node, j, column) < hits[0][0]:
+                pruned += 1
+                continue
+            children = [(char, child, aligner.next_column(column, j + 1, char))
+                        for char, child in node.children.items()]
+            columns += len(children)
+            # The child closest to the query so far is visited first, it raises the threshold soonest
+            children.sort(key=lambda item: (item[2][1].max() if n else 0, item[0]))
+            stack.extend((child, j + 1, child_column) for _, child, child_column in children)
+        if PROFILER is not None:
+            PROFILER.count('trie_columns', columns)
+            PROFILER.count('trie_pruned', pruned)
+            PROFILER.count('cells', columns * n)
+        return sorted(((final, -negative) for final, negative in hits), key=lambda hit: (-hit[0], hit[1]))
+
+
+def search(query: str,
+           targets: Sequence[str],
+           k: int = 10,
+           score: Callable[[str, str], int] = score_fun,
+           gap_penalty: int = -10) -> List[Tuple[int, int]]:
+    """Builds a trie of the targets and returns the K best (score, target index) for the query."""
+    return TargetTrie(targets).search(query, k, score, gap_penalty)
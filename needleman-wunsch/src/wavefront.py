@@ -0,0 +1,259 @@
+"""Parallel fill of one large full-matrix alignment, tile by tile along anti-diagonals.
+
+The DP matrix is cut into tile x tile blocks. A tile only depends on the tiles
+above, to the left and diagonally above it, so all tiles of one anti-diagonal
+of tiles are independent: they run together on a process pool, and the next
+anti-diagonal starts when the last of them is done.
+
+The whole matrix - three of them for affine gaps - lives in shared memory,
+like the buffers of `pairwise`. A worker reads its tile's boundary row and
+column, which the tiles before it wrote, fills the tile with `kernels.nw_tile`
+or `kernels.affine_tile` and writes it back in place, so tiles never travel
+through pipes. The linear matrix holds row-relative scores R(i,j) = D(i,j) -
+i*gap in the narrowest integer type that fits them - int32 rather than int64
+for anything up to millions of columns - which at least halves the shared
+memory. The traceback then runs in the parent on the shared matrix with the
+tie-breaking of `needleman_wunsch` and `needleman_wunsch_affine`, giving the
+same alignments.
+"""
+from multiprocessing import shared_memory
+from typing import Callable, List, Tuple
+import multiprocessing
+import os
+
+import numpy as np
+
+from .instrument import phase
+from .kernels import affine_tile, build_alphabet, encode, linear_bound, nw_tile, score_dtype, substitution_table
+from .nw import GLOBAL_MINIMUM, score_fun
+
+# Instrumentation hook, e.g. an instrument.Profiler; None disables it
+PROFILER = None
+
+
+# Worker-side view of the shared buffers, filled by _attach()
+_STATE = {}
+
+
+def _attach(names, shapes, kind, params, tile):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    a, b, table, *matrices = (np.ndarray(shape, dtype=dtype, buffer=buffer.buf)
+                              for buffer, (shape, dtype) in zip(buffers, shapes))
+    _STATE.update(buffers=buffers, a=a, b=b, table=table, matrices=matrices, kind=kind, params=params, tile=tile)
+
+
+def _detach():
+    buffers = _STATE.pop('buffers', [])
+    _STATE.clear()
+    for buffer in buffers:
+        buffer.close()
+
+
+def _run_tile(task):
+    ti, tj = task
+    a, b, table, matrices, t = _STATE['a'], _STATE['b'], _STATE['table'], _STATE['matrices'], _STATE['tile']
+    i0, j0 = ti * t, tj * t
+    i1, j1 = min(i0 + t, len(a)), min(j0 + t, len(b))
+    tops = [matrix[i0, j0:j1 + 1] for matrix in matrices]
+    lefts = [matrix[i0 + 1:i1 + 1, j0] for matrix in matrices]
+    if _STATE['kind'] == 'nw':
+        tiles = [nw_tile(a[i0:i1], b[j0:j1], table, *_STATE['params'], tops[0], lefts[0])]
+    else:
+        tiles = affine_tile(a[i0:i1], b[j0:j1], table, *_STATE['params'], tops, lefts)
+    for matrix, values in zip(matrices, tiles):
+        matrix[i0 + 1:i1 + 1, j0 + 1:j1 + 1] = values
+    return task
+
+
+def plan_wavefront(n: int, m: int, tile: int) -> List[List[Tuple[int, int]]]:
+    """The tiles of an n x m matrix grouped by anti-diagonal, e.g. [[(0, 0)], [(0, 1), (1, 0)], ...]."""
+    rows, cols = -(-n // tile), -(-m // tile)
+    if rows == 0 or cols == 0:
+        return []
+    return [[(ti, d - ti) for ti in range(max(0, d - cols + 1), min(d, rows - 1) + 1)]
+            for d in range(rows + cols - 1)]
+
+
+def _fill(kind, seq1, seq2, score, params, workers, tile, traceback):
+    """Fills the shared matrices of the recurrence `kind` and runs traceback(matrices, a, b, table) on them."""
+    if tile < 1:
+        raise ValueError("tile must be positive, got %d" % tile)
+    workers = workers or os.cpu_count() or 1
+    n, m = len(seq1), len(seq2)
+    alphabet = build_alphabet((seq1, seq2))
+    table = substitution_table(score, alphabet).astype(np.int64)
+    arrays = [encode(seq1, alphabet), encode(seq2, alphabet), table]
+    if kind == 'nw':
+        matrix = (score_dtype(linear_bound(m, table, *params)), (n + 1, m + 1))
+    else:
+        matrix = (np.dtype(np.float64), (n + 1, m + 1))
+    shapes = [(array.shape, array.dtype) for array in arrays] + [(matrix[1], matrix[0])] * (1 if kind == 'nw' else 3)
+    waves = plan_wavefront(n, m, tile)
+    blocks, views = [], []
+    try:
+        for shape, dtype in shapes:
+            blocks.append(shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize)))
+        views = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block, (shape, dtype) in zip(blocks, shapes)]
+        for view, array in zip(views, arrays):
+            view[...] = array
+        _seed(kind, views[3:], params)
+        names = [block.name for block in blocks]
+        widest = max(map(len, waves), default=0)
+        pool = None
+        with phase(PROFILER, 'fill'):
+            try:
+                if workers == 1 or widest <= 1:
+                    _attach(names, shapes, kind, params, tile)
+                    for wave in waves:
+                        for task in wave:
+                            _run_tile(task)
+                else:
+                    pool = multiprocessing.Pool(min(workers, widest), initializer=_attach,
+                                                initargs=(names, shapes, kind, params, tile))
+                    for wave in waves:
+                        pool.map(_run_tile, wave, chunksize=1)
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+                _detach()
+        if PROFILER is not None:
+            PROFILER.count('tiles', sum(map(len, waves)))
+            PROFILER.count('cells', n * m)
+            PROFILER.maximum('wavefront_width', widest)
+        with phase(PROFILER, 'traceback'):
+            result = traceback(views[3:], *views[:3])
+        return result
+    finally:
+        # The views must go before the buffers can be closed
+        views = None
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _seed(kind, matrices, params):
+    # Row 0 and column 0, the boundary conditions of needleman_wunsch and needleman_wunsch_affine
+    n, m = matrices[0].shape
+    if kind == 'nw':
+        gap_penalty, = params
+        # In row-relative scores the first column is 0 throughout
+        matrices[0][0, :] = np.arange(m) * gap_penalty
+        matrices[0][:, 0] = 0
+        return
+    gap_open, gap_extend = params
+    match, insertion, deletion = matrices
+    match[0, :], insertion[0, :], deletion[0, :] = -np.inf, -np.inf, gap_open + (np.arange(m) - 1) * gap_extend
+    match[:, 0], insertion[:, 0], deletion[:, 0] = -np.inf, gap_open + (np.arange(n) - 1) * gap_extend, -np.inf
+    match[0, 0] = 0
+
+
+def needleman_wunsch_wavefront(seq1: str,
+                               seq2: str,
+                               score: Callable[[str, str], int] = score_fun,
+                               gap_penalty: int = -10,
+                               workers: int = None,
+                               tile: int = 256) -> Tuple[int, str, str]:
+    """Aligns two sequences with the matrix filled in parallel, the result equals needleman_wunsch(...).
+
+    Args:
+        seq1: The first sequence, e.g. 'ACCGT'
+        seq2: The second sequence, e.g. 'ACGT'
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_penalty: The gap penalty value, e.g. -10
+        workers: The number of worker processes, defaults to os.cpu_count(); 1 runs in-process
+        tile: The tile side, e.g. 256; smaller tiles keep more workers busy at the corners
+
+    Returns:
+        score: The optimal alignment score, e.g. 10
+        aligned_seq1: The first aligned sequence, e.g. 'ACCGT'
+        aligned_seq2: The second aligned sequence, e.g. 'AC-GT'
+    """
+    def traceback(matrices, a, b, table):
+        matrix, g = matrices[0], gap_penalty
+        i, j = len(seq1), len(seq2)
+        aligned1, aligned2 = [], []
+        while i != 0 or j != 0:
+            # The moves of needleman_wunsch less i*gap, all three compared in row-relative scores
+            diag = int(matrix[i - 1, j - 1]) + table[a[i - 1], b[j - 1]] - g if i >= 1 and j >= 1 else GLOBAL_MINIMUM
+            up = int(matrix[i - 1, j]) if i >= 1 else GLOBAL_MINIMUM
+            left = int(matrix[i, j - 1]) + g if j >= 1 else GLOBAL_MINIMUM
+            if diag >= up and diag >= left:
+                aligned1.append(seq1[i - 1])
+                aligned2.append(seq2[j - 1])
+                i, j = i - 1, j - 1
+            elif up >= left:
+                aligned1.append(seq1[i - 1])
+                aligned2.append('-')
+                i -= 1
+            else:
+                aligned1.append('-')
+                aligned2.append(seq2[j - 1])
+                j -= 1
+        return int(matrix[-1, -1]) + len(seq1) * g, ''.join(reversed(aligned1)), ''.join(reversed(aligned2))
+
+    return _fill('nw', seq1, seq2, score, (gap_penalty,), workers, tile, traceback)
+
+
+def needleman_wunsch_affine_wavefront(seq1: str,
+                                      seq2: str,
+                                      score: Callable[[str, str], int] = score_fun,
+                                      gap_open: int = -10,
+                                      gap_extend: int = -1,
+                                      workers: int = None,
+                                      tile: int = 256) -> Tuple[str, str, int]:
+    """Affine-gap alignment with the three matrices filled in parallel, equal to needleman_wunsch_affine(...).
+
+    Args:
+        seq1: The first sequence, e.g. 'ACGT'
+        seq2: The second sequence, e.g. 'TAGT'
+        score: The scoring function, e.g. score_fun('A', 'A') returns 5
+        gap_open: The gap open penalty, e.g. -10
+        gap_extend: The gap extend penalty, e.g. -1
+        workers: The number of worker processes, defaults to os.cpu_count(); 1 runs in-process
+        tile: The tile side, e.g. 256
+
+    Returns:
+        aln1: The first aligned sequence
+        aln2: The second aligned sequence
+        score: The score of the alignment
+    """
+    def traceback(matrices, a, b, table):
+        match, insertion, deletion = matrices
+        i, j = len(seq1), len(seq2)
+        best = max(match[i, j], insertion[i, j], deletion[i, j])
+        current = 'match' if best == match[i, j] else 'insertion' if best == insertion[i, j] else 'deletion'
+        aligned1, aligned2 = [], []
+        while i > 0 or j > 0:
+            # The same moves as needleman_wunsch_affine, including its wrap-around at i or j == 0
+            if current == 'match':
+                s = table[a[i - 1], b[j - 1]]
+                current = 'match' if match[i, j] == match[i - 1, j - 1] + s else \
+                    'insertion' if match[i, j] == insertion[i - 1, j - 1] + s else 'deletion'
+                aligned1.append(seq1[i - 1])
+                aligned2.append(seq2[j - 1])
+                i, j = i - 1, j - 1
+            elif current == 'insertion':
+                current = 'insertion' if j <= 0 or insertion[i, j] == insertion[i, j - 1] + gap_extend else 'match'
+                if j > 0:
+                    aligned1.append('-')
+                    aligned2.append(seq2[j - 1])
+                    j -= 1
+                else:
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append('-')
+                    i -= 1
+            else:
+                current = 'deletion' if i <= 0 or deletion[i, j] == deletion[i - 1, j] + gap_extend else 'match'
+                if i > 0:
+                    aligned1.append(seq1[i - 1])
+                    aligned2.append('-')
+                    i -= 1
+                else:
+                    aligned1.append('-')
+                    aligned2.append(seq2[j - 1])
+                    j -= 1
+        best = float(best)
+        return ''.join(reversed(aligned1)), ''.join(reversed(aligned2)), int(best) if np.isfinite(best) else best
+
+    return _fill('affine', seq1, seq2, score, (gap_open, gap_extend), workers, tile, traceback)
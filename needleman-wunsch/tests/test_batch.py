@@ -0,0 +1,45 @@
+import src.batch as batch
+import src.nw as align
+
+PAIRS = [("ACGT", "ACGT"), ("ACG", "ACGT"), ("ACGT", "ACG"), ("ACAGT", "ACGT"), ("ACGT", "ACAGT"),
+         ("CAGT", "ACAGT"), ("ACAGT", "CAGT"), ("ACGT", "A"), ("ACGT", ""), ("A", "ACGT"), ("", "ACGT"),
+         ("", ""), ("TACGT", "ATGT"), ("TACGT", "ACTGT"), ("ACGT", "TAGTA"), ("TAGTA", "ACGT"),
+         ("GGAGCCAAGGTGAAGTTGTAGCAGTGTGTCC", "GACTTGTGGAACCTCTGTCCTCCGAGCTCTC"),
+         ("AAAAAAATTTTTTT", "TTTTTTTAAAAAAA"),
+         ('ACTGGTCAACTGGTCAACTGGTCAACTGGTCA', 'TACTGGTCAACTGGTCAACTGTCAACTGGTCA')]
+
+
+def test_batch_1():
+    """Same scores and alignments as needleman_wunsch, pairs of very different lengths in one batch"""
+    assert batch.align_batch(PAIRS) == [align.needleman_wunsch(seq1, seq2) for seq1, seq2 in PAIRS]
+
+
+def test_batch_2():
+    """Tie-breaking follows needleman_wunsch for other gap penalties, see test_nw_15 .. test_nw_18"""
+    for gap_penalty in (-5, 0, 10):
+        expected = [align.needleman_wunsch(seq1, seq2, gap_penalty=gap_penalty) for seq1, seq2 in PAIRS]
+        assert batch.align_batch(PAIRS, gap_penalty=gap_penalty) == expected
+
+
+def test_batch_3():
+    """Custom scoring function and small batches"""
+    def score(x, y):
+        return 1 if x == y else -1
+    expected = [align.needleman_wunsch(seq1, seq2, score=score, gap_penalty=-2) for seq1, seq2 in PAIRS]
+    assert batch.align_batch(PAIRS, score=score, gap_penalty=-2, batch_size=3) == expected
+
+
+def test_batch_4():
+    """Batches respect both the pair and the cell limits and cover every pair once"""
+    batches = list(batch.plan_batches(PAIRS, batch_size=4, max_cells=200))
+    assert sorted(k for group in batches for k in group) == list(range(len(PAIRS)))
+    for group in batches:
+        rows = max(len(PAIRS[k][0]) for k in group) + 1
+        columns = max(len(PAIRS[k][1]) for k in group) + 1
+        assert len(group) <= 4
+        assert len(group) == 1 or len(group) * rows * columns <= 200
+
+
+def test_batch_5():
+    """No pairs, no results"""
+    assert batch.align_batch([]) == []
@@ -0,0 +1,101 @@
+from functools import partial
+import importlib.util
+
+import src.cache as cache
+import src.nw as align
+import src.service as service
+
+PAIRS = [("ACGT", "ACGT"), ("ACG", "ACGT"), ("TACGT", "ATGT"), ("", "ACGT"), ("", ""),
+         ("GGAGCCAAGGTGAAGTTGTAGCAGTGTGTCC", "GACTTGTGGAACCTCTGTCCTCCGAGCTCTC")]
+
+
+def test_cache_1():
+    """Scoring functions are keyed by their substitution table, not by identity"""
+    key = cache.alignment_key('nw', 'ACGT', 'AGT', score=align.score_fun, gap_penalty=-10)
+    same = cache.alignment_key('nw', 'ACGT', 'AGT', score=lambda a, b: 5 if a == b else -4, gap_penalty=-10)
+    assert key == same
+    assert key != cache.alignment_key('nw', 'ACGT', 'AGT', score=partial(align.score_fun, match_score=1),
+                                      gap_penalty=-10)
+    assert key != cache.alignment_key('nw', 'ACGT', 'AGT', score=align.score_fun, gap_penalty=-5)
+    assert key != cache.alignment_key('hirschberg', 'ACGT', 'AGT', score=align.score_fun, gap_penalty=-10)
+    assert key != cache.alignment_key('nw', 'AGT', 'ACGT', score=align.score_fun, gap_penalty=-10)
+    assert key != cache.alignment_key('nw', 'ACG', 'TAGT', score=align.score_fun, gap_penalty=-10)
+
+
+def test_cache_2():
+    """Cached results are the ones of needleman_wunsch, repeats are hits"""
+    results = cache.AlignmentCache()
+    nw = cache.cached(align.needleman_wunsch, results)
+    assert [nw(seq1, seq2) for seq1, seq2 in PAIRS] == [align.needleman_wunsch(*pair) for pair in PAIRS]
+    assert [nw(seq1, seq2, align.score_fun, -10) for seq1, seq2 in PAIRS] == \
+        [align.needleman_wunsch(*pair) for pair in PAIRS]
+    assert results.stats['misses'] == len(PAIRS) and results.stats['hits'] == len(PAIRS)
+    assert nw("ACG", "ACGT", gap_penalty=-2) == align.needleman_wunsch("ACG", "ACGT", gap_penalty=-2)
+    assert results.stats['misses'] == len(PAIRS) + 1
+    assert results.hit_rate() == len(PAIRS) / (2 * len(PAIRS) + 1)
+
+
+def test_cache_3():
+    """The memory tier evicts the least recently used entry"""
+    results = cache.AlignmentCache(max_entries=2)
+    results.put('a', (1, 'A', 'A'))
+    results.put('b', (2, 'B', 'B'))
+    assert results.get('a') == (1, 'A', 'A')
+    results.put('c', (3, 'C', 'C'))
+    assert results.get('b') is None
+    assert results.get('a') == (1, 'A', 'A') and results.get('c') == (3, 'C', 'C')
+    assert len(results) == 2 and results.stats['evictions'] == 1
+
+
+def test_cache_4(tmp_path):
+    """The disk tier keeps results across instances and refills the memory tier"""
+    path = str(tmp_path / 'results.sqlite')
+    first = cache.AlignmentCache(path=path)
+    nw = cache.cached(align.needleman_wunsch, first)
+    expected = [nw(seq1, seq2) for seq1, seq2 in PAIRS]
+    first.close()
+    second = cache.AlignmentCache(path=path)
+    nw = cache.cached(align.needleman_wunsch, second)
+    assert [nw(seq1, seq2) for seq1, seq2 in PAIRS] == expected
+    assert second.stats['disk_hits'] == len(PAIRS) and second.stats['misses'] == 0
+    assert [nw(seq1, seq2) for seq1, seq2 in PAIRS] == expected
+    assert second.stats['memory_hits'] == len(PAIRS)
+    second.close()
+
+
+def test_cache_5(tmp_path):
+    """The disk tier stays below its size limit by dropping the least recently used entries"""
+    path = str(tmp_path / 'results.sqlite')
+    results = cache.AlignmentCache(max_entries=1, path=path, max_disk_bytes=400)
+    for k in range(50):
+        results.put(str(k), (k, 'ACGT' * 4, 'ACGT' * 4))
+    assert 0 < results.stats['disk_bytes'] <= 400
+    assert results.stats['disk_evictions'] > 0
+    assert results.get('0') is None and results.get('49') == (49, 'ACGT' * 4, 'ACGT' * 4)
+    results.close()
+    assert cache.AlignmentCache(path=path).stats['disk_bytes'] == results.stats['disk_bytes']
+
+
+def test_cache_6():
+    """Aligners with the same name and parameters but from other modules get their own entries"""
+    def needleman_wunsch(seq1, seq2, score=align.score_fun, gap_penalty=-10):
+        return align.needleman_wunsch(seq2, seq1, score, gap_penalty)
+
+    results = cache.AlignmentCache()
+    nw, swapped = cache.cached(align.needleman_wunsch, results), cache.cached(needleman_wunsch, results)
+    assert nw("ACG", "TACGT") == align.needleman_wunsch("ACG", "TACGT")
+    assert swapped("ACG", "TACGT") == align.needleman_wunsch("TACGT", "ACG")
+    assert results.stats['hits'] == 0
+    # The alignment service shares the entries of cached(needleman_wunsch)
+    assert results.get(service.request_key("ACG", "TACGT", 5, -4, -10)) == align.needleman_wunsch("ACG", "TACGT")
+
+
+def test_cache_7():
+    """The module of needleman_wunsch imported under another package path shares its entries"""
+    spec = importlib.util.spec_from_file_location('bioalign.nw.nw', align.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    results = cache.AlignmentCache()
+    cache.cached(align.needleman_wunsch, results)("ACG", "TACGT")
+    assert cache.cached(module.needleman_wunsch, results)("ACG", "TACGT") == align.needleman_wunsch("ACG", "TACGT")
+    assert results.stats['hits'] == 1
@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+import pytest
+
+import src.four_russians as four_russians
+import src.instrument as instrument
+import src.nw as align
+
+
+def levenshtein(a, b):
+    # The plain row DP, as in levenstein-distance/main.cpp
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            previous, row[j] = row[j], min(previous + (x != y), row[j] + 1, row[j - 1] + 1)
+    return row[-1]
+
+
+def unit(x, y):
+    return 0 if x == y else -1
+
+
+def random_pairs(count, alphabets=('A', 'AC', 'ACGT', 'ACGTNRYKM')):
+    # Lengths around the block size and its multiples, alphabets of both mask lookups
+    rng = random.Random(0)
+    for _ in range(count):
+        alphabet = rng.choice(alphabets)
+        yield (''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 20))),
+               ''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 20))))
+
+
+def test_four_russians_1(tmp_path):
+    """Edit distances equal the row DP for every block size, including empty sequences"""
+    for seq1, seq2 in random_pairs(300):
+        for block in (1, 2, 3):
+            assert four_russians.edit_distance(seq1, seq2, block, tmp_path) == levenshtein(seq1, seq2)
+    assert four_russians.edit_distance("", "", cache_dir=tmp_path) == 0
+    assert four_russians.edit_distance("kitten", "sitting", cache_dir=tmp_path) == 3
+
+
+def test_four_russians_2(tmp_path):
+    """Scores and tracebacks equal needleman_wunsch for unit-cost schemes, ties broken the same way"""
+    schemes = [(unit, -1), (lambda x, y: 2 if x == y else -1, -2), (lambda x, y: 4 if x == y else 1, -1)]
+    for index, (seq1, seq2) in enumerate(random_pairs(300)):
+        score, gap_penalty = schemes[index % len(schemes)]
+        expected = align.needleman_wunsch(seq1, seq2, score, gap_penalty)
+        assert four_russians.needleman_wunsch_4r(seq1, seq2, score, gap_penalty, index % 3 + 1, tmp_path) == expected
+        assert four_russians.four_russians_score(seq1, seq2, score, gap_penalty, cache_dir=tmp_path) == expected[0]
+
+
+def test_four_russians_3(tmp_path):
+    """Schemes that are not an edit distance in disguise are rejected, the score_fun defaults included"""
+    with pytest.raises(ValueError):
+        four_russians.needleman_wunsch_4r("ACGT", "AGT", cache_dir=tmp_path)
+    with pytest.raises(ValueError):
+        four_russians.four_russians_score("ACGT", "AGT", lambda x, y: 1 if x == y else (-1 if x < y else -2), -1)
+    with pytest.raises(ValueError):
+        four_russians.edit_distance("ACGT", "AGT", block=4)
+
+
+def test_four_russians_4(tmp_path, monkeypatch):
+    """The block table is saved once and loaded from disk afterwards"""
+    monkeypatch.setattr(four_russians, '_TABLES', {})
+    table = four_russians.block_table(2, tmp_path)
+    path = tmp_path / 'four_russians_t2.npy'
+    # Every output offset stays in {-1, 0, 1}, i.e. a valid index of an offset vector
+    assert path.exists() and table.shape == (2, 9 ** 2 * 2 ** 4) and table.max() < 9
+    assert np.array_equal(np.load(path), table)
+    monkeypatch.setattr(four_russians, '_TABLES', {})
+    monkeypatch.setattr(four_russians, '_build_table', None)
+    assert np.array_equal(four_russians.block_table(2, tmp_path), table)
+
+
+def test_four_russians_5(tmp_path):
+    """Long sequences: one lookup per block and the profiler counters"""
+    rng = random.Random(1)
+    seq1 = ''.join(rng.choice('ACGT') for _ in range(300))
+    seq2 = ''.join(rng.choice('ACGT') for _ in range(250))
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, four_russians):
+        result = four_russians.needleman_wunsch_4r(seq1, seq2, unit, -1, cache_dir=tmp_path)
+    assert result == align.needleman_wunsch(seq1, seq2, unit, -1)
+    assert -result[0] == levenshtein(seq1, seq2)
+    assert profiler.counters['blocks'] == 100 * 84
+    assert 0 < profiler.counters['blocks_recomputed'] <= 100 + 84
+    assert set(profiler.phases) >= {'fill', 'traceback'}
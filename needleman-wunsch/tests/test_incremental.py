@@ -0,0 +1,67 @@
+import pytest
+
+import src.incremental as incremental
+import src.nw as align
+
+PAIRS = [("ACGT", "ACGT"), ("ACG", "ACGT"), ("ACGT", "ACG"), ("ACAGT", "ACGT"), ("TACGT", "ATGT"),
+         ("ACGT", ""), ("", "ACGT"), ("", ""), ("AAAAAAATTTTTTT", "TTTTTTTAAAAAAA"),
+         ("GGAGCCAAGGTGAAGTTGTAGCAGTGTGTCC", "GACTTGTGGAACCTCTGTCCTCCGAGCTCTC")]
+
+
+def test_incremental_1():
+    """The score after every appended character equals aligning the prefix from scratch"""
+    for seq1, seq2 in PAIRS:
+        aligner = incremental.IncrementalAligner(seq1)
+        assert aligner.score == align.needleman_wunsch(seq1, "")[0]
+        for j, char in enumerate(seq2, 1):
+            assert aligner.extend(char) == align.needleman_wunsch(seq1, seq2[:j])[0]
+        assert aligner.seq2 == seq2 and len(aligner) == len(seq2)
+
+
+def test_incremental_2():
+    """The traceback equals needleman_wunsch for every checkpoint interval, see test_nw_15 .. test_nw_18 for ties"""
+    for gap_penalty in (-10, -5, 0, 10):
+        for checkpoint_every in (1, 2, 5, 256):
+            for seq1, seq2 in PAIRS:
+                aligner = incremental.IncrementalAligner(seq1, gap_penalty=gap_penalty,
+                                                         checkpoint_every=checkpoint_every)
+                aligner.extend(seq2[:3])
+                aligner.extend(seq2[3:])
+                assert aligner.alignment() == align.needleman_wunsch(seq1, seq2, gap_penalty=gap_penalty)
+
+
+def test_incremental_3():
+    """Tracebacks can be taken in between, and only every checkpoint_every-th column is kept"""
+    seq1, seq2 = PAIRS[-1]
+    aligner = incremental.IncrementalAligner(seq1, checkpoint_every=4)
+    for j in range(0, len(seq2), 7):
+        aligner.extend(seq2[j:j + 7])
+        assert aligner.alignment() == align.needleman_wunsch(seq1, seq2[:j + 7])
+    assert len(aligner._checkpoints) == len(seq2) // 4 + 1
+
+
+def test_incremental_4():
+    """A band wide enough gives the full result, a narrow one a worse score and a frontier of at most 2 * band + 1 cells"""
+    seq1, seq2 = 'ACTGGTCAACTGGTCAACTGGTCAACTGGTCA', 'TTACTGGTCAACTGGTCAACTTCAACTGGTCA'
+    full = align.needleman_wunsch(seq1, seq2)
+    wide = incremental.IncrementalAligner(seq1, band=len(seq1), checkpoint_every=3)
+    wide.extend(seq2)
+    assert wide.alignment() == full
+    narrow = incremental.IncrementalAligner(seq1, band=1, checkpoint_every=3)
+    narrow.extend(seq2)
+    assert narrow.score < full[0]
+    assert len(narrow._column[1]) == 2
+    score, aligned1, aligned2 = narrow.alignment()
+    assert score == narrow.score
+    assert aligned1.replace('-', '') == seq1 and aligned2.replace('-', '') == seq2
+
+
+def test_incremental_5():
+    """Custom scoring function, new characters of seq2 are scored as they arrive"""
+    def score(x, y):
+        return 1 if x == y else -1
+    aligner = incremental.IncrementalAligner("ACGTN", score=score, gap_penalty=-2)
+    aligner.extend("ANCGT")
+    assert aligner.alignment() == align.needleman_wunsch("ACGTN", "ANCGT", score=score, gap_penalty=-2)
+    with pytest.raises(ValueError):
+        incremental.IncrementalAligner("ACGT", checkpoint_every=0)
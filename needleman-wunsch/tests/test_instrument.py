@@ -0,0 +1,110 @@
+import io
+import json
+import logging
+import sys
+import tracemalloc
+
+import src.batch as batch
+import src.instrument as instrument
+import src.nw as align
+
+
+def test_instrument_1():
+    """Phases and cell counts of needleman_wunsch, the hook is restored afterwards"""
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, align):
+        assert align.needleman_wunsch("ACCGT", "ACGT") == (10, "ACCGT", "A-CGT")
+        align.needleman_wunsch("ACGT", "")
+    assert align.PROFILER is None
+    report = profiler.report()
+    assert report['counters'] == {'cells': 20}
+    assert report['phases']['fill']['calls'] == 2 and report['phases']['traceback']['calls'] == 2
+    assert report['phases']['fill']['seconds'] > 0
+    assert 'score' not in report['phases']
+
+
+def test_instrument_2():
+    """Scoring calls are counted only with wrap_calls, the results do not change"""
+    profiler = instrument.Profiler(wrap_calls=True)
+    with instrument.installed(profiler, align):
+        assert align.needleman_wunsch("ACCGT", "ACGT") == (10, "ACCGT", "A-CGT")
+    # 20 cells in the fill, one call per step of the traceback that has both i and j left
+    assert profiler.report()['phases']['score']['calls'] == 20 + 5
+
+
+def test_instrument_3():
+    """A phase entered recursively counts every call, its depth and the outermost time only"""
+    profiler = instrument.Profiler()
+
+    def recurse(depth):
+        with profiler.phase('node'):
+            if depth > 1:
+                recurse(depth - 1)
+                recurse(depth - 1)
+
+    with profiler.phase('outer'):
+        recurse(4)
+    phases = profiler.report()['phases']
+    assert phases['node']['calls'] == 15 and phases['node']['depth'] == 4
+    assert phases['node']['seconds'] <= phases['outer']['seconds']
+
+
+def test_instrument_4():
+    """Memory peaks of nested phases, the outer one includes the inner one, tracing stops with the outer one"""
+    tracing = tracemalloc.is_tracing()
+    profiler = instrument.Profiler(trace_memory=True)
+    with profiler.phase('outer'):
+        with profiler.phase('inner'):
+            block = bytearray(1 << 20)
+        del block
+    phases = profiler.report()['phases']
+    assert phases['inner']['peak_bytes'] >= 1 << 20
+    assert phases['outer']['peak_bytes'] >= phases['inner']['peak_bytes']
+    assert tracemalloc.is_tracing() == tracing
+
+
+def test_instrument_5():
+    """The batched aligner reports its phases, real and padding cells"""
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, batch):
+        batch.align_batch([("ACGT", "ACGT"), ("AC", "A")], batch_size=2)
+    assert profiler.report()['counters'] == {'cells': 16 + 2, 'cells_padded': 2 * 16 - 18}
+    assert set(profiler.phases) == {'fill', 'traceback'}
+
+
+def test_instrument_6(tmp_path, caplog):
+    """Reports go to every sink on flush and the profiler starts over"""
+    stream = io.StringIO()
+    path = str(tmp_path / 'nw.prom')
+    prometheus = instrument.PrometheusSink(path)
+    profiler = instrument.Profiler(sinks=[instrument.JSONSink(stream), instrument.LoggingSink(), prometheus])
+    with caplog.at_level(logging.INFO, logger='alignment'), instrument.installed(profiler, align):
+        for _ in range(2):
+            align.needleman_wunsch("ACCGT", "ACGT")
+            profiler.flush()
+    assert profiler.report()['counters'] == {}
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2 and json.loads(lines[0])['counters'] == {'cells': 20}
+    assert any('phase fill' in record.getMessage() for record in caplog.records)
+    text = open(path).read()
+    assert 'alignment_cells_total 40' in text
+    assert 'alignment_phase_calls_total{phase="traceback"} 2' in text
+    assert '# TYPE alignment_phase_seconds_total counter' in text
+
+
+def test_instrument_7():
+    """Matrices are printed only when a stream is given"""
+    stream = io.StringIO()
+    with instrument.installed(instrument.Profiler(dump_matrices=stream), align):
+        align.needleman_wunsch("AC", "A")
+    assert stream.getvalue().splitlines() == ['score_matrix:', '     0   -10', '   -10     5', '   -20    -5']
+
+
+def test_instrument_8(monkeypatch, capsys):
+    """--profile installs a profiler for one run only, every run reports its own phases"""
+    monkeypatch.setattr(sys, 'argv', ['nw', 'ACCGT', 'ACGT', '--profile'])
+    for _ in range(2):
+        assert align.main() == (10, "ACCGT", "A-CGT")
+        report = json.loads(capsys.readouterr().err)
+        assert report['phases']['fill']['calls'] == 1 and report['counters'] == {'cells': 20}
+        assert align.PROFILER is None
@@ -0,0 +1,70 @@
+from pathlib import Path
+import importlib.util
+import random
+
+import numpy as np
+import pytest
+
+import src.batch as batch
+import src.kernels as kernels
+import src.nw as align
+
+# The reference affine aligner lives in its own lab
+_spec = importlib.util.spec_from_file_location(
+    'nw_affine_gap', Path(__file__).resolve().parents[2] / 'affine-gap-penalty' / 'src' / 'nw_affine_gap.py')
+affine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(affine)
+
+# (match, mismatch, gap) schemes, from the defaults to ones that need int32
+SCHEMES = ((5, -4, -10), (1, -1, 0), (7, 3, 2), (300, -300, -200))
+
+
+def encoded(seq1, seq2, match, mismatch):
+    alphabet = kernels.build_alphabet((seq1, seq2))
+    table = kernels.substitution_table(lambda x, y: match if x == y else mismatch, alphabet).astype(np.int64)
+    return kernels.encode(seq1, alphabet), kernels.encode(seq2, alphabet), table
+
+
+def test_kernels_1():
+    """The narrowest type is picked from the bound, which grows with the columns only"""
+    assert kernels.score_dtype(0) == np.int16 and kernels.score_dtype(32767) == np.int16
+    assert kernels.score_dtype(32768) == np.int32 and kernels.score_dtype(2 ** 31) == np.int64
+    with pytest.raises(OverflowError):
+        kernels.score_dtype(2 ** 63)
+    _, _, table = encoded("ACGT", "ACGT", 5, -4)
+    assert kernels.score_dtype(kernels.linear_bound(700, table, -10)) == np.int16
+    assert kernels.score_dtype(kernels.linear_bound(800, table, -10)) == np.int32
+
+
+def test_kernels_2():
+    """Linear gaps: the narrow rows equal int64 ones and needleman_wunsch, up to the edge of int16"""
+    rng = random.Random(0)
+    for index in range(120):
+        match, mismatch, gap_penalty = SCHEMES[index % 4]
+        seq1 = ''.join(rng.choice('ACGT') for _ in range(rng.randrange(30)))
+        seq2 = seq1 if index % 5 == 0 else ''.join(rng.choice('ACGT') for _ in range(rng.randrange(30)))
+        a, b, table = encoded(seq1, seq2, match, mismatch)
+        row = kernels.nw_last_row(a, b, table, gap_penalty)
+        assert np.array_equal(row, kernels.nw_last_row(a, b, table, gap_penalty, np.int64))
+        assert row[-1] == align.needleman_wunsch(seq1, seq2, lambda x, y: match if x == y else mismatch,
+                                                 gap_penalty)[0]
+    # 700 matches in a row reach the largest values int16 is picked for
+    seq = ''.join(rng.choice('ACGT') for _ in range(700))
+    a, _, table = encoded(seq, seq, 5, -4)
+    assert kernels.nw_last_row(a, a, table)[-1] == 3500
+    assert batch.align_batch([(seq, seq)])[0] == (3500, seq, seq)
+
+
+def test_kernels_3():
+    """Affine gaps: the sentinel stands in for -inf, the narrow score equals needleman_wunsch_affine"""
+    rng = random.Random(1)
+    for index in range(120):
+        match, mismatch, _ = SCHEMES[index % 4]
+        gap_open, gap_extend = ((-10, -1), (-3, -1), (0, -1), (-300, -200))[index % 4]
+        seq1 = ''.join(rng.choice('AC') for _ in range(rng.randrange(20)))
+        seq2 = ''.join(rng.choice('AC') for _ in range(rng.randrange(20)))
+        a, b, table = encoded(seq1, seq2, match, mismatch)
+        result = kernels.affine_score(a, b, table, gap_open, gap_extend)
+        assert result == kernels.affine_score(a, b, table, gap_open, gap_extend, np.int64)
+        assert result == affine.needleman_wunsch_affine(seq1, seq2, lambda x, y: match if x == y else mismatch,
+                                                        gap_open, gap_extend)[2]
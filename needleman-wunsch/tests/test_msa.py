@@ -0,0 +1,80 @@
+import pytest
+
+import src.msa as msa
+
+
+def sum_of_pairs(aln1, aln2, gap_open, gap_extend, score=msa.score_fun):
+    """Average sum-of-pairs score of two merged profiles, re-scored column by column"""
+    total, previous = 0, None
+    for column in range(len(aln1[0])):
+        left, right = [row[column] for row in aln1], [row[column] for row in aln2]
+        state = 'insertion' if set(left) == {'-'} else 'deletion' if set(right) == {'-'} else 'match'
+        if state == 'match':
+            total += sum(score(x, y) for x in left for y in right if x != '-' and y != '-') / (len(aln1) * len(aln2))
+        else:
+            # A gap run opens once and extends for every further column
+            total += gap_extend if state == previous else gap_open
+        previous = state
+    return total
+
+
+def test_msa_1():
+    """Single sequences, 4 matches and a gap of 3: ACG---T / ACGGCTT, 4 * 5 - 10 - 2 * 1 = 8"""
+    aln1, aln2, score = msa.needleman_wunsch_affine_profile(["ACGT"], ["ACGGCTT"])
+    assert aln1 == ["ACG---T"]
+    assert aln2 == ["ACGGCTT"]
+    assert score == 8
+
+
+def test_msa_2():
+    """Identical profiles are merged column by column"""
+    aln1, aln2, score = msa.needleman_wunsch_affine_profile(["AC-GT", "ACAGT"], ["AC-GT", "ACAGT"])
+    assert aln1 == ["AC-GT", "ACAGT"]
+    assert aln2 == ["AC-GT", "ACAGT"]
+    assert score == (4 * 4 * 5 + 1 * 5) / 4
+
+
+def test_msa_3():
+    """The linear-space path finds the score of the full matrix, both alignments re-scored as sum of pairs give it"""
+    aln1 = ["GGAGCCAAGGTGAAGTTGTAGCAGTGTGTCC", "GGAGCCAAGGTGAAGTTG-AGCAGTGTGTCC"]
+    aln2 = ["GACTTGTGGAACCTCTGTCCTCCGAGCTCTC"]
+    full = msa.needleman_wunsch_affine_profile(aln1, aln2, gap_open=-5, gap_extend=-5)
+    linear = msa.needleman_wunsch_affine_profile(aln1, aln2, gap_open=-5, gap_extend=-5, full_matrix_cells=16)
+    assert linear[2] == full[2]
+    assert sum_of_pairs(linear[0], linear[1], -5, -5) == pytest.approx(linear[2])
+    assert sum_of_pairs(full[0], full[1], -5, -5) == pytest.approx(full[2])
+    assert len(set(map(len, linear[0] + linear[1]))) == 1
+    assert [row.replace('-', '') for row in linear[0]] == [row.replace('-', '') for row in aln1]
+
+
+def test_msa_4():
+    """UPGMA joins the closest pair first"""
+    distances = [[0, 1, 8, 9],
+                 [1, 0, 8, 9],
+                 [8, 8, 0, 3],
+                 [9, 9, 3, 0]]
+    assert msa.upgma(distances) == ((0, 1), (2, 3))
+
+
+def test_msa_5():
+    """Neighbour joining recovers the same topology"""
+    distances = [[0, 1, 8, 9],
+                 [1, 0, 8, 9],
+                 [8, 8, 0, 3],
+                 [9, 9, 3, 0]]
+    tree = msa.neighbour_joining(distances)
+    assert set(tree) == {(0, 1), (2, 3)}
+
+
+def test_msa_6():
+    """Rows come back in input order and only gaps are added"""
+    sequences = ["ACGGCTT", "ACGT", "ACGGT", "CGGCTT"]
+    for method in ('upgma', 'nj'):
+        alignment = msa.progressive_msa(sequences, method=method, workers=1)
+        assert len(set(map(len, alignment))) == 1
+        assert [row.replace('-', '') for row in alignment] == sequences
+
+
+def test_msa_7():
+    """Identical sequences need no gaps"""
+    assert msa.progressive_msa(["ACGT"] * 3, workers=2) == ["ACGT"] * 3
@@ -178,4 +178,14 @@ def test_nw_22():
                                                                gap_penalty=-10)
     assert score == -4*len(seq1)
     assert aligned_seq1 == 'AAAAAA'
-    assert aligned_seq2 == 'CCCCCC'
\ No newline at end of file
+    assert aligned_seq2 == 'CCCCCC'
+
+
+def test_nw_23(monkeypatch, capsys):
+    """Command line with --match/--mismatch, match=1, mismatch=-1, gap=-2"""
+    monkeypatch.setattr('sys.argv', ['nw.py', 'AACGT', 'ACGT', '--match', '1', '--mismatch', '-1', '--gap', '-2'])
+    score, aln1, aln2 = align.main()
+    assert score == 2
+    assert aln1 == 'AACGT'
+    assert aln2 == '-ACGT'
+    assert 'Score: 2' in capsys.readouterr().out
@@ -0,0 +1,76 @@
+import json
+import random
+
+import pytest
+
+import src.instrument as instrument
+import src.nw as align
+import src.outofcore as outofcore
+
+
+def random_pair(rng, length, alphabet='ACGT'):
+    return (''.join(rng.choice(alphabet) for _ in range(rng.randrange(length))),
+            ''.join(rng.choice(alphabet) for _ in range(rng.randrange(length))))
+
+
+def test_outofcore_1():
+    """Tiles of any size, edge tiles and empty sequences give exactly the needleman_wunsch result"""
+    rng = random.Random(0)
+    for index in range(80):
+        seq1, seq2 = random_pair(rng, 25, 'ACGT' if index % 2 else 'AC')
+        gap_penalty = (-10, -1, 0)[index % 3]
+        assert outofcore.needleman_wunsch_ooc(seq1, seq2, gap_penalty=gap_penalty, tile=(2, 3, 7, 64)[index % 4]) == \
+            align.needleman_wunsch(seq1, seq2, gap_penalty=gap_penalty)
+
+
+def test_outofcore_2(tmp_path, monkeypatch):
+    """A run that crashes mid-fill resumes from its finished tiles and computes only the missing ones"""
+    rng = random.Random(1)
+    seq1, seq2 = (''.join(rng.choice('ACGT') for _ in range(length)) for length in (50, 41))
+    kernel, calls = outofcore.nw_tile, []
+
+    def crashing(*args):
+        if len(calls) == 10:
+            raise MemoryError
+        calls.append(1)
+        return kernel(*args)
+
+    monkeypatch.setattr(outofcore, 'nw_tile', crashing)
+    with pytest.raises(MemoryError):
+        outofcore.OutOfCoreAligner(seq1, seq2, tmp_path, tile=8).fill()
+    monkeypatch.setattr(outofcore, 'nw_tile', kernel)
+    # No half-written tile is left behind
+    assert len(list(tmp_path.glob('tile_*.npy'))) == 10 and not list(tmp_path.glob('*.tmp*'))
+
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, outofcore):
+        result = outofcore.OutOfCoreAligner(seq1, seq2, tmp_path, tile=8).alignment()
+    assert result == align.needleman_wunsch(seq1, seq2)
+    assert profiler.counters['tiles_resumed'] == 10 and profiler.counters['tiles'] == 7 * 6 - 10
+
+
+def test_outofcore_3(tmp_path):
+    """A directory of another alignment or tile size is refused, not overwritten"""
+    outofcore.OutOfCoreAligner("ACGT", "ACG", tmp_path, tile=2).fill()
+    with pytest.raises(ValueError):
+        outofcore.OutOfCoreAligner("ACGT", "ACC", tmp_path, tile=2)
+    with pytest.raises(ValueError):
+        outofcore.OutOfCoreAligner("ACGT", "ACG", tmp_path, tile=3)
+    with open(tmp_path / 'meta.json') as file:
+        assert json.load(file)['shape'] == [4, 3]
+    assert outofcore.OutOfCoreAligner("ACGT", "ACG", tmp_path, tile=2).fill() == 0
+
+
+def test_outofcore_4(tmp_path):
+    """The traceback reads back only the tiles along the path, any cell can be read from disk"""
+    rng = random.Random(2)
+    seq1 = ''.join(rng.choice('ACGT') for _ in range(200))
+    seq2 = seq1[:100] + seq1[105:]
+    aligner = outofcore.OutOfCoreAligner(seq1, seq2, tmp_path, tile=10, cache_tiles=4)
+    aligner.fill()
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, outofcore):
+        result = aligner.alignment()
+    assert result == align.needleman_wunsch(seq1, seq2)
+    assert profiler.counters['tiles_loaded'] < 3 * 20 < 20 * 20
+    assert aligner.value(0, 7) == -70 and aligner.value(200, 195) == result[0]
@@ -0,0 +1,75 @@
+import numpy as np
+
+import src.nw as align
+import src.pairwise as pairwise
+
+SEQUENCES = ["ACGT", "ACG", "", "TACGT", "ACAGT", "GGAGCCAAGGTGAAGTTGTAGCAGTGTGTCC",
+             "GACTTGTGGAACCTCTGTCCTCCGAGCTCTC", "AAAAAAATTTTTTT", "TTTTTTTAAAAAAA"]
+
+
+def test_pairwise_1():
+    """Every entry equals the score of needleman_wunsch for the same pair"""
+    scores = pairwise.pairwise_matrix(SEQUENCES, workers=1)
+    for i, seq1 in enumerate(SEQUENCES):
+        for j, seq2 in enumerate(SEQUENCES):
+            assert scores[i, j] == align.needleman_wunsch(seq1, seq2)[0]
+
+
+def test_pairwise_2():
+    """Worker processes produce the same matrix as the in-process run"""
+    expected = pairwise.pairwise_matrix(SEQUENCES, workers=1, gap_penalty=-5)
+    assert np.array_equal(pairwise.pairwise_matrix(SEQUENCES, workers=3, gap_penalty=-5), expected)
+
+
+def test_pairwise_3():
+    """Affine engine, identical sequences: 4 matches, see test_nw_affine_gap_1"""
+    scores = pairwise.pairwise_matrix(["ACGT", "ACGT", "ACGGCTT"], engine='affine', workers=1)
+    assert scores[0, 1] == 20
+    assert scores[0, 2] == 8
+    assert np.array_equal(scores, scores.T)
+
+
+def test_pairwise_4():
+    """Tiles cover the upper triangle exactly once"""
+    lengths = [len(seq) for seq in SEQUENCES]
+    tiles = pairwise.plan_tiles(lengths, 7)
+    pairs = [(i, j) for tile in tiles for i, j0, j1 in tile for j in range(j0, j1)]
+    assert sorted(pairs) == [(i, j) for i in range(len(lengths)) for j in range(i, len(lengths))]
+
+
+def test_pairwise_5():
+    """Tiles are balanced by cell count, not by number of pairs"""
+    lengths = [1000] + [10] * 200
+    costs = [pairwise.tile_cost(tile, lengths) for tile in pairwise.plan_tiles(lengths, 8)]
+    assert max(costs) < 2 * sum(costs) / len(costs)
+
+
+def test_pairwise_6(tmp_path):
+    """An interrupted checkpointed run only recomputes the missing tiles"""
+    expected = pairwise.pairwise_matrix(SEQUENCES, workers=2, checkpoint=str(tmp_path))
+    done = np.load(tmp_path / 'done.npy', mmap_mode='r+')
+    scores = np.load(tmp_path / 'scores.npy', mmap_mode='r+')
+    assert done.all()
+    # Pretend the run died before the first tile was stored, and poison a finished one
+    tiles = pairwise.plan_tiles([len(seq) for seq in SEQUENCES], 2 * 8)
+    for i, j0, j1 in tiles[0]:
+        scores[i, j0:j1] = 0
+    done[0] = False
+    scores[tiles[1][0][0], tiles[1][0][1]] = 12345
+    done.flush()
+    scores.flush()
+    resumed = pairwise.pairwise_matrix(SEQUENCES, workers=1, checkpoint=str(tmp_path))
+    assert resumed[tiles[1][0][0], tiles[1][0][1]] == 12345
+    for i, j0, j1 in tiles[0]:
+        assert np.array_equal(resumed[i, j0:j1], expected[i, j0:j1])
+
+
+def test_pairwise_7(tmp_path):
+    """A checkpoint written for other parameters is refused"""
+    pairwise.pairwise_matrix(SEQUENCES[:3], workers=1, checkpoint=str(tmp_path))
+    try:
+        pairwise.pairwise_matrix(SEQUENCES[:3], workers=1, gap_penalty=-1, checkpoint=str(tmp_path))
+    except ValueError:
+        pass
+    else:
+        assert False, "checkpoint with different gap penalty was reused"
@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+import src.nw as align
+import src.service as service
+
+PAIRS = [("ACGT", "ACGT"), ("ACG", "ACGT"), ("TACGT", "ATGT"), ("TACGT", "ACTGT"), ("", "ACGT"),
+         ("GGAGCCAAGGTGAAGTTGTAGCAGTGTGTCC", "GACTTGTGGAACCTCTGTCCTCCGAGCTCTC")]
+
+
+async def exchange(path, requests):
+    """Sends all requests on one connection and collects the responses by id."""
+    reader, writer = await asyncio.open_unix_connection(path)
+    for request in requests:
+        writer.write((json.dumps(request) + '\n').encode())
+    await writer.drain()
+    responses = {}
+    for _ in requests:
+        response = json.loads(await reader.readline())
+        responses[response['id']] = response
+    writer.close()
+    return responses
+
+
+def run_server(tmp_path, scenario, **options):
+    async def main():
+        server = service.AlignmentServer(**options)
+        path = str(tmp_path / 'nw.sock')
+        await server.start(path=path)
+        try:
+            return server, await scenario(path)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def test_service_1(tmp_path):
+    """Concurrent requests are answered with the results of needleman_wunsch, in fewer batches"""
+    requests = [{'id': k, 'seq1': seq1, 'seq2': seq2} for k, (seq1, seq2) in enumerate(PAIRS)]
+    server, responses = run_server(tmp_path, lambda path: exchange(path, requests), max_delay=0.05)
+    for k, (seq1, seq2) in enumerate(PAIRS):
+        response = responses[k]
+        assert (response['score'], response['aln1'], response['aln2']) == align.needleman_wunsch(seq1, seq2)
+    assert server.stats['batches'] < len(PAIRS)
+
+
+def test_service_2(tmp_path):
+    """Repeated inputs are served from the cache or share the running alignment"""
+    requests = [{'id': k, 'seq1': "ACGT", 'seq2': "TAGT"} for k in range(5)]
+
+    async def twice(path):
+        first = await exchange(path, requests)
+        second = await exchange(path, [{'id': 'again', 'seq1': "ACGT", 'seq2': "TAGT"}])
+        return first, second
+    server, (first, second) = run_server(tmp_path, twice)
+    assert {response['score'] for response in first.values()} == {align.needleman_wunsch("ACGT", "TAGT")[0]}
+    assert second['again']['score'] == first[0]['score']
+    assert server.stats['batches'] == 1
+    assert server.stats['coalesced'] + server.stats['cache_hits'] == 5
+
+
+def test_service_3(tmp_path):
+    """Scoring parameters are part of the request and of the cache key"""
+    requests = [{'id': 'default', 'seq1': "ACGT", 'seq2': "TAGT"},
+                {'id': 'custom', 'seq1': "ACGT", 'seq2': "TAGT", 'match': 1, 'mismatch': -1, 'gap': 0}]
+    _, responses = run_server(tmp_path, lambda path: exchange(path, requests))
+    assert responses['default']['score'] == align.needleman_wunsch("ACGT", "TAGT")[0]
+    assert responses['custom']['score'] == align.needleman_wunsch(
+        "ACGT", "TAGT", score=lambda x, y: 1 if x == y else -1, gap_penalty=0)[0]
+
+
+def test_service_4(tmp_path):
+    """A request that cannot be answered in time gets an error, not a hang"""
+    requests = [{'id': 1, 'seq1': "ACGT", 'seq2': "ACGT"}]
+    server, responses = run_server(tmp_path, lambda path: exchange(path, requests), max_delay=1.0, timeout=0.05)
+    assert 'timeout' in responses[1]['error']
+    assert server.stats['timeouts'] == 1
+
+
+def test_service_5(tmp_path):
+    """Malformed requests are answered with an error"""
+    requests = [{'id': 1, 'seq1': "ACGT"}, {'id': 2, 'seq1': "ACGT", 'seq2': "ACGT", 'gap': 'x'}]
+    _, responses = run_server(tmp_path, lambda path: exchange(path, requests))
+    assert responses[1]['error'].startswith('bad request')
+    assert responses[2]['error'].startswith('bad request')
+
+
+def test_service_6(tmp_path):
+    """With max_pending=1 the requests of a connection are admitted one at a time"""
+    requests = [{'id': k, 'seq1': seq1, 'seq2': seq2} for k, (seq1, seq2) in enumerate(PAIRS)]
+    server, responses = run_server(tmp_path, lambda path: exchange(path, requests), max_pending=1)
+    assert len(responses) == len(PAIRS)
+    assert server.stats['batches'] == len(PAIRS)
+
+
+def test_service_7(tmp_path):
+    """A disk-backed cache, used from its own thread, answers a restarted server without aligning"""
+    requests = [{'id': k, 'seq1': seq1, 'seq2': seq2} for k, (seq1, seq2) in enumerate(PAIRS)]
+    options = {'cache_size': 0, 'cache_path': str(tmp_path / 'cache.sqlite')}
+    _, first = run_server(tmp_path, lambda path: exchange(path, requests), **options)
+    server, second = run_server(tmp_path, lambda path: exchange(path, requests), **options)
+    assert second == first
+    assert server.stats['batches'] == 0 and server.stats['cache_hits'] == len(PAIRS)
+    assert server.cache.stats['disk_hits'] == len(PAIRS)
+
+
+def test_service_8(tmp_path):
+    """A line over max_line gets an error and releases its permit, the requests after it are answered"""
+    async def scenario(path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'{"id": 1, "seq1": "%s", "seq2": "A"}\n' % (b'A' * 4096))
+        writer.write(b'{"id": 2, "seq1": "ACGT", "seq2": "TAGT"}\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in range(2)]
+        writer.close()
+        return responses
+
+    _, responses = run_server(tmp_path, scenario, max_pending=1, max_line=1024)
+    assert responses[0] == {'id': None, 'error': 'bad request: line longer than 1024 bytes'}
+    assert responses[1]['id'] == 2 and responses[1]['score'] == align.needleman_wunsch("ACGT", "TAGT")[0]
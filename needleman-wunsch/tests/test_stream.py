@@ -0,0 +1,64 @@
+import io
+import json
+
+import src.nw as align
+import src.stream as stream
+
+TSV = "# pairs\nACGT\tACAGT\n\np2\tTACGT\tATGT\nAAAAAAATTTTTTT\tTTTTTTTAAAAAAA\n"
+FASTA = ">r1 first read\nACG\nT\n>a1\nACAGT\n>r2\nTACGT\n>a2\nATGT\n"
+
+
+def test_stream_1():
+    """TSV lines with and without ids, comments and blank lines skipped"""
+    assert list(stream.read_pairs(io.StringIO(TSV))) == [("1", "ACGT", "ACAGT"), ("p2", "TACGT", "ATGT"),
+                                                        ("3", "AAAAAAATTTTTTT", "TTTTTTTAAAAAAA")]
+
+
+def test_stream_2():
+    """FASTA records are paired in order, multi-line sequences are joined"""
+    assert list(stream.read_pairs(io.StringIO(FASTA))) == [("r1/a1", "ACGT", "ACAGT"), ("r2/a2", "TACGT", "ATGT")]
+
+
+def test_stream_3():
+    """CIGAR with seq1 as the reference, see test_nw_14"""
+    assert stream.cigar("TAC-GT", "-ACTGT") == "1D2=1I2="
+    assert stream.cigar("ACGT", "TAGT") == "2X2="
+    assert stream.cigar("", "") == ""
+
+
+def test_stream_4():
+    """Ordered JSONL output matches needleman_wunsch pair by pair"""
+    output = io.StringIO()
+    count = stream.run_batch(io.StringIO(TSV), output, chunk_size=2)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == 3
+    assert [record['id'] for record in records] == ["1", "p2", "3"]
+    for record, (_, seq1, seq2) in zip(records, stream.read_pairs(io.StringIO(TSV))):
+        assert (record['score'], record['aln1'], record['aln2']) == align.needleman_wunsch(seq1, seq2)
+
+
+def test_stream_5():
+    """Unordered output on worker processes still reports every pair once"""
+    pairs = "".join("p%d\tACGTACGT\tACG%sT\n" % (k, "A" * (k % 5)) for k in range(40))
+    output = io.StringIO()
+    count = stream.run_batch(io.StringIO(pairs), output, workers=2, chunk_size=3, max_in_flight=2,
+                             ordered=False, output_format='cigar')
+    ids = sorted(line.split('\t')[0] for line in output.getvalue().splitlines())
+    assert count == 40
+    assert ids == sorted("p%d" % k for k in range(40))
+
+
+def test_stream_6():
+    """Custom scores reach the workers"""
+    output = io.StringIO()
+    stream.run_batch(io.StringIO("ACGT\tTAGT\n"), output, match=1, mismatch=-1, gap=-2, workers=2)
+    assert json.loads(output.getvalue())['score'] == align.needleman_wunsch(
+        "ACGT", "TAGT", score=lambda x, y: 1 if x == y else -1, gap_penalty=-2)[0]
+
+
+def test_stream_7():
+    """Progress reports go to the progress stream only"""
+    output, progress = io.StringIO(), io.StringIO()
+    stream.run_batch(io.StringIO(TSV), output, progress=progress)
+    assert "aligned 3 pairs" in progress.getvalue()
+    assert len(output.getvalue().splitlines()) == 3
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+import src.instrument as instrument
+import src.nw as align
+import src.trie as trie
+
+TARGETS = ["ACGTACGT", "ACGTACGA", "ACGTAC", "ACGTTT", "ACG", "", "ACGTACGT", "TTTT", "ACGGACGT"]
+
+
+def brute_force(query, targets, k, **kwargs):
+    scores = [(align.needleman_wunsch(query, target, **kwargs)[0], index) for index, target in enumerate(targets)]
+    return sorted(scores, key=lambda hit: (-hit[0], hit[1]))[:k]
+
+
+def test_trie_1():
+    """Top K equals sorting the needleman_wunsch scores of every target, with prefixes, duplicates and ''"""
+    index = trie.TargetTrie(TARGETS)
+    for query in ("ACGTACGT", "ACGA", "", "TTTTACG"):
+        for k in (1, 3, len(TARGETS), 20):
+            assert index.search(query, k) == brute_force(query, TARGETS, k)
+            assert index.search(query, k, prune=False) == brute_force(query, TARGETS, k)
+
+
+def test_trie_2():
+    """Other scoring schemes, including ones where the bound has no closed form (positive gap)"""
+    def score(x, y):
+        return -3 if x == y else -5
+    index = trie.TargetTrie(TARGETS)
+    for gap_penalty in (-2, 0, 3):
+        assert index.search("ACGTAC", 4, score=score, gap_penalty=gap_penalty) == \
+            brute_force("ACGTAC", TARGETS, 4, score=score, gap_penalty=gap_penalty)
+        assert index.search("ACGTAC", 4, gap_penalty=gap_penalty) == \
+            brute_force("ACGTAC", TARGETS, 4, gap_penalty=gap_penalty)
+
+
+def test_trie_3():
+    """Shared prefixes are aligned once: one DP column per trie node instead of one per target character"""
+    rng = random.Random(0)
+    primer = ''.join(rng.choice('ACGT') for _ in range(40))
+    targets = [primer + ''.join(rng.choice('ACGT') for _ in range(10)) for _ in range(50)]
+    query = targets[3][:20] + 'T' + targets[3][20:]
+    index = trie.TargetTrie(targets)
+    full, pruned = instrument.Profiler(), instrument.Profiler()
+    with instrument.installed(full, trie):
+        assert index.search(query, 3, prune=False) == brute_force(query, targets, 3)
+    with instrument.installed(pruned, trie):
+        assert index.search(query, 3, check_every=1) == brute_force(query, targets, 3)
+    assert full.counters['trie_columns'] == index.size - 1 < sum(map(len, targets)) / 4
+    assert pruned.counters['trie_pruned'] > 0
+    assert pruned.counters['trie_columns'] < full.counters['trie_columns']
+
+
+def test_trie_4():
+    """The module-level search and argument checks"""
+    assert trie.search("ACGT", ["ACGA", "ACGT"], k=1) == [(20, 1)]
+    assert trie.search("ACGT", [], k=3) == []
+    with pytest.raises(ValueError):
+        trie.search("ACGT", TARGETS, k=0)
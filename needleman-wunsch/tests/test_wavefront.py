@@ -0,0 +1,66 @@
+from pathlib import Path
+import importlib.util
+import random
+
+import src.instrument as instrument
+import src.nw as align
+import src.wavefront as wavefront
+
+# The reference affine aligner lives in its own lab
+_spec = importlib.util.spec_from_file_location(
+    'nw_affine_gap', Path(__file__).resolve().parents[2] / 'affine-gap-penalty' / 'src' / 'nw_affine_gap.py')
+affine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(affine)
+
+
+def random_pairs(count, length=25):
+    rng = random.Random(0)
+    for index in range(count):
+        alphabet = ('A', 'AC', 'ACGT')[index % 3]
+        yield (''.join(rng.choice(alphabet) for _ in range(rng.randrange(length))),
+               ''.join(rng.choice(alphabet) for _ in range(rng.randrange(length))))
+
+
+def test_wavefront_1():
+    """The tiles along anti-diagonals cover the matrix once, each after the tiles it depends on"""
+    waves = wavefront.plan_wavefront(10, 7, 3)
+    assert waves[0] == [(0, 0)] and waves[1] == [(0, 1), (1, 0)]
+    seen = {}
+    for d, wave in enumerate(waves):
+        for ti, tj in wave:
+            assert all(seen.get(before, d) < d for before in ((ti - 1, tj), (ti, tj - 1)) if min(before) >= 0)
+            seen[ti, tj] = d
+    assert sorted(seen) == [(ti, tj) for ti in range(4) for tj in range(3)]
+    assert wavefront.plan_wavefront(0, 5, 3) == []
+
+
+def test_wavefront_2():
+    """Linear gaps: the result equals needleman_wunsch for any tile size, in-process and on a pool"""
+    for index, (seq1, seq2) in enumerate(random_pairs(90)):
+        gap_penalty, tile = (-10, -1, 0)[index % 3], (1, 2, 5, 64)[index % 4]
+        expected = align.needleman_wunsch(seq1, seq2, gap_penalty=gap_penalty)
+        assert wavefront.needleman_wunsch_wavefront(seq1, seq2, gap_penalty=gap_penalty, workers=1,
+                                                    tile=tile) == expected
+    assert wavefront.needleman_wunsch_wavefront("ACCGTACGGT" * 3, "ACGTACCGT" * 3, workers=3, tile=4) == \
+        align.needleman_wunsch("ACCGTACGGT" * 3, "ACGTACCGT" * 3)
+
+
+def test_wavefront_3():
+    """Affine gaps: the alignments and score equal needleman_wunsch_affine, including its boundary quirks"""
+    for index, (seq1, seq2) in enumerate(random_pairs(90)):
+        gap_open, gap_extend = ((-10, -1), (-3, -1), (-5, -5), (0, -1))[index % 4]
+        expected = affine.needleman_wunsch_affine(seq1, seq2, affine.score_fun, gap_open, gap_extend)
+        assert wavefront.needleman_wunsch_affine_wavefront(seq1, seq2, gap_open=gap_open, gap_extend=gap_extend,
+                                                           workers=1, tile=(1, 3, 64)[index % 3]) == expected
+    assert wavefront.needleman_wunsch_affine_wavefront("ACGTTGCA" * 3, "ACGTGCA" * 3, workers=2, tile=4) == \
+        affine.needleman_wunsch_affine("ACGTTGCA" * 3, "ACGTGCA" * 3)
+
+
+def test_wavefront_4():
+    """The profiler sees every tile and the widest anti-diagonal"""
+    profiler = instrument.Profiler()
+    with instrument.installed(profiler, wavefront):
+        wavefront.needleman_wunsch_wavefront("ACGT" * 5, "ACG" * 4, workers=1, tile=4)
+    assert profiler.counters == {'tiles': 5 * 3, 'cells': 20 * 12}
+    assert profiler.maxima == {'wavefront_width': 3}
+    assert set(profiler.phases) == {'fill', 'traceback'}
@@ -0,0 +1,69 @@
+from pathlib import Path
+import subprocess
+import sys
+import typing
+
+import pytest
+
+import bioalign
+import bioalign.cli as cli
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                          cwd=ROOT).stdout.split()
+
+
+def test_bioalign_1():
+    """Importing the package and aligning with a pure Python engine imports no engine it did not use, nor NumPy"""
+    loaded = run("import sys, bioalign; bioalign.align('ACCGT', 'ACGT', engine='hirschberg');"
+                 "print(' '.join(sorted(name for name in sys.modules if name.startswith(('bioalign', 'numpy')))))")
+    assert loaded == ['bioalign', 'bioalign.core', 'bioalign.hirschberg', 'bioalign.hirschberg.align']
+    assert run("import sys, bioalign; bioalign.align_batch([('AC', 'A')]); print('numpy' in sys.modules)") == ['True']
+
+
+def test_bioalign_2():
+    """Every engine gives the needleman_wunsch result, (score, aln1, aln2), whatever its own order"""
+    expected = bioalign.get_engine('nw')("ACCGTACGT", "ACGTTACG", gap_penalty=-5)
+    for engine in ('nw', 'banded', 'outofcore', 'wavefront'):
+        assert bioalign.align("ACCGTACGT", "ACGTTACG", engine, gap=-5) == expected
+    assert bioalign.align("ACCGTACGT", "ACGTTACG", 'hirschberg', gap=-5)[0] == expected[0]
+    # Without a gap every engine uses GAP_PENALTY, not its own default: hirschberg's is -5
+    assert bioalign.align('ACCGT', 'ACGT', 'hirschberg') == bioalign.align('ACCGT', 'ACGT') == (10, 'ACCGT', 'A-CGT')
+    assert bioalign.align("ACGT", "TAGT", 'affine') == bioalign.align("ACGT", "TAGT", 'affine_wavefront', workers=1) \
+        == (2, 'ACGT', 'TAGT')
+    unit = bioalign.core.scorer(0, -1)
+    assert bioalign.align('kitten', 'sitting', 'four_russians', unit, gap=-1)[0] == -3
+    with pytest.raises(ValueError):
+        bioalign.align("ACGT", "TAGT", 'affine', gap=-5)
+    with pytest.raises(ValueError):
+        bioalign.get_engine('smith_waterman')
+
+
+def test_bioalign_3():
+    """The labs' other entry points are package attributes, loaded on first access"""
+    assert bioalign.align_batch([("ACCGT", "ACGT")]) == [bioalign.align("ACCGT", "ACGT")]
+    assert bioalign.edit_distance('kitten', 'sitting') == 3
+    assert 'pairwise_matrix' in dir(bioalign)
+    assert typing.get_type_hints(bioalign.align)['return'] == tuple[int, str, str]
+    with pytest.raises(AttributeError):
+        bioalign.no_such_engine
+
+
+def test_bioalign_4(capsys):
+    """The command line runs any engine with the shared scoring options and output"""
+    assert cli.main(['--engine', 'hirschberg', '--gap', '-5', 'ATCT', 'ACT']) == 0
+    assert capsys.readouterr().out == "Pairwise alignment:\nseq1: ATCT\nseq2: A-CT\n\nScore: 10\n"
+    assert cli.main(['--engine', 'affine', '--match', '2', '--mismatch', '-1', 'ACGT', 'TAGT']) == 0
+    assert capsys.readouterr().out.endswith("Score: 2\n")
+    with pytest.raises(SystemExit):
+        cli.main(['--match', '2', 'ACGT', 'TAGT'])
+    # The engines' own errors are usage errors too, not tracebacks
+    with pytest.raises(SystemExit):
+        cli.main(['--engine', 'four_russians', 'A', 'C'])
+    assert 'not unit-cost' in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        cli.main(['--engine', 'nw', '--band', '2', 'ACGT', 'TAGT'])
+    assert 'banded engine' in capsys.readouterr().err